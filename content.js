@@ -9,6 +9,7 @@ let USER_PERSONA = "";
 let isProcessing = false; // Flag to prevent multiple openings at the same time
 let messagedListings = new Set(); // Track which listings we've already messaged
 let pendingListings = []; // Queue of listings to message
+let seenCheckedListings = new Set(); // Listings the webapp has confirmed we never messaged
 let currentListingInfo = null; // Store current listing info for messaging
 let messagesSentCount = 0; // Track how many messages have been sent
 let MAX_MESSAGES = 3; // Maximum number of messages to send (configurable)
@@ -195,6 +196,51 @@ function scanForItems() {
     }
   }
 
+  filterSeenListings(matchingListings).then(queueListings);
+}
+
+/**
+ * Drop listings the webapp's seen-listing index says were already messaged
+ * (e.g. from another browser, or before the local list was cleared), with one
+ * batch call per results page. Each listing is only asked about once; if the
+ * webapp is unreachable every listing is kept.
+ */
+async function filterSeenListings(matchingListings) {
+  const unchecked = matchingListings.filter(l => !seenCheckedListings.has(l.id));
+  if (unchecked.length === 0) {
+    return matchingListings;
+  }
+  try {
+    const response = await fetch(`${API_BASE_URL}/seen-listings/check/batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        listings: unchecked.map(l => ({ title: l.text, price: l.price === 999999 ? null : l.price }))
+      })
+    });
+    if (!response.ok) {
+      return matchingListings;
+    }
+    const { seen } = await response.json();
+    unchecked.forEach((listing, i) => {
+      if (seen[i]) {
+        console.log(`⏭️ Already messaged (seen index): ${listing.text}`);
+        messagedListings.add(listing.id);
+      } else {
+        seenCheckedListings.add(listing.id);
+      }
+    });
+    if (seen.some(Boolean)) {
+      saveMessagedListings();
+    }
+    return matchingListings.filter(l => !messagedListings.has(l.id));
+  } catch (e) {
+    console.warn('Seen-listing check failed, continuing without it:', e);
+    return matchingListings;
+  }
+}
+
+function queueListings(matchingListings) {
   // Sort by price (lowest first - best deals)
   matchingListings.sort((a, b) => a.price - b.price);
   
@@ -931,6 +977,25 @@ async function lookupUserInCRS(userInfo) {
   }
 }
 
+// Last response per request body, revalidated with If-None-Match
+const alternativesCache = new Map();
+const ALTERNATIVES_CACHE_SIZE = 100;
+
+// Compact response format: each alternative's keys are sent once per list
+const COLUMNAR_TYPE = "application/vnd.fbmarketplace.columnar+json";
+
+// Expand {columns, rows} back into alternative objects (plain arrays pass through)
+function fromColumnar(alternatives) {
+  if (!alternatives || Array.isArray(alternatives)) return alternatives || [];
+  return alternatives.rows.map((row) => {
+    const alt = {};
+    alternatives.columns.forEach((column, i) => {
+      if (row[i] !== null && row[i] !== undefined) alt[column] = row[i];
+    });
+    return alt;
+  });
+}
+
 // Fetch sustainable alternatives from backend
 async function fetchSustainableAlternatives(productInfo, userProfile = null) {
   try {
@@ -945,18 +1010,33 @@ async function fetchSustainableAlternatives(productInfo, userProfile = null) {
       requestBody.userProfile = userProfile;
     }
 
+    const body = JSON.stringify(requestBody);
+    const cached = alternativesCache.get(body);
+    const headers = { "Content-Type": "application/json", Accept: COLUMNAR_TYPE };
+    if (cached) {
+      headers["If-None-Match"] = cached.etag;
+    }
+
     const response = await fetch(`${API_BASE_URL}/find-sustainable-products`, {
       method: "POST",
-      headers: {
-        "Content-Type": "application/json"
-      },
-      body: JSON.stringify(requestBody)
+      headers,
+      body
     });
 
+    if (response.status === 304 && cached) return cached.alternatives;
     if (!response.ok) throw new Error("API request failed");
 
     const data = await response.json();
-    return data.success ? data.alternatives : [];
+    const alternatives = data.success ? fromColumnar(data.alternatives) : [];
+    const etag = response.headers.get("ETag");
+    if (etag && data.success) {
+      alternativesCache.delete(body);
+      alternativesCache.set(body, { etag, alternatives });
+      if (alternativesCache.size > ALTERNATIVES_CACHE_SIZE) {
+        alternativesCache.delete(alternativesCache.keys().next().value);
+      }
+    }
+    return alternatives;
   } catch (error) {
     console.error("Error fetching sustainable alternatives:", error);
     return [];
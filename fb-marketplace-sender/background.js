@@ -262,9 +262,14 @@ chrome.runtime.onMessage.addListener((request, _sender, sendResponse) => {
   }
 });
 
-// Poll the webapp periodically using chrome.alarms
+// Receive payloads from the webapp by long-polling /api/consume-message: the
+// request is held until a payload is stored and the server hands it over
+// atomically, so there is no idle polling and no separate clearing call.
+// chrome.alarms only restarts the loop if the service worker was suspended.
 const POLL_ALARM = "poll_webapp_latest_message";
-const POLL_INTERVAL_MINUTES = 0.1; // ~6 seconds (min granularity is browser-dependent)
+const POLL_INTERVAL_MINUTES = 0.5; // watchdog for the long-poll loop
+const CONSUME_WAIT_SECONDS = 25;
+let consumeLoopRunning = false;
 
 function scheduleAlarm() {
   try {
@@ -274,36 +279,34 @@ function scheduleAlarm() {
   }
 }
 
-chrome.runtime.onInstalled.addListener(() => scheduleAlarm());
-chrome.runtime.onStartup.addListener(() => scheduleAlarm());
+chrome.runtime.onInstalled.addListener(() => { scheduleAlarm(); consumeLoop(); });
+chrome.runtime.onStartup.addListener(() => { scheduleAlarm(); consumeLoop(); });
 
-// Helper to clear the payload on the web app after consumption
-async function clearWebAppPayload() {
+async function consumeLoop() {
+  if (consumeLoopRunning) return;
+  consumeLoopRunning = true;
   try {
-    await fetch(`${WEBAPP_URL}/api/store-message`, {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ message: "", searchKeyword: "", maxPrice: null, minPrice: null }),
-    });
+    while (true) {
+      const res = await fetch(`${WEBAPP_URL}/api/consume-message?wait=${CONSUME_WAIT_SECONDS}`, {
+        method: "POST",
+      });
+      if (res.status === 204) continue; // nothing arrived, wait again
+      if (!res.ok) break;
+      const data = await res.json();
+      await handlePayload(data.payload || {});
+    }
   } catch (e) {
-    console.warn("Failed clearing webapp payload:", e.message || e);
+    console.warn("Consume loop error:", e.message || e);
+  } finally {
+    consumeLoopRunning = false;
   }
 }
 
-async function handleLatestMessagePolling() {
+async function handlePayload(data) {
   try {
-    const res = await fetch(`${WEBAPP_URL}/api/latest-message`);
-    if (!res.ok) return;
-    const data = await res.json();
     const { message, searchKeyword } = data || {};
     if (!message || !message.trim() || !searchKeyword || !searchKeyword.trim()) return;
 
-    // Avoid duplicate processing: track lastPayload in storage
-    const st = await chrome.storage.local.get(["__lastConsumedMessage"]);
-    const last = st.__lastConsumedMessage || "";
-    const signature = `${searchKeyword}::${message}`;
-    if (signature === last) return; // already processed
-
     // Save payload for content script to consume
     await chrome.storage.local.set({
       findAndSendPayload: {
@@ -330,23 +333,19 @@ async function handleLatestMessagePolling() {
         console.warn("Failed to open/update FB tab:", e2);
       }
     }
-
-    // Mark consumed so we don't re-send
-    await chrome.storage.local.set({ __lastConsumedMessage: signature });
-
-    // Optionally clear the webapp payload so it won't be re-sent
-    await clearWebAppPayload();
   } catch (e) {
-    console.warn("Polling error:", e.message || e);
+    console.warn("Payload handling error:", e.message || e);
   }
 }
 
 chrome.alarms.onAlarm.addListener((alarm) => {
   if (alarm && alarm.name === POLL_ALARM) {
-    handleLatestMessagePolling();
+    consumeLoop();
   }
 });
 
+consumeLoop();
+
 // Listen for notifications from content script that message was sent
 chrome.runtime.onMessage.addListener(async (request, sender, sendResponse) => {
   if (request && request.action === 'sent') {
@@ -0,0 +1,185 @@
+"""
+Admission Control
+Per-route token-bucket rate limits and a shared concurrency cap with
+queue-timeout shedding for the bureau fetches of the CRS-backed routes
+(cache hits are never admission controlled, see CRSClient)
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional, Dict, Any
+
+from metrics import ADMISSION_REJECTIONS
+
+
+class Overloaded(Exception):
+    """Request shed by admission control; answer with status and Retry-After."""
+
+    def __init__(self, message: str, status: int, retry_after: float):
+        super().__init__(message)
+        self.status = status
+        # Retry-After is whole seconds; never tell a client to retry immediately
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    """Thread-safe token bucket: rate tokens per second, up to burst saved."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        """Take a token. Returns 0 on success, else seconds until one is available."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class ConcurrencyLimiter:
+    """
+    Caps requests running at once; others wait up to queue_timeout, then are shed.
+
+    Threads (Flask routes) and event-loop tasks (asgi.py routes) are counted
+    separately, as a process serves a route one way or the other.
+    """
+
+    def __init__(self, limit: int, queue_timeout: float):
+        """
+        Args:
+            limit: Requests allowed to run at once
+            queue_timeout: Seconds a request may wait for a slot before a 503
+        """
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(limit)
+        self._async_slots: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self.active = 0
+        self.shed = 0
+
+    def _overloaded(self, route: str) -> Overloaded:
+        with self._lock:
+            self.shed += 1
+        ADMISSION_REJECTIONS.inc(route, "queue_timeout")
+        return Overloaded("Server busy, retry shortly", 503, self.queue_timeout)
+
+    def _track(self, delta: int) -> None:
+        with self._lock:
+            self.active += delta
+
+    @contextmanager
+    def slot(self, route: str):
+        """Hold a slot for the with block. Raises Overloaded if none frees up in time."""
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise self._overloaded(route)
+        self._track(1)
+        try:
+            yield
+        finally:
+            self._track(-1)
+            self._slots.release()
+
+    @asynccontextmanager
+    async def slot_async(self, route: str):
+        """asyncio variant of slot (one event loop per process)."""
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.limit)
+        try:
+            await asyncio.wait_for(self._async_slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._overloaded(route) from None
+        self._track(1)
+        try:
+            yield
+        finally:
+            self._track(-1)
+            self._async_slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"limit": self.limit, "active": self.active, "queue_timeout": self.queue_timeout,
+                    "shed": self.shed}
+
+
+# Per-route buckets and the limiter shared by every CRS route
+_buckets: Dict[str, TokenBucket] = {}
+_crs_limiter = None
+_registry_lock = threading.Lock()
+
+
+def get_rate_limiter(route: str) -> TokenBucket:
+    """Token bucket for a route (CRS_RATE_LIMIT requests/s per process, CRS_RATE_BURST burst; 0 disables)."""
+    bucket = _buckets.get(route)
+    if bucket is None:
+        with _registry_lock:
+            bucket = _buckets.get(route)
+            if bucket is None:
+                bucket = _buckets[route] = TokenBucket(float(os.getenv("CRS_RATE_LIMIT", "50")),
+                                                       float(os.getenv("CRS_RATE_BURST", "100")))
+    return bucket
+
+
+def get_crs_limiter() -> ConcurrencyLimiter:
+    """
+    Concurrency cap shared by the CRS routes' bureau fetches.
+
+    CRS_ROUTE_CONCURRENCY (default 4) should stay below the threads per
+    worker (serve.py --threads, default 8), so a slow bureau can never tie up
+    every thread and unrelated routes keep being served. CRS_QUEUE_TIMEOUT
+    (default 0.5s) is how long a request waits for a slot.
+    """
+    global _crs_limiter
+    if _crs_limiter is None:
+        with _registry_lock:
+            if _crs_limiter is None:
+                _crs_limiter = ConcurrencyLimiter(int(os.getenv("CRS_ROUTE_CONCURRENCY", "4")),
+                                                  float(os.getenv("CRS_QUEUE_TIMEOUT", "0.5")))
+    return _crs_limiter
+
+
+def _check_rate(route: str) -> None:
+    wait = get_rate_limiter(route).take()
+    if wait:
+        ADMISSION_REJECTIONS.inc(route, "rate_limit")
+        raise Overloaded("Rate limit exceeded", 429, wait)
+
+
+@contextmanager
+def admitted(route: str):
+    """
+    Run the with block once route's rate limit and the CRS concurrency cap allow.
+
+    Raises:
+        Overloaded: 429 when over the rate limit, 503 when no slot frees up in time
+    """
+    _check_rate(route)
+    with get_crs_limiter().slot(route):
+        yield
+
+
+@asynccontextmanager
+async def admitted_async(route: str):
+    """asyncio variant of admitted."""
+    _check_rate(route)
+    async with get_crs_limiter().slot_async(route):
+        yield
+
+
+def admission_stats() -> Dict[str, Any]:
+    return {"concurrency": get_crs_limiter().stats(),
+            "rate_limit": {route: {"rate": b.rate, "burst": b.burst} for route, b in list(_buckets.items())}}
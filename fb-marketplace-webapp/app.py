@@ -3,12 +3,29 @@ FB Marketplace Helper - Web App
 Serves the UI. Gemini API is called directly from the browser (avoids Python segfault on macOS).
 """
 import os
+import hmac
+import json
 import logging
+import math
+import time
 
-from flask import Flask, Response, jsonify, render_template, request
+from flask import Flask, Response, g, jsonify, render_template, request
+from admission import Overloaded, admission_stats
 from crs_service import get_crs_client
+from generation import GenerationError, get_generation_proxy
+from geo import locate
+from catalog import CatalogView, get_catalog, get_catalog_manager
+from job_queue import get_job_queue
+from metrics import render_metrics, request_finished, request_started
+from profiler import SORT_KEYS, get_profiler
+from response_cache import get_response_cache
+from response_encoding import (COLUMNAR_MIMETYPE, FastJSONProvider, compress_response, dumps, stream_array,
+                               stream_list_field, stream_object, to_columnar)
+from seen_index import get_seen_index, listing_key
+from send_log import get_send_log
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
@@ -16,12 +33,130 @@ logging.basicConfig(level=logging.INFO)
 @app.after_request
 def add_cors(resp):
     resp.headers["Access-Control-Allow-Origin"] = "*"
+    resp.headers["Access-Control-Allow-Headers"] = "Content-Type, If-None-Match"
+    resp.headers["Access-Control-Expose-Headers"] = "ETag, X-Next-Cursor, X-Profile-Id, Retry-After"
     return resp
+
+
+def _metrics_route():
+    # The URL rule, not the path, so per-user URLs don't become new series
+    return request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+
+
+@app.before_request
+def start_catalog_watcher():
+    # Started by the first request in each process rather than at import, so
+    # a preloading gunicorn master forks without the watcher thread
+    get_catalog_manager().start_watching()
+
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_started = request_started(_metrics_route())
+
+
+@app.after_request
+def record_request_metrics(resp):
+    started = g.pop("metrics_started", None)
+    if started is not None:
+        # Streamed bodies (SSE, bulk results) are left out: werkzeug would
+        # read the whole stream to measure it, holding it back until it ends
+        response_bytes = None if resp.is_streamed else resp.calculate_content_length()
+        request_finished(_metrics_route(), request.method, resp.status_code, started,
+                         request.content_length, response_bytes)
+    return resp
+
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    # Requests that never reached after_request (e.g. a later hook raised)
+    started = g.pop("metrics_started", None)
+    if started is not None:
+        request_finished(_metrics_route(), request.method, 500, started, request.content_length)
+
+
+@app.before_request
+def start_profiling():
+    """Profile this request if asked (X-Profile: 1 plus X-Admin-Token) or sampled."""
+    if request.url_rule is None or request.path == "/metrics" or request.path.startswith("/api/admin/"):
+        return
+    profiler = get_profiler()
+    if request.headers.get("X-Profile") == "1" and _admin_error() is None:
+        reason = "requested"
+    elif profiler.should_sample():
+        reason = "sampled"
+    else:
+        return
+    profile = profiler.start()
+    if profile is not None:
+        g.profile = (profile, reason, time.perf_counter())
+
+
+def _finish_profile(status):
+    profile, reason, started = g.pop("profile")
+    return get_profiler().finish(
+        profile, route=request.url_rule.rule, method=request.method, path=request.path, status=status,
+        reason=reason, duration_ms=round((time.perf_counter() - started) * 1000, 3))
+
+
+@app.after_request
+def stop_profiling(resp):
+    if "profile" in g:
+        resp.headers["X-Profile-Id"] = str(_finish_profile(resp.status_code))
+    return resp
+
+
+@app.teardown_request
+def abandon_profiling(exc):
+    if "profile" in g:
+        _finish_profile(500)
+
+
+@app.after_request
+def compress(resp):
+    # Registered last so it runs first: the hooks above see the encoded body
+    return compress_response(resp, request.accept_encodings)
+
+
+def _wants_columnar():
+    """True if the client asked for the compact columnar format in Accept."""
+    return request.accept_mimetypes.best_match(["application/json", COLUMNAR_MIMETYPE]) == COLUMNAR_MIMETYPE
+
+
 app.secret_key = os.urandom(24)
 
-# In-memory store for the extension
-_payload = {"message": "", "searchKeyword": "", "maxPrice": None, "minPrice": None}
-_logs = []
+# Empty payload returned when no job is queued
+_EMPTY_PAYLOAD = {"message": "", "searchKeyword": "", "maxPrice": None, "minPrice": None}
+
+# Longest a push/long-poll request is held before the client must reconnect
+MAX_WAIT_SECONDS = 30
+# Comment line sent on idle SSE connections so proxies don't time them out
+SSE_KEEPALIVE_SECONDS = 15
+
+# Largest page /api/logs will return
+MAX_LOG_PAGE = 1000
+# Upper bound on listings per /api/find-sustainable-products/batch call
+MAX_BATCH_ITEMS = 200
+# Upper bound on identities per /api/lookup-users call
+MAX_BULK_IDENTITIES = 500
+# Upper bound on listings per /api/seen-listings/check/batch call (a few results pages)
+MAX_SEEN_CHECK_ITEMS = 1000
+# Longest prompt /api/generate forwards (the extension's prompts are well under 4000)
+MAX_PROMPT_CHARS = 16000
+# Candidates from the CO₂/price order that the distance stage chooses among
+NEAR_CANDIDATES = 20
+
+# Build the catalog indexes once at startup rather than on first request
+get_catalog()
+# Check the generation backend configuration now; a bad one is logged here
+# once and /api/generate then answers 503 as if none were configured
+get_generation_proxy()
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """Route latency, in-flight, payload size, CRS, matching and ranking metrics for this process."""
+    return Response(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.errorhandler(404)
@@ -41,191 +176,355 @@ def index():
 
 @app.route("/api/store-message", methods=["POST"])
 def store_message():
-    """Store message and search params for the extension."""
-    global _payload
-    data = request.get_json(silent=True) or {}
-    _payload = {
+    """Queue a message + search job for the extension.
+
+    Jobs are kept in a durable FIFO queue, so storing a new one no longer
+    overwrites a job that hasn't been picked up yet. A job needs both a
+    message and a searchKeyword; anything else except the legacy clear
+    payload is rejected with a 400.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"success": False, "error": "JSON object required"}), 400
+    payload = {
         "message": data.get("message", ""),
         "searchKeyword": data.get("searchKeyword", ""),
         "maxPrice": data.get("maxPrice"),
         "minPrice": data.get("minPrice"),
     }
-    return jsonify({"success": True})
+    queue = get_job_queue()
+    if _is_clear(data):
+        # Legacy polling clients "clear" the payload they just handled by
+        # storing an empty one; treat that as taking the oldest job
+        head = queue.peek()
+        if head is not None:
+            queue.discard(head.id)
+        return jsonify({"success": True})
+    if not _has_job(payload):
+        return jsonify({"success": False, "error": "message and searchKeyword required"}), 400
+    job_id = queue.enqueue(payload)
+    return jsonify({"success": True, "id": job_id})
 
 
 @app.route("/api/latest-message")
 def latest_message():
-    """Return the full payload (used by the sender extension)."""
-    return jsonify(_payload)
+    """Return the oldest queued payload without taking it (used by the sender extension)."""
+    head = get_job_queue().peek()
+    return jsonify(head.payload if head else _EMPTY_PAYLOAD)
+
+
+def _is_clear(data):
+    """The legacy clear call: message and searchKeyword given as empty strings, no prices."""
+    return (data.get("message") == "" and data.get("searchKeyword") == ""
+            and data.get("maxPrice") is None and data.get("minPrice") is None)
+
+
+def _has_job(payload):
+    """A payload is actionable once it has both a message and a search keyword."""
+    return all(isinstance(payload.get(key), str) and payload[key].strip() for key in ("message", "searchKeyword"))
+
+
+def _wait_seconds(value=None):
+    """Clamp a ?wait= value (defaults to the current request's) to [0, MAX_WAIT_SECONDS]."""
+    if value is None:
+        value = request.args.get("wait", MAX_WAIT_SECONDS)
+    try:
+        wait = float(value)
+    except ValueError:
+        wait = MAX_WAIT_SECONDS
+    return max(0.0, min(wait, MAX_WAIT_SECONDS))
+
+
+def _job_body(job, manual):
+    body = {"success": True, "id": job.id, "payload": job.payload}
+    if manual:
+        body["leaseToken"] = job.lease_token
+        body["attempt"] = job.attempts
+    return body
+
+
+@app.route("/api/consume-message", methods=["POST"])
+def consume_message():
+    """Long-poll for the next queued job and take it.
+
+    Holds the request for up to ?wait= seconds (max MAX_WAIT_SECONDS); 204 if
+    nothing arrived in time. By default the job is acknowledged as it is
+    handed out. With ?ack=manual it is only leased: the response carries a
+    leaseToken for /api/ack-message, and the job is redelivered if it isn't
+    acknowledged within the visibility timeout.
+    """
+    queue = get_job_queue()
+    manual = request.args.get("ack") == "manual"
+    job = queue.wait_for(queue.lease if manual else queue.consume, _wait_seconds())
+    if job is None:
+        return Response(status=204)
+    return jsonify(_job_body(job, manual))
+
+
+@app.route("/api/ack-message", methods=["POST"])
+def ack_message():
+    """Acknowledge (or with "release": true, give back) a job leased with ?ack=manual.
+
+    Expects JSON: { id, leaseToken, release (optional) }
+    """
+    data = request.get_json(silent=True) or {}
+    job_id = data.get("id")
+    token = data.get("leaseToken")
+    if not isinstance(job_id, int) or not token:
+        return jsonify({"success": False, "error": "id and leaseToken required"}), 400
+
+    queue = get_job_queue()
+    done = queue.release(job_id, token) if data.get("release") else queue.ack(job_id, token)
+    if not done:
+        return jsonify({"success": False, "error": "Lease expired or job already acknowledged"}), 409
+    return jsonify({"success": True})
+
+
+@app.route("/api/queue-stats")
+def queue_stats():
+    """Counts of ready, leased and dead jobs."""
+    return jsonify(get_job_queue().stats())
+
+
+@app.route("/api/message-stream")
+def message_stream():
+    """Server-Sent Events stream of jobs, pushed as soon as they are queued.
+
+    ?consume=1 takes each job as it is pushed (one consumer receives it).
+    Without it, queued jobs are announced without being taken, and
+    reconnecting clients send Last-Event-ID to skip jobs already seen. The
+    stream ends after MAX_WAIT_SECONDS so that worker threads are recycled;
+    EventSource reconnects automatically.
+    """
+    consume = request.args.get("consume") in ("1", "true")
+    try:
+        last_seen = int(request.headers.get("Last-Event-ID") or request.args.get("lastEventId") or 0)
+    except ValueError:
+        last_seen = 0
+    queue = get_job_queue()
+
+    def events():
+        seen = last_seen
+        deadline = time.monotonic() + MAX_WAIT_SECONDS
+        yield "retry: 1000\n\n"
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            fetch = queue.consume if consume else (lambda: queue.peek(after_id=seen))
+            job = queue.wait_for(fetch, min(SSE_KEEPALIVE_SECONDS, remaining))
+            if job is None:
+                yield ": keepalive\n\n"
+                continue
+            seen = job.id
+            yield f"id: {job.id}\nevent: payload\ndata: {json.dumps(job.payload)}\n\n"
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @app.route("/api/log-sent", methods=["POST"])
 def log_sent():
     """Store a record when the extension sends a message. Useful for tracking/testing.
 
-    Expects JSON: { conversationId, listing: { title, price, description }, message }
+    Expects JSON: { conversationId, listing: { title, price, description, seller (optional) }, message }
+
+    The listing is also added to the seen listing index, so later search
+    cycles skip it (see /api/seen-listings/check).
     """
     data = request.get_json(silent=True) or {}
     entry = {
         "conversationId": data.get("conversationId"),
         "listing": data.get("listing"),
         "message": data.get("message"),
-        "timestamp": int(__import__('time').time())
+        "timestamp": int(time.time())
     }
-    _logs.append(entry)
+    get_send_log().append(entry)
+    if isinstance(entry["listing"], dict):
+        get_seen_index().add(entry["listing"], entry["conversationId"])
     return jsonify({"success": True})
 
 
+@app.route("/api/seen-listings/check", methods=["POST"])
+def check_seen_listing():
+    """Whether a listing has already been messaged.
+
+    Expects JSON: { title, price (optional), seller (optional) }; a listing is
+    identified by these three fields, so a relisted item with a new ID still
+    matches. Returns { seen, key } with key the listing's hex content hash.
+    """
+    data = request.get_json(silent=True) or {}
+    key = listing_key(data) if isinstance(data, dict) else None
+    if key is None:
+        return jsonify({"success": False, "error": "title required"}), 400
+    return jsonify({"seen": data in get_seen_index(), "key": key.hex()})
+
+
+@app.route("/api/seen-listings/check/batch", methods=["POST"])
+def check_seen_listings_batch():
+    """Filter a whole results page in one call before opening any listing.
+
+    Expects JSON: { listings: [{ title, price, seller }, ...] }
+    Returns { seen: [bool, ...] } in input order; entries without a title
+    count as not seen.
+    """
+    data = request.get_json(silent=True) or {}
+    listings = data.get("listings")
+    if not isinstance(listings, list):
+        return jsonify({"success": False, "error": "listings required"}), 400
+    if len(listings) > MAX_SEEN_CHECK_ITEMS:
+        return jsonify({
+            "success": False,
+            "error": f"at most {MAX_SEEN_CHECK_ITEMS} listings per batch"
+        }), 400
+    return jsonify({"seen": get_seen_index().contains_many(listings)})
+
+
+@app.route("/api/seen-listings/stats")
+def seen_listings_stats():
+    """Size of the seen listing index and how many checks the Bloom filter answered alone."""
+    return jsonify(get_seen_index().stats())
+
+
 @app.route("/api/logs")
 def get_logs():
-    return jsonify(_logs)
+    """Return one page of sent-message records, newest first.
+
+    Query params (all optional):
+        limit           page size (default 100, max MAX_LOG_PAGE)
+        cursor          value of X-Next-Cursor from the previous page
+        conversationId  only records for this conversation
+        since, until    epoch-second time range [since, until)
+        order           "desc" (default) or "asc"
+
+    The body stays a JSON list, streamed as it is read; the cursor for the
+    next page is sent in the X-Next-Cursor header (absent on the last page).
+    Each record is the logged entry plus an "id" field, its position in the
+    log (the value cursors refer to).
+    """
+    try:
+        limit = min(max(_int_arg("limit", 100), 1), MAX_LOG_PAGE)
+        cursor = _int_arg("cursor")
+        since = _int_arg("since")
+        until = _int_arg("until")
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    entries, next_cursor = get_send_log().query(
+        limit=limit,
+        cursor=cursor,
+        conversation_id=request.args.get("conversationId"),
+        since=since,
+        until=until,
+        newest_first=request.args.get("order", "desc") != "asc",
+    )
+    resp = Response(stream_array(map(dumps, entries)), mimetype="application/json")
+    if next_cursor is not None:
+        resp.headers["X-Next-Cursor"] = str(next_cursor)
+    return resp
 
 
-@app.route("/api/find-sustainable-products", methods=["POST"])
-def find_sustainable_products():
-    """Find sustainable product alternatives.
-    
-    Expected JSON body:
-    {
-        "productName": "string",
-        "currentPrice": "float (optional)",
-        "category": "string (optional)",
-        "description": "string (optional)"
-    }
-    
-    Returns:
-    {
-        "success": true,
-        "alternatives": [
-            {
-                "name": "product name",
-                "price": 99.99,
-                "co2_savings": 45.5,
-                "source": "amazon|target|ebay|etc",
-                "url": "product url",
-                "sustainable_reason": "reason why it's sustainable"
-            }
-        ]
-    }
+def _int_arg(name, default=None):
+    """Integer query parameter, default when absent. Raises ValueError naming it if malformed."""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer") from None
+
+
+@app.route("/api/generate", methods=["POST"])
+def generate_message():
+    """Draft a message through the server-side generation proxy.
+
+    Expects JSON: { prompt }
+    Returns { success, text, cached }. Identical prompts are answered from
+    cache or share one in-flight call. 503 means no usable backend is
+    configured (GENERATION_BACKEND / GEMINI_API_KEY) and the extension should
+    call the API itself; 502 means the backend failed.
     """
     data = request.get_json(silent=True) or {}
-    product_name = data.get("productName", "")
-    
-    if not product_name:
-        return jsonify({"success": False, "error": "productName required"}), 400
-    
-    # Mock sustainable alternatives database
-    # In production, this would query a real database or API
-    alternatives = _get_sustainable_alternatives(product_name, data)
-    
-    return jsonify({
-        "success": True,
-        "alternatives": alternatives
-    })
+    prompt = data.get("prompt") if isinstance(data, dict) else None
+    if not isinstance(prompt, str) or not prompt.strip():
+        return jsonify({"success": False, "error": "prompt required"}), 400
+    if len(prompt) > MAX_PROMPT_CHARS:
+        return jsonify({"success": False, "error": f"prompt longer than {MAX_PROMPT_CHARS} characters"}), 400
+
+    proxy = get_generation_proxy()
+    if proxy is None:
+        return jsonify({"success": False, "error": "Generation proxy not configured"}), 503
+    try:
+        text, cached = proxy.generate(prompt)
+    except GenerationError as e:
+        logger.warning(f"Generation failed: {e}")
+        return jsonify({"success": False, "error": str(e)}), 502
+    return jsonify({"success": True, "text": text, "cached": cached})
+
+
+@app.route("/api/generation-stats")
+def generation_stats():
+    """Cache and batching counters for the generation proxy."""
+    proxy = get_generation_proxy()
+    if proxy is None:
+        return jsonify({"configured": False})
+    return jsonify({"configured": True, **proxy.stats()})
+
+
+def _get_sustainable_alternatives(product_name, data, catalog=None):
+    """Generate sustainable alternatives based on product name.
+
+    The listing's description and category (from data) are used for fuzzy
+    matching when no category keyword appears in the title. Pass the catalog
+    a request is already using so it is consistent across a catalog swap.
+
+    Returns a CatalogView; items are materialized lazily as fresh dicts.
+    """
+    # Catalog data comes from CATALOG_PATH (hot-reloaded) or the built-in
+    # DEFAULT_CATALOG; see CatalogManager and /api/admin/catalog/items
+    return (catalog or get_catalog()).lookup(product_name, description=_text_field(data, "description"),
+                                category=_text_field(data, "category"))
 
 
-def _get_sustainable_alternatives(product_name, data):
-    """Generate sustainable alternatives based on product name."""
-    # This is a mock implementation. You'll want to:
-    # 1. Query a real database of sustainable products
-    # 2. Use AI/ML to match the current product to sustainable alternatives
-    # 3. Include real pricing and carbon data
-    
-    alternatives = []
-    product_lower = product_name.lower()
-    
-    # Example mapping - replace with real data source
-    sustainable_db = {
-        "phone": [
-            {
-                "name": "Refurbished iPhone 12",
-                "price": 399,
-                "co2_savings": 65,
-                "reason": "Refurbished reduces manufacturing emissions by 65%"
-            },
-            {
-                "name": "Used iPhone 11",
-                "price": 299,
-                "co2_savings": 70,
-                "reason": "Pre-owned reduces new production waste"
-            }
-        ],
-        "chair": [
-            {
-                "name": "Upcycled Office Chair",
-                "price": 89,
-                "co2_savings": 35,
-                "reason": "Made from recycled materials"
-            },
-            {
-                "name": "Wooden Sustainable Chair",
-                "price": 179,
-                "co2_savings": 28,
-                "reason": "FSC-certified wood from sustainable forests"
-            }
-        ],
-        "table": [
-            {
-                "name": "Reclaimed Wood Table",
-                "price": 249,
-                "co2_savings": 42,
-                "reason": "Reclaimed wood reduces deforestation"
-            },
-            {
-                "name": "Bamboo Dining Table",
-                "price": 199,
-                "co2_savings": 38,
-                "reason": "Bamboo is highly renewable and durable"
-            }
-        ],
-        "laptop": [
-            {
-                "name": "Certified Refurbished Laptop",
-                "price": 599,
-                "co2_savings": 85,
-                "reason": "Refurbished saves up to 85% in manufacturing emissions"
-            }
-        ],
-        "clothing": [
-            {
-                "name": "Organic Cotton Shirt",
-                "price": 45,
-                "co2_savings": 12,
-                "reason": "Organic cotton uses 91% less water"
-            },
-            {
-                "name": "Recycled Polyester Jacket",
-                "price": 89,
-                "co2_savings": 18,
-                "reason": "Made from recycled plastic bottles"
-            }
-        ]
-    }
-    
-    # Try to match to a category
-    for category, products in sustainable_db.items():
-        if category in product_lower:
-            alternatives = products[:5]  # Return top 5
-            break
-    
-    # If no match, return generic sustainable alternatives
-    if not alternatives:
-        alternatives = [
-            {
-                "name": "Refurbished/Pre-owned Option",
-                "price": "Contact seller",
-                "co2_savings": "50-70%",
-                "reason": "Extending product life reduces eco impact"
-            },
-            {
-                "name": "Rental Service",
-                "price": "Variable",
-                "co2_savings": "60-80%",
-                "reason": "Sharing reduces manufacturing demand"
-            }
-        ]
-    
-    return alternatives
+def _is_text(value):
+    """A non-blank string."""
+    return isinstance(value, str) and bool(value.strip())
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _profile_error(user_profile):
+    """Why a userProfile can't be used for ranking, or None if it can (or is absent)."""
+    if not user_profile:
+        return None
+    if not isinstance(user_profile, dict):
+        return "userProfile must be an object"
+    score_tier = user_profile.get("score_tier")
+    if score_tier is not None and not isinstance(score_tier, str):
+        return "userProfile.score_tier must be a string"
+    price_range = user_profile.get("price_range")
+    if price_range is not None:
+        if not isinstance(price_range, dict):
+            return "userProfile.price_range must be an object"
+        for bound in ("min", "max"):
+            if price_range.get(bound) is not None and not _is_number(price_range[bound]):
+                return f"userProfile.price_range.{bound} must be a number"
+    radius_km = user_profile.get("radius_km")
+    if radius_km is not None and not _is_number(radius_km):
+        return "userProfile.radius_km must be a number"
+    return None
+
+
+def _text_field(data, key):
+    value = (data or {}).get(key)
+    return value if isinstance(value, str) else ""
+
+
+def _overloaded_response(e):
+    return jsonify({"success": False, "error": str(e)}), e.status, {"Retry-After": str(e.retry_after)}
 
 
 @app.route("/api/lookup-user", methods=["POST"])
@@ -251,21 +550,23 @@ def lookup_user():
         }), 400
     
     crs = get_crs_client()
-    user_data = crs.lookup_user(name, dob)
-    
-    if not user_data:
+    # Cached lookup; sensitive data is sanitized before it is cached.
+    # A cache miss is shed with 429/503 when the bureau fetch isn't admitted
+    try:
+        result = crs.lookup_profile(name, dob, route=request.url_rule.rule)
+    except Overloaded as e:
+        return _overloaded_response(e)
+    
+    if not result:
         return jsonify({
             "success": False,
             "error": "User not found in credit records"
         }), 404
     
-    # Sanitize sensitive data before sending to client
-    sanitized = crs.sanitize_data(user_data)
-    
     return jsonify({
         "success": True,
-        "user_profile": sanitized,
-        "data_source": user_data.get("data_source")
+        "user_profile": result["user_profile"],
+        "data_source": result["data_source"]
     })
 
 
@@ -290,24 +591,83 @@ def lookup_user_by_email():
         }), 400
     
     crs = get_crs_client()
-    user_data = crs.get_user_by_email(email)
+    # Cached lookup; sensitive data is sanitized before it is cached
+    try:
+        result = crs.lookup_profile_by_email(email, route=request.url_rule.rule)
+    except Overloaded as e:
+        return _overloaded_response(e)
     
-    if not user_data:
+    if not result:
         return jsonify({
             "success": False,
             "error": "User not found"
         }), 404
     
-    # Sanitize sensitive data
-    sanitized = crs.sanitize_data(user_data)
-    
     return jsonify({
         "success": True,
-        "user_profile": sanitized,
-        "data_source": user_data.get("data_source")
+        "user_profile": result["user_profile"],
+        "data_source": result["data_source"]
     })
 
 
+@app.route("/api/lookup-users", methods=["POST"])
+def lookup_users():
+    """Look up many users at once (e.g. to pre-warm profiles for a cohort).
+    
+    Expected JSON:
+    {
+        "identities": [
+            {"name": "John Doe", "dob": "01/15/1990"},
+            {"email": "user@example.com"}
+        ]
+    }
+    
+    Returns one result per identity, in order, each with a "status" of
+    found, not_found, error or invalid. Failed lookups don't fail the request.
+    """
+    data = request.get_json(silent=True) or {}
+    identities = data.get("identities")
+    
+    if not isinstance(identities, list) or not identities:
+        return jsonify({
+            "success": False,
+            "error": "identities required"
+        }), 400
+    if len(identities) > MAX_BULK_IDENTITIES:
+        return jsonify({
+            "success": False,
+            "error": f"at most {MAX_BULK_IDENTITIES} identities per request"
+        }), 400
+    
+    # Misses shed by admission control come back as per-identity errors
+    results = get_crs_client().lookup_many(identities, route=request.url_rule.rule)
+    
+    # Results are streamed one by one rather than encoded as a single body
+    return Response(stream_list_field({"success": True, "summary": _status_summary(results)}, "results",
+                                      (dumps(result) for result in results)),
+                    mimetype="application/json")
+
+
+def _status_summary(results):
+    """Count bulk lookup results per status."""
+    summary = {}
+    for entry in results:
+        summary[entry["status"]] = summary.get(entry["status"], 0) + 1
+    return summary
+
+
+@app.route("/api/crs-cache-stats")
+def crs_cache_stats():
+    """Hit/miss/eviction counters for the CRS profile cache."""
+    return jsonify(get_crs_client().cache.stats())
+
+
+@app.route("/api/admission-stats")
+def crs_admission_stats():
+    """CRS route concurrency, rate limits and circuit breaker state for this process."""
+    return jsonify({**admission_stats(), "circuit": get_crs_client().breaker.stats()})
+
+
 @app.route("/api/find-sustainable-products", methods=["POST"])
 def find_sustainable_products():
     """Find sustainable alternatives, optionally personalized by user credit profile.
@@ -320,94 +680,313 @@ def find_sustainable_products():
         "userProfile": {
             "score_tier": "excellent|good|fair|poor",
             "price_range": {"min": X, "max": Y},
-            "location": {"city": "...", "state": "...", "zip": "..."}
+            "location": {"city": "...", "state": "...", "zip": "..."},
+            "radius_km": "float (optional)"
         }
     }
+
+    When the catalog has item locations and the profile's location can be
+    placed (lat/lon, or a zip found in the ZIP centroid table), alternatives
+    are also ranked by distance, each with its distance_km; radius_km drops
+    located items farther away in favor of nearer ones.
+    
+    Responses carry an ETag; send it back in If-None-Match to get a 304
+    when the alternatives haven't changed. With Accept set to
+    COLUMNAR_MIMETYPE, alternatives are sent as {"columns": [...], "rows": [...]}.
     """
-    data = request.get_json(silent=True) or {}
-    product_name = data.get("productName", "")
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"success": False, "error": "JSON object required"}), 400
+    product_name = data.get("productName")
     user_profile = data.get("userProfile")
     
-    if not product_name:
+    if not _is_text(product_name):
         return jsonify({"success": False, "error": "productName required"}), 400
+    error = _profile_error(user_profile)
+    if error:
+        return jsonify({"success": False, "error": error}), 400
+    
+    # Popular products are served from pre-encoded bodies
+    catalog = get_catalog()
+    cache = get_response_cache()
+    columnar = _wants_columnar()
+    key = _response_cache_key(catalog, product_name, data, user_profile)
+    if key is not None and columnar:
+        key += ("columnar",)
+    cached = cache.get(catalog.version, key) if key is not None else None
+    if cached is not None:
+        etag, body = cached
+    else:
+        # Get base alternatives
+        alternatives = _get_sustainable_alternatives(product_name, data, catalog)
+        
+        # Personalize by user profile if available
+        if user_profile:
+            alternatives = _filter_by_user_profile(alternatives, user_profile)
+        
+        alternatives = list(alternatives)
+        body = dumps({
+            "success": True,
+            "alternatives": to_columnar(alternatives) if columnar else alternatives,
+            "personalized": bool(user_profile)
+        })
+        if key is not None:
+            etag = cache.set(catalog.version, key, body)
+        else:
+            etag = cache.etag_for(body)
+    
+    # Weak comparison: compressed responses carry the weakened ETag
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(body, mimetype=COLUMNAR_MIMETYPE if columnar else "application/json")
+    resp.set_etag(etag)
+    resp.vary.add("Accept")
+    return resp
+
+
+def _response_cache_key(catalog, product_name, data, user_profile):
+    """Everything the alternatives depend on, or None if the request isn't cacheable."""
+    if user_profile and not isinstance(user_profile, dict):
+        return None
+    name = " ".join(product_name.lower().split())
+    # Description and category only matter when no keyword is in the name
+    if catalog.match_category(product_name) is None:
+        listing = (name, _text_field(data, "category").lower(), _text_field(data, "description"))
+    else:
+        listing = (name,)
+    if not user_profile:
+        return listing
+    personalization = [user_profile.get("score_tier", "good"), user_profile.get("price_range") or {}]
+    if catalog.has_locations:
+        # Only located catalogs rank by distance; elsewhere location doesn't split the cache
+        personalization += [locate(user_profile), _radius_km(user_profile)]
+    return listing + (json.dumps(personalization, sort_keys=True, default=str),)
+
+
+@app.route("/api/response-cache-stats")
+def response_cache_stats():
+    """Hit/miss/eviction counters for the product response cache."""
+    return jsonify(get_response_cache().stats())
+
+
+@app.route("/api/find-sustainable-products/batch", methods=["POST"])
+def find_sustainable_products_batch():
+    """Find sustainable alternatives for many listings in one request.
     
-    # Get base alternatives
-    alternatives = _get_sustainable_alternatives(product_name, data)
+    Expected JSON body:
+    {
+        "items": [
+            {"productName": "string", "currentPrice": "float (optional)", "description": "string (optional)",
+             "category": "string (optional)"}
+        ],
+        "userProfile": { ... same as /api/find-sustainable-products ... }
+    }
     
-    # Personalize by user profile if available
-    if user_profile:
-        alternatives = _filter_by_user_profile(alternatives, user_profile)
+    Returns results keyed by input index. Identical product names are
+    matched, ranked and encoded once and shared across their indexes. Every
+    listing is ranked before the response starts, so errors still get a
+    proper status; only the encoding is streamed. Accept COLUMNAR_MIMETYPE
+    selects the columnar format for every result.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"success": False, "error": "JSON object required"}), 400
+    items = data.get("items")
+    user_profile = data.get("userProfile")
     
-    return jsonify({
-        "success": True,
-        "alternatives": alternatives,
-        "personalized": bool(user_profile)
-    })
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "error": "items required"}), 400
+    if len(items) > MAX_BATCH_ITEMS:
+        return jsonify({
+            "success": False,
+            "error": f"at most {MAX_BATCH_ITEMS} items per batch"
+        }), 400
+    error = _profile_error(user_profile)
+    if error:
+        return jsonify({"success": False, "error": error}), 400
+    
+    errors = {}
+    unique = {}
+    indexes = {}
+    for index, item in enumerate(items):
+        product_name = item.get("productName") if isinstance(item, dict) else None
+        if not _is_text(product_name):
+            errors[str(index)] = "productName required"
+            continue
 
+        description = _text_field(item, "description")
+        category = _text_field(item, "category")
+        key = (" ".join(product_name.lower().split()), category.lower(), description)
+        if key not in unique:
+            unique[key] = (product_name, description, category)
+        indexes.setdefault(key, []).append(index)
+
+    # Fuzzy matching for every distinct listing runs as one vectorized search
+    views = get_catalog().lookup_many(list(unique.values()))
+    columnar = _wants_columnar()
+    ranked = [list(_filter_by_user_profile(alternatives, user_profile) if user_profile else alternatives)
+              for alternatives in views]
+
+    def results():
+        for key, alternatives in zip(unique, ranked):
+            encoded = dumps(to_columnar(alternatives) if columnar else alternatives)
+            for index in indexes[key]:
+                yield str(index), encoded
+
+    resp = Response(stream_object({"success": True, "errors": errors, "personalized": bool(user_profile)},
+                                  "results", results()),
+                    mimetype=COLUMNAR_MIMETYPE if columnar else "application/json")
+    resp.vary.add("Accept")
+    return resp
 
-def _filter_by_user_profile(alternatives, user_profile):
-    """Filter and rank alternatives based on user credit profile and price tier."""
-    
-    price_range = user_profile.get("price_range", {})
-    score_tier = user_profile.get("score_tier", "good")
+
+def _admin_error():
+    """Error response unless the request carries X-Admin-Token matching ADMIN_TOKEN."""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        return jsonify({"success": False, "error": "Admin API disabled (ADMIN_TOKEN not set)"}), 403
+    token = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(token.encode(), expected.encode()):
+        return jsonify({"success": False, "error": "Invalid admin token"}), 401
+    return None
+
+
+@app.route("/api/admin/catalog/items", methods=["POST"])
+def admin_update_catalog():
+    """Add, update or delete catalog items without a restart.
     
-    # Priority levels by credit tier (higher = more premium options shown first)
-    tier_priority = {
-        "excellent": 4,
-        "good": 3,
-        "fair": 2,
-        "poor": 1
+    Requires the X-Admin-Token header. Expected JSON:
+    {
+        "upsert": [{"category": "chair", "item": {"name": "...", "price": 99, ...}}],
+        "delete": [{"category": "chair", "name": "..."}]
     }
     
-    priority = tier_priority.get(score_tier, 3)
+    The new catalog is built off to the side and swapped in atomically; with
+    CATALOG_PATH set it is also written back to the file so other workers
+    reload it.
+    """
+    error = _admin_error()
+    if error:
+        return error
+    data = request.get_json(silent=True) or {}
+    upserts = data.get("upsert") or []
+    deletes = data.get("delete") or []
+    if not isinstance(upserts, list) or not isinstance(deletes, list) or not (upserts or deletes):
+        return jsonify({"success": False, "error": "upsert and/or delete lists required"}), 400
     
-    # Filter alternatives within user's price range
-    filtered = []
-    for alt in alternatives:
-        price = alt.get("price")
-        
-        # Skip if price is not a number (e.g., "Contact seller")
-        if not isinstance(price, (int, float)):
-            # Always include options without clear pricing for lower tiers
-            if priority <= 2:
-                filtered.append(alt)
-            continue
-        
-        # Check if price is within user's recommended range
-        if price_range.get("min") and price_range.get("max"):
-            if price_range["min"] <= price <= price_range["max"]:
-                filtered.append(alt)
-        else:
-            # No price range specified, include all
-            filtered.append(alt)
-    
-    # If no alternatives match price range, show closest ones with warning
-    if not filtered and alternatives:
-        filtered = alternatives[:3]
-        # Add note about price range
-        for alt in filtered:
-            alt["note"] = "Note: Outside your typical price range"
+    manager = get_catalog_manager()
+    try:
+        counts = manager.apply_changes(upserts, deletes)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     
-    # Sort by CO₂ savings (prioritize environmental impact)
-    filtered = sorted(
-        filtered,
-        key=lambda x: (
-            # First sort by carbon savings (descending)
-            -float(str(x.get("co2_savings", 0)).replace("kg CO₂", "").replace("%", "").strip() or 0),
-            # Then by price (if in range, prefer lower)
-            x.get("price") if isinstance(x.get("price"), (int, float)) else float('inf')
-        )
-    )
+    catalog = manager.current
+    return jsonify({"success": True, **counts, "version": catalog.version, "items": len(catalog)})
+
+
+@app.route("/api/admin/profiles")
+def admin_list_profiles():
+    """Captured request profiles, newest first (requires X-Admin-Token).
     
-    # Add personalization notes
-    for i, alt in enumerate(filtered):
+    Send X-Profile: 1 with X-Admin-Token on any request to profile it, or
+    set PROFILE_SAMPLE_RATE to profile a fraction of all requests.
+    """
+    error = _admin_error()
+    if error:
+        return error
+    profiler = get_profiler()
+    return jsonify({"success": True, "sample_rate": profiler.sample_rate, "profiles": profiler.list()})
+
+
+@app.route("/api/admin/profiles/<int:profile_id>")
+def admin_download_profile(profile_id):
+    """Download one profile (requires X-Admin-Token).
+    
+    ?format=pstats (default) returns the binary stats file for pstats,
+    snakeviz and similar tools; ?format=text returns the top functions,
+    ordered by ?sort=cumulative|tottime|ncalls.
+    """
+    error = _admin_error()
+    if error:
+        return error
+    entry = get_profiler().get(profile_id)
+    if entry is None:
+        return jsonify({"success": False, "error": "Profile not found"}), 404
+    
+    fmt = request.args.get("format", "pstats")
+    if fmt == "text":
+        sort = request.args.get("sort", "cumulative")
+        if sort not in SORT_KEYS:
+            return jsonify({"success": False, "error": f"sort must be one of {', '.join(SORT_KEYS)}"}), 400
+        return Response(get_profiler().render_text(entry["stats"], sort), mimetype="text/plain")
+    if fmt != "pstats":
+        return jsonify({"success": False, "error": "format must be pstats or text"}), 400
+    return Response(entry["stats"], mimetype="application/octet-stream", headers={
+        "Content-Disposition": f"attachment; filename=profile-{profile_id}.prof"})
+
+
+@app.route("/api/admin/catalog/reload", methods=["POST"])
+def admin_reload_catalog():
+    """Rebuild the catalog from CATALOG_PATH now (requires X-Admin-Token)."""
+    error = _admin_error()
+    if error:
+        return error
+    try:
+        catalog = get_catalog_manager().reload()
+    except Exception as e:
+        logger.error(f"Catalog reload failed: {e}")
+        return jsonify({"success": False, "error": "Catalog reload failed"}), 500
+    return jsonify({"success": True, "version": catalog.version, "items": len(catalog)})
+
+
+def _radius_km(user_profile):
+    """The profile's radius_km as a positive float, else None."""
+    radius = user_profile.get("radius_km")
+    if isinstance(radius, bool) or not isinstance(radius, (int, float)):
+        return None
+    return float(radius) if radius > 0 and math.isfinite(radius) else None
+
+
+def _filter_by_user_profile(alternatives, user_profile):
+    """Filter and rank alternatives based on user credit profile, price tier and location."""
+    
+    price_range = user_profile.get("price_range") or {}
+    score_tier = user_profile.get("score_tier", "good")
+    
+    # Rank on the catalog's precomputed price/CO₂ arrays; item dicts are
+    # only materialized (as fresh copies) for the entries we return
+    if not isinstance(alternatives, CatalogView):
+        alternatives = CatalogView.from_records(list(alternatives))
+    # A category's whole item list is ranked, not just the items in the view
+    ranker = alternatives.ranker
+    origin = locate(user_profile) if ranker.geo is not None else None
+    distances = None
+    if origin is None:
+        ranked, outside_range = alternatives.rank(price_range, score_tier)
+    else:
+        # Distance stage: reorder a wider cut of the CO₂/price order
+        ranked, outside_range = alternatives.rank(price_range, score_tier, limit=NEAR_CANDIDATES)
+        ranked, distances = ranker.rank_near(ranked, origin, _radius_km(user_profile), price_range, score_tier)
+    
+    results = []
+    for i, item_id in enumerate(ranked):
+        alt = alternatives.store.record(item_id)
+        if distances is not None and not math.isnan(distances[i]):
+            alt["distance_km"] = round(float(distances[i]), 1)
+        if outside_range:
+            # No alternatives match the price range, show closest ones with warning
+            alt["note"] = "Note: Outside your typical price range"
+        # Add personalization notes
         if i == 0:
             alt["badge"] = "💡 Recommended for you"
         elif i == 1:
             alt["badge"] = "💚 Also great choice"
+        results.append(alt)
     
-    return filtered[:5]  # Return top 5 filtered alternatives
+    return results  # Return top 5 filtered alternatives
 
 
 if __name__ == "__main__":
+    # Development server; for many concurrent clients serve asgi:app instead
     app.run(host="0.0.0.0", debug=False, port=5001)
@@ -0,0 +1,206 @@
+"""
+ASGI Entry Point
+Async serving mode: CRS lookups and the extension long-poll run on the event
+loop; every other route is served by the Flask app through a WSGI adapter
+
+Usage:
+    uvicorn asgi:app --host 0.0.0.0 --port 5001 --workers 4
+
+Requires starlette, a2wsgi (the Flask adapter) and, for the async CRS
+transport, httpx.
+
+A request waiting on the bureau or on the job queue holds no thread, so a few
+worker processes can keep thousands of extension clients connected. The route
+surface is the same as app.py and every response gets the same CORS header
+as add_cors. The async routes record the same request metrics as the Flask
+hooks, so /metrics covers both, and CRS lookups that reach the bureau get
+the same admission control (see admission.py). Request profiling (X-Profile, see
+profiler.py) only applies to the Flask routes: a profile of an event-loop
+route would also capture every other request the loop ran meanwhile.
+"""
+
+import json
+import logging
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+from admission import Overloaded
+from app import (MAX_BULK_IDENTITIES, MAX_WAIT_SECONDS, _job_body, _status_summary,
+                 _wait_seconds, app as flask_app)
+from crs_service import get_crs_client
+from job_queue import get_job_queue
+from metrics import request_finished, request_started
+from response_encoding import dumps, stream_list_field
+
+logger = logging.getLogger(__name__)
+
+# Threads available to the Flask routes mounted under the ASGI app
+WSGI_WORKERS = 32
+
+_flask_asgi = WSGIMiddleware(flask_app, workers=WSGI_WORKERS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded like the Flask routes (orjson when installed)."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+async def _json_body(request: Request) -> dict:
+    """Parsed JSON object body, or {} (like Flask's get_json(silent=True) or {})."""
+    try:
+        data = json.loads(await request.body() or b"null")
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _overloaded_response(e: Overloaded) -> FastJSONResponse:
+    """429/503 with Retry-After for a lookup shed by admission control (see app._overloaded_response)."""
+    return FastJSONResponse({"success": False, "error": str(e)}, status_code=e.status,
+                            headers={"Retry-After": str(e.retry_after),
+                                     "Access-Control-Expose-Headers": "Retry-After"})
+
+
+def _profile_response(result, not_found_error: str) -> FastJSONResponse:
+    if not result:
+        return FastJSONResponse({"success": False, "error": not_found_error}, status_code=404)
+    return FastJSONResponse({
+        "success": True,
+        "user_profile": result["user_profile"],
+        "data_source": result["data_source"]
+    })
+
+
+async def lookup_user(request: Request) -> Response:
+    """Async /api/lookup-user (see app.lookup_user)."""
+    data = await _json_body(request)
+    name = str(data.get("name") or "").strip()
+    dob = str(data.get("dob") or "").strip()
+    if not name or not dob:
+        return FastJSONResponse({"success": False, "error": "name and dob required"}, status_code=400)
+
+    try:
+        result = await get_crs_client().lookup_profile_async(name, dob, route=request.url.path)
+    except Overloaded as e:
+        return _overloaded_response(e)
+    return _profile_response(result, "User not found in credit records")
+
+
+async def lookup_user_by_email(request: Request) -> Response:
+    """Async /api/lookup-user-by-email (see app.lookup_user_by_email)."""
+    data = await _json_body(request)
+    email = str(data.get("email") or "").strip()
+    if not email:
+        return FastJSONResponse({"success": False, "error": "email required"}, status_code=400)
+
+    try:
+        result = await get_crs_client().lookup_profile_by_email_async(email, route=request.url.path)
+    except Overloaded as e:
+        return _overloaded_response(e)
+    return _profile_response(result, "User not found")
+
+
+async def lookup_users(request: Request) -> Response:
+    """Async /api/lookup-users (see app.lookup_users)."""
+    data = await _json_body(request)
+    identities = data.get("identities")
+    if not isinstance(identities, list) or not identities:
+        return FastJSONResponse({"success": False, "error": "identities required"}, status_code=400)
+    if len(identities) > MAX_BULK_IDENTITIES:
+        return FastJSONResponse({
+            "success": False,
+            "error": f"at most {MAX_BULK_IDENTITIES} identities per request"
+        }, status_code=400)
+
+    results = await get_crs_client().lookup_many_async(identities, route=request.url.path)
+    # Streamed one result at a time, like the Flask route
+    return StreamingResponse(stream_list_field({"success": True, "summary": _status_summary(results)}, "results",
+                                               (dumps(result) for result in results)),
+                             media_type="application/json")
+
+
+async def consume_message(request: Request) -> Response:
+    """Async /api/consume-message long-poll (see app.consume_message)."""
+    queue = get_job_queue()
+    manual = request.query_params.get("ack") == "manual"
+    wait = _wait_seconds(request.query_params.get("wait", MAX_WAIT_SECONDS))
+    job = await queue.wait_for_async(queue.lease if manual else queue.consume, wait)
+    if job is None:
+        return Response(status_code=204)
+    return FastJSONResponse(_job_body(job, manual))
+
+
+def _content_length(request: Request):
+    try:
+        return int(request.headers["content-length"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _instrumented(route: str, endpoint):
+    """Wrap an async route with the request metrics app.py records in its hooks."""
+    async def handler(request: Request) -> Response:
+        started = request_started(route)
+        status, response_bytes = 500, None
+        try:
+            response = await endpoint(request)
+            # Streamed responses have no body up front; they're left out, as in the Flask hooks
+            status = response.status_code
+            response_bytes = len(response.body) if hasattr(response, "body") else None
+            return response
+        finally:
+            request_finished(route, request.method, status, started, _content_length(request), response_bytes)
+    return handler
+
+
+class CORSHeaderMiddleware:
+    """Adds the add_cors header to responses that don't already carry it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                if not any(name.lower() == b"access-control-allow-origin" for name, _ in headers):
+                    headers.append((b"access-control-allow-origin", b"*"))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    yield
+    # The async transport is bound to this event loop; close its pool with it
+    client = get_crs_client()
+    if client._async_transport is not None:
+        await client._async_transport.aclose()
+        client._async_transport = None
+
+
+routes = [
+    Route(path, _instrumented(path, endpoint), methods=["POST"])
+    for path, endpoint in (
+        ("/api/lookup-user", lookup_user),
+        ("/api/lookup-user-by-email", lookup_user_by_email),
+        ("/api/lookup-users", lookup_users),
+    )
+] + [
+    Route("/api/consume-message", _instrumented("/api/consume-message", consume_message), methods=["POST"]),
+    Mount("/", _flask_asgi),
+]
+
+app = CORSHeaderMiddleware(Starlette(routes=routes, lifespan=lifespan))
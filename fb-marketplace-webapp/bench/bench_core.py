@@ -0,0 +1,87 @@
+"""
+Micro-benchmarks for the request hot paths (requires pytest-benchmark)
+
+    cd fb-marketplace-webapp/bench
+    python -m pytest --benchmark-json=results.json
+    BENCH_MAX_ITEMS=1000000 python -m pytest -k alternatives
+    pytest-benchmark compare results_old.json results.json
+
+Catalog-backed benchmarks are parametrized over synthetic catalogs of 10 to
+1M items (see conftest.py).
+"""
+
+import itertools
+
+import pytest
+
+import synthetic
+from app import _filter_by_user_profile, _get_sustainable_alternatives, app as flask_app
+from crs_service import CRSClient
+from response_cache import get_response_cache
+
+
+def test_get_sustainable_alternatives(benchmark, synthetic_catalog):
+    names = itertools.cycle(synthetic.product_names(len(synthetic_catalog)))
+
+    def run():
+        return list(_get_sustainable_alternatives(next(names), {}, synthetic_catalog))
+
+    assert benchmark(run) is not None
+
+
+def test_filter_by_user_profile(benchmark, synthetic_catalog):
+    # Views are built up front so only filtering and ranking are timed
+    views = [synthetic_catalog.lookup(name) for name in synthetic.product_names(len(synthetic_catalog))]
+    cases = itertools.cycle(list(zip(views, itertools.cycle(synthetic.user_profiles()))))
+
+    def run():
+        view, profile = next(cases)
+        return _filter_by_user_profile(view, profile)
+
+    assert len(benchmark(run)) <= 5
+
+
+def test_lookup_many_batch(benchmark, synthetic_catalog):
+    listings = [(name, "", "") for name in synthetic.product_names(len(synthetic_catalog), count=200)]
+    views = benchmark(synthetic_catalog.lookup_many, listings)
+    assert len(views) == len(listings)
+
+
+def test_sanitize_data(benchmark):
+    client = CRSClient()
+    records = itertools.cycle(synthetic.crs_records())
+    result = benchmark(lambda: client.sanitize_data(next(records)))
+    assert "credit_score" not in result
+
+
+@pytest.fixture(scope="module")
+def fuzzy_catalog(catalog_dir):
+    return synthetic.build_catalog(1_000, catalog_dir, fuzzy=True)
+
+
+def test_fuzzy_category_match(benchmark, fuzzy_catalog):
+    # Titles without a literal keyword go through the n-gram index
+    queries = itertools.cycle([
+        (f"{adjective} k0000{digit} {noun}", "synthetic benchmark item", "")
+        for adjective, digit, noun in zip(synthetic.ADJECTIVES, "01234", synthetic.NOUNS)
+    ])
+    benchmark(lambda: fuzzy_catalog.lookup_many([next(queries)]))
+
+
+@pytest.mark.parametrize("cached", [False, True], ids=["uncached", "cached"])
+def test_find_sustainable_products_endpoint(benchmark, cached):
+    client = flask_app.test_client()
+    cache = get_response_cache()
+    saved_size = cache.max_size
+    cache.max_size = saved_size if cached else 0
+    cache.clear()
+    bodies = itertools.cycle([
+        {"productName": name, "userProfile": profile}
+        for name, profile in zip(("office chair", "iphone 12", "oak table", "cotton shirt"),
+                                 synthetic.user_profiles(4))
+    ])
+    try:
+        response = benchmark(lambda: client.post("/api/find-sustainable-products", json=next(bodies)))
+    finally:
+        cache.max_size = saved_size
+    assert response.status_code == 200
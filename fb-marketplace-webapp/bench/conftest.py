@@ -0,0 +1,33 @@
+"""
+Benchmark fixtures: synthetic catalogs shared across the whole session.
+
+BENCH_MAX_ITEMS caps the catalog sizes that run (default 100000); set it to
+1000000 for the full sweep.
+"""
+
+import os
+import sys
+
+import pytest
+
+# The webapp modules are flat files one directory up
+WEBAPP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if WEBAPP_DIR not in sys.path:
+    sys.path.insert(0, WEBAPP_DIR)
+
+CATALOG_SIZES = (10, 1_000, 100_000, 1_000_000)
+MAX_ITEMS = int(os.getenv("BENCH_MAX_ITEMS", "100000"))
+
+
+@pytest.fixture(scope="session")
+def catalog_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("catalogs"))
+
+
+@pytest.fixture(scope="session", params=CATALOG_SIZES, ids=lambda n: f"{n}_items")
+def synthetic_catalog(request, catalog_dir):
+    n_items = request.param
+    if n_items > MAX_ITEMS:
+        pytest.skip(f"{n_items} items is above BENCH_MAX_ITEMS={MAX_ITEMS}")
+    import synthetic
+    return synthetic.build_catalog(n_items, catalog_dir)
@@ -0,0 +1,231 @@
+"""
+Load Generator
+Drives every webapp route with concurrent clients and reports latency
+percentiles and throughput as JSON
+
+Usage:
+    python bench/loadgen.py --spawn --concurrency 32 --duration 5 --out load.json
+    python bench/loadgen.py --url http://127.0.0.1:5001 --routes find-products,lookup-user
+    python bench/loadgen.py --spawn --baseline load_old.json --out load.json
+
+--spawn serves the app in-process (threaded dev server, scratch data dir);
+otherwise point --url at a running server (python serve.py, uvicorn asgi:app).
+Each route is loaded on its own for --duration seconds so results don't mix.
+The SSE stream is not included, as it is a long-lived stream rather than a
+request/response route.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from typing import Optional, Dict, Any, Callable, List
+
+import requests
+
+WEBAPP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PRODUCTS = ("office chair", "iPhone 13 Pro", "oak dining table", "gaming laptop", "cotton shirt",
+            "mountain bike", "Apple iPhone 12", "standing desk chair")
+TIERS = ("excellent", "good", "fair", "poor")
+
+
+def _profile(rng: random.Random) -> Dict[str, Any]:
+    low = rng.choice((0, 50, 200, 500))
+    return {"score_tier": rng.choice(TIERS), "price_range": {"min": low, "max": low + 500}}
+
+
+def _identity(rng: random.Random) -> Dict[str, str]:
+    if rng.random() < 0.5:
+        return {"email": f"user{rng.randrange(1000)}@example.com"}
+    return {"name": f"User {rng.randrange(1000)}", "dob": "01/15/1990"}
+
+
+def _ack_roundtrip(session: requests.Session, base: str, rng: random.Random) -> requests.Response:
+    session.post(f"{base}/api/store-message", json={"message": "Hi", "searchKeyword": "bike"})
+    leased = session.post(f"{base}/api/consume-message?wait=0&ack=manual")
+    if leased.status_code != 200:
+        return leased
+    job = leased.json()
+    return session.post(f"{base}/api/ack-message", json={"id": job["id"], "leaseToken": job["leaseToken"]})
+
+
+# name -> request function; each returns the response it timed
+ROUTES: Dict[str, Callable[[requests.Session, str, random.Random], requests.Response]] = {
+    "favicon": lambda s, b, r: s.get(f"{b}/favicon.ico"),
+    "store-message": lambda s, b, r: s.post(f"{b}/api/store-message", json={
+        "message": "Is this still available?", "searchKeyword": r.choice(PRODUCTS), "maxPrice": 200}),
+    "latest-message": lambda s, b, r: s.get(f"{b}/api/latest-message"),
+    "consume-message": lambda s, b, r: s.post(f"{b}/api/consume-message?wait=0"),
+    "ack-message": _ack_roundtrip,
+    "queue-stats": lambda s, b, r: s.get(f"{b}/api/queue-stats"),
+    "log-sent": lambda s, b, r: s.post(f"{b}/api/log-sent", json={
+        "conversationId": str(r.randrange(100)), "listing": {"title": r.choice(PRODUCTS), "price": 100},
+        "message": "Hi"}),
+    "logs": lambda s, b, r: s.get(f"{b}/api/logs?limit=50"),
+    "lookup-user": lambda s, b, r: s.post(f"{b}/api/lookup-user", json={
+        "name": f"User {r.randrange(1000)}", "dob": "01/15/1990"}),
+    "lookup-user-by-email": lambda s, b, r: s.post(f"{b}/api/lookup-user-by-email", json={
+        "email": f"user{r.randrange(1000)}@example.com"}),
+    "lookup-users": lambda s, b, r: s.post(f"{b}/api/lookup-users", json={
+        "identities": [_identity(r) for _ in range(20)]}),
+    "crs-cache-stats": lambda s, b, r: s.get(f"{b}/api/crs-cache-stats"),
+    "find-products": lambda s, b, r: s.post(f"{b}/api/find-sustainable-products", json={
+        "productName": r.choice(PRODUCTS), "description": "Good condition"}),
+    "find-products-personalized": lambda s, b, r: s.post(f"{b}/api/find-sustainable-products", json={
+        "productName": r.choice(PRODUCTS), "userProfile": _profile(r)}),
+    "find-products-batch": lambda s, b, r: s.post(f"{b}/api/find-sustainable-products/batch", json={
+        "items": [{"productName": r.choice(PRODUCTS)} for _ in range(25)], "userProfile": _profile(r)}),
+    "response-cache-stats": lambda s, b, r: s.get(f"{b}/api/response-cache-stats"),
+}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_route(name: str, base: str, concurrency: int, duration: float, seed: int = 0) -> Dict[str, Any]:
+    """Hammer one route from concurrency threads for duration seconds."""
+    fn = ROUTES[name]
+    latencies: List[List[float]] = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    statuses: Dict[int, int] = {}
+    statuses_lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(slot: int):
+        rng = random.Random(seed * 1000 + slot)
+        with requests.Session() as session:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    status = fn(session, base, rng).status_code
+                except requests.RequestException:
+                    status = 0
+                latencies[slot].append(time.perf_counter() - start)
+                if status == 0 or status >= 500:
+                    errors[slot] += 1
+                with statuses_lock:
+                    statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(slot,)) for slot in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    values = sorted(itertools.chain.from_iterable(latencies))
+    ms = lambda seconds: round(seconds * 1000, 3)  # noqa: E731
+    return {
+        "requests": len(values),
+        "errors": sum(errors),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "throughput_rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(values, 50)),
+            "p95": ms(percentile(values, 95)),
+            "p99": ms(percentile(values, 99)),
+            "mean": ms(sum(values) / len(values)) if values else 0.0,
+            "max": ms(values[-1]) if values else 0.0,
+        },
+    }
+
+
+def spawn_server():
+    """Serve the app in this process on a free port; returns (base_url, server)."""
+    os.environ.setdefault("WEBAPP_DATA_DIR", tempfile.mkdtemp(prefix="loadgen-"))
+    if WEBAPP_DIR not in sys.path:
+        sys.path.insert(0, WEBAPP_DIR)
+    from werkzeug.serving import make_server
+    from app import app
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """One line per route shared with the baseline: change in p95 and throughput."""
+    lines = []
+    for name, current in results["routes"].items():
+        old = baseline.get("routes", {}).get(name)
+        if not old:
+            continue
+        p95_old, p95_new = old["latency_ms"]["p95"], current["latency_ms"]["p95"]
+        rps_old, rps_new = old["throughput_rps"], current["throughput_rps"]
+        p95_change = (p95_new - p95_old) / p95_old * 100 if p95_old else 0.0
+        rps_change = (rps_new - rps_old) / rps_old * 100 if rps_old else 0.0
+        lines.append(f"{name:28} p95 {p95_old:9.2f} -> {p95_new:9.2f} ms ({p95_change:+6.1f}%)   "
+                     f"rps {rps_old:9.1f} -> {rps_new:9.1f} ({rps_change:+6.1f}%)")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the webapp routes")
+    parser.add_argument("--url", default="http://127.0.0.1:5001", help="server to test")
+    parser.add_argument("--spawn", action="store_true", help="serve the app in-process instead of --url")
+    parser.add_argument("--routes", default="all", help=f"comma-separated subset of: {', '.join(ROUTES)}")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per route")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    names = list(ROUTES) if args.routes == "all" else [r.strip() for r in args.routes.split(",") if r.strip()]
+    unknown = [n for n in names if n not in ROUTES]
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(unknown)}")
+
+    server = None
+    base = args.url.rstrip("/")
+    if args.spawn:
+        base, server = spawn_server()
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "target": "spawned" if args.spawn else base,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "started_at": int(time.time()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "routes": {},
+    }
+    try:
+        for name in names:
+            stats = run_route(name, base, args.concurrency, args.duration, args.seed)
+            results["routes"][name] = stats
+            latency = stats["latency_ms"]
+            print(f"{name:28} {stats['throughput_rps']:9.1f} rps   p50 {latency['p50']:8.2f}   "
+                  f"p95 {latency['p95']:8.2f}   p99 {latency['p99']:8.2f} ms   errors {stats['errors']}")
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"Wrote {args.out}")
+    if args.baseline:
+        with open(args.baseline) as fh:
+            print("\n".join(["", f"Compared with {args.baseline}:"] + compare(results, json.load(fh))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Synthetic Catalogs
+Deterministic generated catalogs and request inputs for the benchmarks
+"""
+
+import os
+import random
+from typing import Optional, Dict, Any, Iterator, List
+
+from catalog import SustainableCatalog
+from catalog_store import write_catalog
+
+ADJECTIVES = ("vintage", "refurbished", "organic", "bamboo", "recycled", "upcycled", "used", "local")
+NOUNS = ("model", "edition", "set", "pack", "classic", "pro", "mini", "plus")
+TIERS = ("excellent", "good", "fair", "poor")
+
+
+def keyword(cid: int) -> str:
+    # Fixed width and a trailing letter, so no keyword is a substring of another
+    return f"k{cid:05d}x"
+
+
+def category_count(n_items: int) -> int:
+    """About a thousand items per category, and never fewer than five categories."""
+    return max(5, n_items // 1000)
+
+
+def _items(cid: int, count: int, rng: random.Random) -> Iterator[Dict[str, Any]]:
+    for i in range(count):
+        price: Any = round(rng.uniform(5, 2000), 2)
+        if i % 17 == 0:
+            price = "Varies"
+        yield {
+            "name": f"{rng.choice(ADJECTIVES)} {keyword(cid)} {rng.choice(NOUNS)} {i}",
+            "price": price,
+            "co2_savings": f"{rng.randint(1, 300)}kg" if i % 11 else "Varies",
+            "reason": "Synthetic benchmark item",
+            "url": f"https://example.com/{cid}/{i}",
+        }
+
+
+def catalog_data(n_items: int, seed: int = 7) -> Dict[str, Iterator[Dict[str, Any]]]:
+    """{category: items} with n_items spread evenly; items are generated lazily."""
+    n_categories = category_count(n_items)
+    rng = random.Random(seed)
+    base, extra = divmod(n_items, n_categories)
+    return {keyword(cid): _items(cid, base + (cid < extra), rng) for cid in range(n_categories)}
+
+
+def build_catalog(n_items: int, directory: str, fuzzy: bool = False) -> SustainableCatalog:
+    """
+    Write a synthetic catalog file and map it, as production does for large
+    catalogs (items never all sit in Python objects at once).
+    """
+    path = os.path.join(directory, f"synthetic_{n_items}.fbcat")
+    if not os.path.exists(path):
+        write_catalog(catalog_data(n_items), path)
+    return SustainableCatalog.from_file(path, fuzzy=fuzzy)
+
+
+def product_names(n_items: int, count: int = 256, seed: int = 11) -> List[str]:
+    """Listing titles that hit random categories (plus a few misses)."""
+    rng = random.Random(seed)
+    n_categories = category_count(n_items)
+    names = [f"{rng.choice(ADJECTIVES)} {keyword(rng.randrange(n_categories))} {rng.choice(NOUNS)}"
+             for _ in range(count)]
+    for i in range(0, count, 16):
+        names[i] = f"completely unrelated listing {i}"
+    return names
+
+
+def user_profiles(count: int = 64, seed: int = 13) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    profiles = []
+    for _ in range(count):
+        low = rng.choice((0, 50, 200, 500))
+        profiles.append({
+            "score_tier": rng.choice(TIERS),
+            "price_range": {"min": low, "max": low + rng.choice((100, 500, 2000))},
+        })
+    return profiles
+
+
+def crs_records(count: int = 64, seed: Optional[int] = 17) -> List[Dict[str, Any]]:
+    """Raw bureau-shaped records, as passed to CRSClient.sanitize_data."""
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        tier = rng.choice(TIERS)
+        records.append({
+            "name": f"User {i}",
+            "dob": "01/01/1990",
+            "credit_profile": {
+                "credit_score": rng.randint(300, 850),
+                "credit_tier": tier,
+                "payment_history": tier,
+                "debt_to_income": rng.randint(5, 100),
+                "availability_score": rng.randint(40, 99),
+            },
+            "recommended_price_range": {"min": 0, "max": rng.choice((150, 300, 700, 1500))},
+            "address": {"city": "Bench City", "state": "BC", "zip": f"{rng.randint(0, 99999):05d}"},
+            "data_source": "synthetic",
+        })
+    return records
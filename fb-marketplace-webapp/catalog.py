@@ -0,0 +1,712 @@
+"""
+Sustainable Alternatives Catalog
+Builds the alternatives data once at startup into lookup indexes
+"""
+
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from array import array
+from collections import deque
+from collections.abc import Sequence
+from typing import Optional, Dict, Any, List, Iterable, Tuple, Union
+
+from catalog_store import (MAGIC, CatalogFile, item_record, load_source, parse_amount, parse_price,
+                           write_catalog, write_source)
+from geo import locate
+from matcher import NgramIndex, edits1, tokenize
+from metrics import CATALOG_MATCH_SECONDS
+from ranking import RankingEngine
+
+logger = logging.getLogger(__name__)
+
+# Example mapping - replace with real data source
+DEFAULT_CATALOG = {
+    "phone": [
+        {
+            "name": "Refurbished iPhone 12",
+            "price": 399,
+            "co2_savings": 65,
+            "reason": "Refurbished reduces manufacturing emissions by 65%"
+        },
+        {
+            "name": "Used iPhone 11",
+            "price": 299,
+            "co2_savings": 70,
+            "reason": "Pre-owned reduces new production waste"
+        }
+    ],
+    "chair": [
+        {
+            "name": "Upcycled Office Chair",
+            "price": 89,
+            "co2_savings": 35,
+            "reason": "Made from recycled materials"
+        },
+        {
+            "name": "Wooden Sustainable Chair",
+            "price": 179,
+            "co2_savings": 28,
+            "reason": "FSC-certified wood from sustainable forests"
+        }
+    ],
+    "table": [
+        {
+            "name": "Reclaimed Wood Table",
+            "price": 249,
+            "co2_savings": 42,
+            "reason": "Reclaimed wood reduces deforestation"
+        },
+        {
+            "name": "Bamboo Dining Table",
+            "price": 199,
+            "co2_savings": 38,
+            "reason": "Bamboo is highly renewable and durable"
+        }
+    ],
+    "laptop": [
+        {
+            "name": "Certified Refurbished Laptop",
+            "price": 599,
+            "co2_savings": 85,
+            "reason": "Refurbished saves up to 85% in manufacturing emissions"
+        }
+    ],
+    "clothing": [
+        {
+            "name": "Organic Cotton Shirt",
+            "price": 45,
+            "co2_savings": 12,
+            "reason": "Organic cotton uses 91% less water"
+        },
+        {
+            "name": "Recycled Polyester Jacket",
+            "price": 89,
+            "co2_savings": 18,
+            "reason": "Made from recycled plastic bottles"
+        }
+    ]
+}
+
+# Other words for each category, used by fuzzy matching only (listings
+# naming a category keyword literally are matched without the fuzzy index)
+CATEGORY_ALIASES = {
+    "phone": ["smartphone", "cellphone", "iphone", "galaxy", "pixel"],
+    "chair": ["armchair", "stool", "recliner", "seat"],
+    "table": ["desk", "nightstand"],
+    "laptop": ["notebook", "macbook", "chromebook", "thinkpad"],
+    "clothing": ["shirt", "tshirt", "jacket", "coat", "dress", "jeans", "sweater", "hoodie"],
+}
+
+# Returned when no category matches the product
+GENERIC_ALTERNATIVES = [
+    {
+        "name": "Refurbished/Pre-owned Option",
+        "price": "Contact seller",
+        "co2_savings": "50-70%",
+        "reason": "Extending product life reduces eco impact"
+    },
+    {
+        "name": "Rental Service",
+        "price": "Variable",
+        "co2_savings": "60-80%",
+        "reason": "Sharing reduces manufacturing demand"
+    }
+]
+
+# Minimum cosine similarity for a fuzzy category match to be used. A match
+# must also share a word with the category (allowing one typo, see
+# _shares_term), so n-grams alone ("thing" in "clothing") never decide it
+FUZZY_MIN_SCORE = float(os.getenv("FUZZY_MIN_SCORE", "0.2"))
+
+# Relative weight of each listing field in fuzzy matching
+FUZZY_FIELD_WEIGHTS = {"productName": 1.0, "category": 0.75, "description": 0.35}
+
+# Only the start of long descriptions is used for matching
+_DESCRIPTION_CHARS = 500
+
+_build_counter = itertools.count(1)
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over category keywords.
+    Finds keywords occurring anywhere in the input (same semantics as
+    `keyword in text`) in a single pass, regardless of how many keywords exist.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = [kw.lower() for kw in keywords]
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Lowest keyword id recognised at each state (including via fail links)
+        self._best: List[Optional[int]] = [None]
+
+        for kid, keyword in enumerate(self.keywords):
+            if not keyword:
+                continue
+            state = 0
+            for ch in keyword:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(None)
+                    self._goto[state][ch] = nxt
+                state = nxt
+            if self._best[state] is None:
+                self._best[state] = kid
+
+        # Breadth-first pass to wire up failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                inherited = self._best[self._fail[nxt]]
+                if inherited is not None and (self._best[nxt] is None or inherited < self._best[nxt]):
+                    self._best[nxt] = inherited
+
+    def first_match(self, text: str) -> Optional[int]:
+        """
+        Return the id of the earliest-declared keyword found in text.
+
+        Args:
+            text: Lowercased text to scan
+
+        Returns:
+            Keyword id or None if no keyword occurs
+        """
+        goto, fail, best_at = self._goto, self._fail, self._best
+        state = 0
+        best = None
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            found = best_at[state]
+            if found is not None and (best is None or found < best):
+                best = found
+                if best == 0:
+                    break
+        return best
+
+
+class InMemoryStore:
+    """
+    Catalog storage backed by Python objects (used for the built-in data).
+    Exposes the same interface as catalog_store.CatalogFile, and returns the
+    same records for the same data.
+    """
+
+    def __init__(self, data: Dict[str, List[Dict[str, Any]]]):
+        self.categories: List[str] = []
+        self._starts = [0]
+        self._records: List[Dict[str, Any]] = []
+        self.prices = array("d")
+        self.co2 = array("d")
+        # Item coordinates, NaN when the item has no location
+        self.lat = array("d")
+        self.lon = array("d")
+
+        for category, products in data.items():
+            self.categories.append(category.lower())
+            for product in products:
+                self._records.append(item_record(product))
+                self.prices.append(parse_price(product.get("price")))
+                self.co2.append(parse_amount(product.get("co2_savings")))
+                lat, lon = locate(product) or (math.nan, math.nan)
+                self.lat.append(lat)
+                self.lon.append(lon)
+            self._starts.append(len(self._records))
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def category_range(self, cid: int) -> Tuple[int, int]:
+        return self._starts[cid], self._starts[cid + 1]
+
+    def name(self, i: int) -> str:
+        return self._records[i].get("name", "")
+
+    def record(self, i: int) -> Dict[str, Any]:
+        return dict(self._records[i])
+
+
+class CatalogView(Sequence):
+    """
+    Lazy sequence of catalog items.
+
+    Filtering and ranking read the numeric columns directly; item dicts are
+    only built (as fresh copies) when an element is accessed.
+    """
+
+    def __init__(self, store, ids: Sequence, ranker: Optional[RankingEngine] = None,
+                 category: Optional[int] = None, preferred: Sequence[int] = ()):
+        """
+        Args:
+            store: InMemoryStore or CatalogFile holding the items
+            ids: Item ids of the view, in relevance order
+            ranker: Ranking engine over store (built on demand if omitted)
+            category: Category the ids were picked from; rank() then
+                considers every item of it, not just the ids
+            preferred: Items of that category matching the listing's name,
+                best first; they win ranking ties over the rest
+        """
+        self.store = store
+        self.ids = ids
+        self._ranker = ranker
+        self.category = category
+        self.preferred = preferred
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]]) -> "CatalogView":
+        """Wrap plain alternative dicts so they can be ranked like catalog items."""
+        store = InMemoryStore({"": records})
+        return cls(store, range(len(store)))
+
+    @property
+    def ranker(self) -> RankingEngine:
+        """Ranking engine over this view's store (built on demand for ad-hoc views)."""
+        if self._ranker is None:
+            self._ranker = RankingEngine(self.store)
+        return self._ranker
+
+    def rank(self, price_range: Dict[str, Any], score_tier: str, limit: int = 5):
+        """Filter and order for a user profile; see RankingEngine.rank."""
+        if self.category is not None:
+            return self.ranker.rank_category(self.category, self.preferred, price_range, score_tier, limit)
+        return self.ranker.rank(self.ids, price_range, score_tier, limit)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return CatalogView(self.store, self.ids[k], self._ranker)
+        return self.store.record(self.ids[k])
+
+    def price(self, k: int) -> float:
+        """Numeric price of element k (NaN for labels like "Contact seller")."""
+        return self.store.prices[self.ids[k]]
+
+    def co2(self, k: int) -> float:
+        """Numeric CO2 savings of element k (NaN if none could be parsed)."""
+        return self.store.co2[self.ids[k]]
+
+
+class SustainableCatalog:
+    """
+    Read-only catalog of sustainable alternatives grouped by category keyword.
+
+    Items live in a store (in memory or a memory-mapped CatalogFile) with each
+    category occupying a contiguous range. Category keywords are matched with
+    a KeywordMatcher; listings with no literal keyword fall back to a
+    character n-gram TF-IDF index over title, category and description. An
+    inverted token index ranks items inside the matched category by overlap
+    with the product name.
+    """
+
+    def __init__(self, store, generic: Optional[List[Dict[str, Any]]] = None,
+                 fuzzy: Union[NgramIndex, bool] = True, aliases: Optional[Dict[str, List[str]]] = None):
+        """
+        Build the catalog indexes.
+
+        Args:
+            store: InMemoryStore or CatalogFile holding the items
+            generic: Alternatives returned when no category matches
+            fuzzy: Prebuilt NgramIndex (see matcher.py), True to build one
+                from the catalog now, or False to disable fuzzy matching
+            aliases: Other words for category keywords, for fuzzy matching
+                (default CATEGORY_ALIASES)
+        """
+        self.store = store
+        self.categories: List[str] = list(store.categories)
+        self.aliases: Dict[str, List[str]] = CATEGORY_ALIASES if aliases is None else aliases
+        self._postings: Dict[Tuple[int, str], List[int]] = {}
+        # Keyword and alias tokens per category; item name tokens are in _postings
+        self._category_terms = [set(tokenize(" ".join([category] + self.aliases.get(category, []))))
+                                for category in self.categories]
+        self._generic = InMemoryStore({"": generic if generic is not None else GENERIC_ALTERNATIVES})
+
+        for cid in range(len(self.categories)):
+            start, end = store.category_range(cid)
+            for item_id in range(start, end):
+                for token in set(tokenize(store.name(item_id))):
+                    self._postings.setdefault((cid, token), []).append(item_id)
+
+        self._matcher = KeywordMatcher(self.categories)
+        if fuzzy is True:
+            fuzzy = NgramIndex.for_catalog(self)
+        self.fuzzy: Optional[NgramIndex] = fuzzy or None
+        self._category_ids = {category: cid for cid, category in enumerate(self.categories)}
+        # Normalize price/CO₂ columns into arrays once, at load time
+        self.ranker = RankingEngine(store)
+        self._generic_ranker = RankingEngine(self._generic)
+        # Distinguishes catalog builds, e.g. for caches derived from lookups
+        self.version = next(_build_counter)
+        logger.info("Catalog built: %d categories, %d items",
+                    len(self.categories), len(store))
+
+    @property
+    def has_locations(self) -> bool:
+        """Whether any item has a location, so alternatives can be ranked by distance."""
+        return self.ranker.geo is not None or self._generic_ranker.geo is not None
+
+    @classmethod
+    def from_data(cls, data: Dict[str, List[Dict[str, Any]]], **kwargs) -> "SustainableCatalog":
+        return cls(InMemoryStore(data), **kwargs)
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "SustainableCatalog":
+        return cls(CatalogFile(path), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def to_data(self) -> Dict[str, List[Dict[str, Any]]]:
+        """The catalog as {category: [items]}, with fresh item dicts."""
+        data = {}
+        for cid, category in enumerate(self.categories):
+            start, end = self.store.category_range(cid)
+            data[category] = [self.store.record(i) for i in range(start, end)]
+        return data
+
+    def match_category(self, product_name: str) -> Optional[str]:
+        """Return the category keyword matching the product name, if any."""
+        cid = self._matcher.first_match((product_name or "").lower())
+        return None if cid is None else self.categories[cid]
+
+    def lookup(self, product_name: str, limit: int = 5, description: str = "",
+               category: str = "") -> CatalogView:
+        """
+        Find alternatives for a product.
+
+        Args:
+            product_name: Listing title as shown on the marketplace
+            limit: Maximum number of alternatives to return
+            description: Listing description (used for fuzzy matching)
+            category: Listing category (used for fuzzy matching)
+
+        Returns:
+            View over the matching items, or over the generic alternatives if
+            no category matches. Accessing an element yields a fresh dict.
+        """
+        return self.lookup_many([(product_name, description, category)], limit)[0]
+
+    def lookup_many(self, listings: Sequence[Tuple[str, str, str]], limit: int = 5) -> List[CatalogView]:
+        """
+        lookup() for many listings; fuzzy matching runs as one vectorized batch.
+
+        Args:
+            listings: (product_name, description, category) tuples
+        """
+        start = time.perf_counter()
+        cids: List[Optional[int]] = [self._matcher.first_match((name or "").lower()) for name, _, _ in listings]
+        start = self._observe_stage("keyword", start)
+
+        misses = [i for i, cid in enumerate(cids) if cid is None]
+        if misses and self.fuzzy is not None:
+            queries = [self._fuzzy_query(*listings[i]) for i in misses]
+            for i, hits in zip(misses, self.fuzzy.search_batch(queries, k=1)):
+                if hits and hits[0][1] >= FUZZY_MIN_SCORE:
+                    cid = self._category_ids.get(hits[0][0])
+                    if cid is not None and self._shares_term(cid, *listings[i]):
+                        cids[i] = cid
+            start = self._observe_stage("fuzzy", start)
+
+        views = []
+        for (name, _, _), cid in zip(listings, cids):
+            if cid is None:
+                views.append(CatalogView(self._generic, range(len(self._generic)), self._generic_ranker))
+            else:
+                preferred = self._name_matches(cid, name)
+                views.append(CatalogView(self.store, self._rank_in_category(cid, preferred, limit), self.ranker,
+                                         cid, preferred))
+        self._observe_stage("order", start)
+        return views
+
+    @staticmethod
+    def _observe_stage(stage: str, start: float) -> float:
+        now = time.perf_counter()
+        CATALOG_MATCH_SECONDS.observe(now - start, stage)
+        return now
+
+    @staticmethod
+    def _fuzzy_query(product_name: str, description: str, category: str):
+        return [
+            (product_name or "", FUZZY_FIELD_WEIGHTS["productName"]),
+            (category or "", FUZZY_FIELD_WEIGHTS["category"]),
+            ((description or "")[:_DESCRIPTION_CHARS], FUZZY_FIELD_WEIGHTS["description"]),
+        ]
+
+    def _shares_term(self, cid: int, product_name: str, description: str, category: str) -> bool:
+        """
+        Whether the listing has a word of category cid: its keyword, an alias
+        or a word of an item name.
+
+        Words in the title and category may be one typo off ("labtop");
+        description words must match exactly. Words shorter than three
+        letters and plain numbers don't count.
+        """
+        terms, postings = self._category_terms[cid], self._postings
+
+        def known(token: str) -> bool:
+            return token in terms or (cid, token) in postings
+
+        title = [t for t in tokenize(f"{product_name} {category}") if len(t) >= 3 and not t.isdigit()]
+        described = [t for t in tokenize((description or "")[:_DESCRIPTION_CHARS]) if len(t) >= 3 and not t.isdigit()]
+        if any(known(token) for token in title + described):
+            return True
+        return any(known(variant) for token in title if len(token) >= 4 for variant in edits1(token))
+
+    def _name_matches(self, cid: int, product_name: str) -> List[int]:
+        """Items of category cid sharing name tokens with the product, most shared first."""
+        scores: Dict[int, int] = {}
+        for token in set(tokenize(product_name)):
+            for item_id in self._postings.get((cid, token), ()):
+                scores[item_id] = scores.get(item_id, 0) + 1
+        return sorted(scores, key=lambda i: (-scores[i], i))
+
+    def _rank_in_category(self, cid: int, preferred: List[int], limit: int) -> List[int]:
+        """First limit items of a category: name matches, then catalog order."""
+        start, end = self.store.category_range(cid)
+        ranked = preferred[:limit]
+        matched = set(preferred)
+        for item_id in range(start, end):
+            if len(ranked) >= limit:
+                break
+            if item_id not in matched:
+                ranked.append(item_id)
+        return ranked
+
+
+def is_catalog_file(path: str) -> bool:
+    """True for binary files built by catalog_store.write_catalog, False for JSON/CSV sources."""
+    with open(path, "rb") as fh:
+        return fh.read(len(MAGIC)) == MAGIC
+
+
+class CatalogManager:
+    """
+    Owns the live catalog and swaps in new versions atomically.
+
+    A replacement SustainableCatalog is always fully built before a single
+    reference assignment publishes it, so a request sees either the old or
+    the new catalog and never a half-built index. The source file is polled
+    by a background thread and rebuilt when it changes. Admin changes are
+    applied copy-on-write and written back to the file, which is how other
+    worker processes watching the same file pick them up.
+    """
+
+    def __init__(self, path: Optional[str] = None, index_path: Optional[str] = None,
+                 watch_interval: float = 2.0):
+        """
+        Args:
+            path: Catalog file (binary .fbcat, JSON or CSV); built-in data if None
+            index_path: Fuzzy index built offline with matcher.py (built in-process if None)
+            watch_interval: Seconds between checks of path for changes (0 disables)
+        """
+        self.path = path
+        self.index_path = index_path
+        self.watch_interval = watch_interval
+        self._write_lock = threading.Lock()
+        self._watch_lock = threading.Lock()
+        self._watch_pid: Optional[int] = None
+        self._signature = self._stat()
+        self.current: SustainableCatalog = self._load()
+
+    def _stat(self):
+        if not self.path:
+            return None
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _load(self) -> SustainableCatalog:
+        fuzzy = NgramIndex.load(self.index_path) if self.index_path else True
+        if not self.path:
+            return SustainableCatalog.from_data(DEFAULT_CATALOG, fuzzy=fuzzy)
+        if is_catalog_file(self.path):
+            return SustainableCatalog.from_file(self.path, fuzzy=fuzzy)
+        return SustainableCatalog.from_data(load_source(self.path), fuzzy=fuzzy)
+
+    def reload(self, if_changed: bool = False) -> SustainableCatalog:
+        """
+        Rebuild from the source; the current catalog stays live if that fails.
+
+        Args:
+            if_changed: Skip the rebuild if the file is unchanged since the
+                last load or admin change
+        """
+        with self._write_lock:
+            signature = self._stat()
+            if if_changed and (signature is None or signature == self._signature):
+                return self.current
+            try:
+                catalog = self._load()
+            finally:
+                # A broken file is retried when it changes again, not on every poll
+                self._signature = signature
+            self.current = catalog
+        logger.info("Catalog reloaded (version %d)", catalog.version)
+        return catalog
+
+    def apply_changes(self, upserts: Optional[List[Dict[str, Any]]] = None,
+                      deletes: Optional[List[Dict[str, Any]]] = None) -> Dict[str, int]:
+        """
+        Add, replace or remove items, then swap in the updated catalog.
+
+        Args:
+            upserts: {"category": ..., "item": {"name": ..., ...}}; replaces the
+                item with the same name in that category, or appends it
+            deletes: {"category": ..., "name": ...}; a category left empty is removed
+
+        Returns:
+            Counts of added, updated and deleted items
+
+        Raises:
+            ValueError: if a change is malformed (nothing is applied)
+        """
+        with self._write_lock:
+            current = self.current
+            data = current.to_data()
+            counts = {"added": 0, "updated": 0, "deleted": 0}
+
+            for change in deletes or []:
+                category, name = self._change_target(change, "name")
+                items = data.get(category, [])
+                kept = [item for item in items if item.get("name") != name]
+                counts["deleted"] += len(items) - len(kept)
+                if kept:
+                    data[category] = kept
+                else:
+                    data.pop(category, None)
+
+            for change in upserts or []:
+                category, name = self._change_target(change, "item")
+                items = data.setdefault(category, [])
+                item = {**change["item"], "name": name}
+                for i, existing in enumerate(items):
+                    if existing.get("name") == name:
+                        items[i] = item
+                        counts["updated"] += 1
+                        break
+                else:
+                    items.append(item)
+                    counts["added"] += 1
+
+            # The fuzzy index is per category, so it stays valid while the category set does
+            if current.fuzzy is None:
+                fuzzy = False
+            elif list(data) == current.categories:
+                fuzzy = current.fuzzy
+            else:
+                fuzzy = True
+
+            if self.path and is_catalog_file(self.path):
+                write_catalog(data, self.path)
+                catalog = SustainableCatalog.from_file(self.path, fuzzy=fuzzy)
+            else:
+                if self.path:
+                    write_source(data, self.path)
+                catalog = SustainableCatalog.from_data(data, fuzzy=fuzzy)
+            self._signature = self._stat()
+            self.current = catalog
+
+        logger.info("Catalog updated (version %d): %s", catalog.version, counts)
+        return counts
+
+    @staticmethod
+    def _change_target(change, field: str) -> Tuple[str, str]:
+        """(category, item name) of an upsert ("item" object) or delete ("name")."""
+        if not isinstance(change, dict):
+            raise ValueError("each change must be an object")
+        if field == "item":
+            if not isinstance(change.get("item"), dict):
+                raise ValueError("upsert needs an item object")
+            name = change["item"].get("name")
+        else:
+            name = change.get(field)
+        category = str(change.get("category") or "").strip().lower()
+        name = str(name or "").strip()
+        if not category or not name:
+            raise ValueError("category and item name required")
+        return category, name
+
+    def start_watching(self) -> None:
+        """
+        Start the file watcher in this process (again after a fork).
+
+        Called per worker (serve.py's post_fork, or the first request), never
+        at import, so a preloading master stays single-threaded until it forks.
+        """
+        if not self.path or self.watch_interval <= 0 or self._watch_pid == os.getpid():
+            return
+        with self._watch_lock:
+            if self._watch_pid == os.getpid():
+                return
+            if self._watch_pid is not None:
+                # Forked from a watching process: its lock may have been held
+                # by a thread that didn't survive fork
+                self._write_lock = threading.Lock()
+            self._watch_pid = os.getpid()
+            threading.Thread(target=self._watch, args=(self._watch_pid,), name="catalog-watcher",
+                             daemon=True).start()
+
+    def _watch(self, pid: int) -> None:
+        while self._watch_pid == pid:
+            time.sleep(self.watch_interval)
+            if self._stat() in (None, self._signature):
+                continue
+            try:
+                # Re-checked under the lock: the change may be our own admin write
+                self.reload(if_changed=True)
+            except Exception as e:
+                logger.error(f"Catalog reload from {self.path} failed, keeping version "
+                             f"{self.current.version}: {e}")
+
+
+# Global catalog manager
+_manager = None
+
+
+def get_catalog_manager():
+    """Get or create the catalog manager singleton."""
+    global _manager
+    if _manager is None:
+        # CATALOG_PATH points at a file built with catalog_store.py (or a JSON/CSV source)
+        # MATCHER_INDEX_PATH points at a fuzzy index built offline with matcher.py;
+        # without one the index is built from the catalog at startup
+        _manager = CatalogManager(
+            os.getenv("CATALOG_PATH"),
+            index_path=os.getenv("MATCHER_INDEX_PATH"),
+            watch_interval=float(os.getenv("CATALOG_WATCH_INTERVAL", "2")),
+        )
+    return _manager
+
+
+def get_catalog():
+    """
+    Current catalog. Callers should fetch it once per request and use that
+    instance throughout, since it may be swapped between calls.
+
+    Doesn't start the file watcher; see CatalogManager.start_watching.
+    """
+    return get_catalog_manager().current
+
+
+def reload_catalog():
+    """Rebuild the catalog from its source; keeps the old one if that fails."""
+    return get_catalog_manager().reload()
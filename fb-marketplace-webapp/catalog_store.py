@@ -0,0 +1,381 @@
+"""
+Compact On-Disk Catalog Format
+Columnar binary layout for the sustainable alternatives catalog, served via mmap
+
+Layout (little-endian, every section 8-byte aligned):
+    header      magic, format version, item count, category count,
+                then one uint64 offset per section in SECTIONS order
+    prices      float64[n_items]      (NaN when the price is not numeric)
+    co2         float64[n_items]      (NaN when no number can be parsed)
+    lat, lon    float64[n_items]      (NaN when the item has no location;
+                                       format 2 and later)
+    category_starts  uint32[n_categories + 1]
+    string columns   uint32 offsets[count + 1] followed by a UTF-8 blob;
+                     "extra" holds each item's remaining fields as JSON
+                     ("" when it has none; format 3 and later)
+
+Because the file is opened read-only through mmap, every worker process that
+loads the same file shares the same physical pages.
+
+Usage:
+    python catalog_store.py catalog.json catalog.fbcat
+    python catalog_store.py catalog.csv catalog.fbcat
+    python catalog_store.py --default catalog.fbcat
+"""
+
+import argparse
+import csv
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from typing import Optional, Dict, Any, List
+
+from geo import locate
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"FBMCAT01"
+FORMAT_VERSION = 3
+
+SECTIONS = (
+    "prices",
+    "co2",
+    "category_starts",
+    "categories",
+    "name",
+    "reason",
+    "source",
+    "url",
+    "price_label",
+    "co2_label",
+    # Added in format 2; format 1 files end before these
+    "lat",
+    "lon",
+    # Added in format 3
+    "extra",
+)
+FLOAT_COLUMNS = ("prices", "co2", "lat", "lon")
+STRING_COLUMNS = ("name", "reason", "source", "url", "price_label", "co2_label")
+# Item fields with columns of their own; any others are kept in "extra"
+CORE_FIELDS = ("name", "price", "co2_savings", "reason", "source", "url", "lat", "lon")
+
+# Sections each format version has, in file order
+_VERSION_SECTIONS = {1: SECTIONS[:-3], 2: SECTIONS[:-1], 3: SECTIONS}
+_HEADERS = {version: struct.Struct("<8sIIII" + "Q" * len(sections))
+            for version, sections in _VERSION_SECTIONS.items()}
+_HEADER = _HEADERS[FORMAT_VERSION]
+_PREFIX = struct.Struct("<8sI")
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def parse_amount(value: Any) -> float:
+    """
+    Normalize a price or CO2 value to a float.
+
+    Numbers pass through; strings like "45 kg CO₂", "65%" or "50-70%" yield
+    their first number (the conservative end of a range). Anything else is NaN.
+    """
+    if isinstance(value, bool):
+        return math.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER_RE.search(str(value or ""))
+    return float(match.group()) if match else math.nan
+
+
+def parse_price(value: Any) -> float:
+    """Prices are numeric only when given as numbers; labels like "Contact seller" are NaN."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return math.nan
+
+
+def _align(buf: bytearray) -> int:
+    buf.extend(b"\0" * (-len(buf) % 8))
+    return len(buf)
+
+
+def _label(value: Any) -> str:
+    """Text kept for a price or CO2 value that the float column can't represent."""
+    if value is None or (isinstance(value, (int, float)) and not isinstance(value, bool)):
+        return ""
+    return str(value)
+
+
+def _extra_fields(product: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in product.items() if key not in CORE_FIELDS}
+
+
+def _record(name: str, price: float, price_label: str, co2: float, co2_label: str, reason: str,
+            source: str, url: str, lat: float, lon: float, extra: Dict[str, Any]) -> Dict[str, Any]:
+    item = {
+        "name": name,
+        "price": price_label or _as_number(price),
+        "co2_savings": co2_label or _as_number(co2),
+        "reason": reason,
+    }
+    if source:
+        item["source"] = source
+    if url:
+        item["url"] = url
+    if not math.isnan(lat):
+        item["lat"], item["lon"] = lat, lon
+    item.update(extra)
+    return item
+
+
+def item_record(product: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalize a source item to the record a catalog file returns for it.
+
+    Prices and CO2 savings become numbers or their text labels, a ZIP is
+    resolved to lat/lon, and empty source/url fields are dropped, so the
+    in-memory and memory-mapped stores serve identical payloads.
+    """
+    price, co2 = product.get("price"), product.get("co2_savings")
+    lat, lon = locate(product) or (math.nan, math.nan)
+    return _record(str(product.get("name", "")), parse_price(price), _label(price), parse_amount(co2), _label(co2),
+                   str(product.get("reason", "")), str(product.get("source") or ""), str(product.get("url") or ""),
+                   lat, lon, _extra_fields(product))
+
+
+def _pack_strings(buf: bytearray, values: List[str]) -> None:
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = array("I", [0])
+    for blob in encoded:
+        offsets.append(offsets[-1] + len(blob))
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    buf.extend(offsets.tobytes())
+    buf.extend(b"".join(encoded))
+
+
+def _pack_floats(buf: bytearray, values: List[float]) -> None:
+    column = array("d", values)
+    if sys.byteorder != "little":
+        column.byteswap()
+    buf.extend(column.tobytes())
+
+
+def write_catalog(data: Dict[str, List[Dict[str, Any]]], path: str) -> int:
+    """
+    Serialize a catalog mapping to the binary format.
+
+    Args:
+        data: Mapping of category keyword to list of alternatives
+        path: Output file (written atomically)
+
+    Returns:
+        Number of items written
+    """
+    categories = []
+    starts = [0]
+    columns: Dict[str, List[Any]] = {name: [] for name in FLOAT_COLUMNS + STRING_COLUMNS + ("extra",)}
+
+    for category, products in data.items():
+        categories.append(category.lower())
+        for product in products:
+            columns["prices"].append(parse_price(product.get("price")))
+            columns["co2"].append(parse_amount(product.get("co2_savings")))
+            # Coordinates, or a ZIP resolved through the ZIP centroid table
+            lat, lon = locate(product) or (math.nan, math.nan)
+            columns["lat"].append(lat)
+            columns["lon"].append(lon)
+            columns["name"].append(str(product.get("name", "")))
+            columns["reason"].append(str(product.get("reason", "")))
+            columns["source"].append(str(product.get("source") or ""))
+            columns["url"].append(str(product.get("url") or ""))
+            # Keep the original text when it is not a plain number
+            columns["price_label"].append(_label(product.get("price")))
+            columns["co2_label"].append(_label(product.get("co2_savings")))
+            extra = _extra_fields(product)
+            columns["extra"].append(json.dumps(extra, ensure_ascii=False, default=str) if extra else "")
+        starts.append(len(columns["name"]))
+
+    buf = bytearray(_HEADER.size)
+    offsets = {}
+    for section in SECTIONS:
+        offsets[section] = _align(buf)
+        if section in FLOAT_COLUMNS:
+            _pack_floats(buf, columns[section])
+        elif section == "category_starts":
+            packed = array("I", starts)
+            if sys.byteorder != "little":
+                packed.byteswap()
+            buf.extend(packed.tobytes())
+        elif section == "categories":
+            _pack_strings(buf, categories)
+        else:
+            _pack_strings(buf, columns[section])
+
+    n_items = len(columns["name"])
+    _HEADER.pack_into(buf, 0, MAGIC, FORMAT_VERSION, n_items, len(categories), 0,
+                      *(offsets[s] for s in SECTIONS))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as fh:
+        fh.write(buf)
+    os.replace(tmp_path, path)
+    return n_items
+
+
+class _StringColumn:
+    """Zero-copy view of a packed string table."""
+
+    def __init__(self, buf: memoryview, offset: int, count: int):
+        self._offsets = buf[offset:offset + 4 * (count + 1)].cast("I")
+        self._blob = buf[offset + 4 * (count + 1):]
+
+    def __getitem__(self, i: int) -> str:
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+
+class CatalogFile:
+    """
+    Read-only, memory-mapped catalog.
+
+    Numeric columns are exposed as memoryviews straight over the mapping;
+    strings are only decoded when a record is materialized for a response.
+    """
+
+    def __init__(self, path: str):
+        """
+        Map a catalog file built by write_catalog.
+
+        Args:
+            path: Path to a .fbcat file
+        """
+        if sys.byteorder != "little":
+            raise ValueError("Memory-mapped catalogs require a little-endian host")
+
+        self.path = path
+        with open(path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mm)
+
+        magic, version = _PREFIX.unpack_from(buf, 0)
+        if magic != MAGIC or version not in _HEADERS:
+            raise ValueError(f"{path} is not a catalog file (format {FORMAT_VERSION})")
+        _, _, n_items, n_categories, _, *offsets = _HEADERS[version].unpack_from(buf, 0)
+        sections = dict(zip(_VERSION_SECTIONS[version], offsets))
+
+        self._n_items = n_items
+        self.prices = buf[sections["prices"]:sections["prices"] + 8 * n_items].cast("d")
+        self.co2 = buf[sections["co2"]:sections["co2"] + 8 * n_items].cast("d")
+        if "lat" in sections:
+            self.lat = buf[sections["lat"]:sections["lat"] + 8 * n_items].cast("d")
+            self.lon = buf[sections["lon"]:sections["lon"] + 8 * n_items].cast("d")
+        else:
+            # Format 1 predates item locations
+            self.lat = self.lon = memoryview(array("d", [math.nan]) * n_items)
+        self._starts = buf[sections["category_starts"]:
+                           sections["category_starts"] + 4 * (n_categories + 1)].cast("I")
+        categories = _StringColumn(buf, sections["categories"], n_categories)
+        self.categories = [categories[i] for i in range(n_categories)]
+        self._columns = {name: _StringColumn(buf, sections[name], n_items) for name in STRING_COLUMNS}
+        # Formats 1 and 2 only kept the core fields
+        self._extra = _StringColumn(buf, sections["extra"], n_items) if "extra" in sections else None
+
+    def __len__(self) -> int:
+        return self._n_items
+
+    def category_range(self, cid: int):
+        return self._starts[cid], self._starts[cid + 1]
+
+    def name(self, i: int) -> str:
+        return self._columns["name"][i]
+
+    def record(self, i: int) -> Dict[str, Any]:
+        """Materialize item i in the same shape as the inline catalog (see item_record)."""
+        columns = self._columns
+        extra = self._extra[i] if self._extra is not None else ""
+        return _record(columns["name"][i], self.prices[i], columns["price_label"][i], self.co2[i],
+                       columns["co2_label"][i], columns["reason"][i], columns["source"][i], columns["url"][i],
+                       self.lat[i], self.lon[i], json.loads(extra) if extra else {})
+
+
+def _as_number(value: float):
+    # Missing values (NaN) come back as None, which JSON can represent
+    if math.isnan(value):
+        return None
+    return int(value) if value.is_integer() else value
+
+
+def load_source(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Read catalog source data from JSON or CSV.
+
+    JSON may be either {category: [items]} or a list of items with a
+    "category" field. CSV needs a header row with category, name, price,
+    co2_savings, reason and optionally source and url.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as fh:
+            rows = list(csv.DictReader(fh))
+    else:
+        with open(path, encoding="utf-8") as fh:
+            rows = json.load(fh)
+        if isinstance(rows, dict):
+            return rows
+
+    data: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        row = dict(row)
+        category = (row.pop("category", "") or "").strip().lower()
+        if not category:
+            continue
+        for key in ("price", "co2_savings"):
+            if isinstance(row.get(key), str) and re.fullmatch(r"\s*-?\d+(\.\d+)?\s*", row[key]):
+                row[key] = float(row[key])
+        data.setdefault(category, []).append(row)
+    return data
+
+
+def write_source(data: Dict[str, List[Dict[str, Any]]], path: str) -> None:
+    """Write catalog data back as JSON ({category: [items]}) or CSV, atomically."""
+    tmp_path = f"{path}.tmp"
+    if path.lower().endswith(".csv"):
+        fields = ["category", "name", "price", "co2_savings", "reason", "source", "url"]
+        for products in data.values():
+            for product in products:
+                fields.extend(key for key in product if key not in fields)
+        with open(tmp_path, "w", newline="", encoding="utf-8") as fh:
+            writer = csv.DictWriter(fh, fieldnames=fields)
+            writer.writeheader()
+            for category, products in data.items():
+                for product in products:
+                    writer.writerow({"category": category, **product})
+    else:
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build a memory-mapped sustainable catalog file")
+    parser.add_argument("source", nargs="?", help="JSON or CSV catalog source")
+    parser.add_argument("output", help="Output .fbcat path")
+    parser.add_argument("--default", action="store_true", help="Export the built-in catalog")
+    args = parser.parse_args(argv)
+
+    if args.default:
+        from catalog import DEFAULT_CATALOG
+        data = DEFAULT_CATALOG
+    elif args.source:
+        data = load_source(args.source)
+    else:
+        parser.error("source is required unless --default is given")
+
+    count = write_catalog(data, args.output)
+    print(f"Wrote {count} items in {len(data)} categories to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
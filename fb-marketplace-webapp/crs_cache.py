@@ -0,0 +1,228 @@
+"""
+CRS Profile Cache
+Bounded TTL + LRU cache for sanitized CRS profiles, keyed on salted hashes
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+from storage import SQLiteConnections
+
+# Sentinel stored for "user not found" results
+_NEGATIVE = object()
+
+
+class ProfileCache:
+    """
+    Thread-safe LRU cache with per-entry expiry.
+
+    Keys are HMAC-SHA256 digests of the normalized identity, so raw names,
+    dates of birth and emails never sit in memory as cache keys. Values are
+    the sanitized profile payloads only. Misses that the bureau answered with
+    "not found" are cached for a shorter negative TTL.
+
+    With a SharedProfileStore, in-process misses fall through to it and every
+    write goes to both, so worker processes share what each has fetched.
+    Workers must then share the salt (set CRS_CACHE_SALT, or create the
+    cache before forking).
+
+    Expired entries are kept in memory for stale_grace more seconds. They
+    are misses for get(), but get(key, allow_stale=True) still returns them
+    for when the bureau can't be asked (see CRSClient's circuit breaker).
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 3600,
+                 negative_ttl: float = 300, salt: Optional[bytes] = None,
+                 shared: Optional["SharedProfileStore"] = None, stale_grace: float = 0):
+        """
+        Args:
+            max_size: Maximum number of entries before least-recently-used eviction
+            ttl: Seconds a found profile stays cached
+            negative_ttl: Seconds a not-found result stays cached
+            salt: HMAC key for identity hashing (random per process if omitted)
+            shared: Optional cross-process second level
+            stale_grace: Seconds past expiry an entry can still be served stale
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_grace = stale_grace
+        self.shared = shared
+        self._salt = salt or os.urandom(32)
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.shared_hits = 0
+        self.stale_hits = 0
+
+    @classmethod
+    def from_env(cls) -> "ProfileCache":
+        """Build a cache from CRS_CACHE_* environment variables."""
+        salt = os.getenv("CRS_CACHE_SALT")
+        shared_path = os.getenv("CRS_SHARED_CACHE_PATH")
+        return cls(
+            max_size=int(os.getenv("CRS_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("CRS_CACHE_TTL", "3600")),
+            negative_ttl=float(os.getenv("CRS_CACHE_NEGATIVE_TTL", "300")),
+            salt=salt.encode() if salt else None,
+            shared=SharedProfileStore(shared_path) if shared_path else None,
+            stale_grace=float(os.getenv("CRS_CACHE_STALE_GRACE", "86400")),
+        )
+
+    def key(self, kind: str, *parts: str) -> str:
+        """
+        Derive a cache key from identity fields without retaining them.
+
+        Args:
+            kind: Lookup type ("name_dob" or "email"), so identities never collide
+            parts: Identity fields; case and whitespace are normalized
+        """
+        normalized = "\x1f".join(" ".join((p or "").lower().split()) for p in parts)
+        return hmac.new(self._salt, f"{kind}\x1e{normalized}".encode("utf-8"),
+                        hashlib.sha256).hexdigest()
+
+    def get(self, key: str, allow_stale: bool = False) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Args:
+            key: Key from key()
+            allow_stale: Also return expired entries still within stale_grace
+
+        Returns:
+            (found, value): found is False on a miss; value is None for a
+            cached "not found" result
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                if entry[0] + self.stale_grace <= now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                elif allow_stale:
+                    self.stale_hits += 1
+                else:
+                    entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry[1] is _NEGATIVE:
+                    self.negative_hits += 1
+                    return True, None
+                self.hits += 1
+                return True, entry[1]
+            if self.shared is None:
+                self.misses += 1
+                return False, None
+
+        found, value, ttl_left = self.shared.get(key)
+        with self._lock:
+            if not found:
+                self.misses += 1
+                return False, None
+            self.shared_hits += 1
+            self._store(key, value, ttl_left)
+        return True, value
+
+    def set(self, key: str, value: Optional[Dict[str, Any]]) -> None:
+        """Cache a sanitized profile, or None to record a not-found result."""
+        ttl = self.ttl if value is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+        if self.shared is not None:
+            self.shared.set(key, value, ttl)
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def _store(self, key: str, value: Optional[Dict[str, Any]], ttl: float) -> None:
+        # Caller holds self._lock
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, _NEGATIVE if value is None else value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for monitoring hit rate and churn."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "shared": self.shared is not None,
+                "shared_hits": self.shared_hits,
+                "stale_hits": self.stale_hits,
+            }
+
+
+class SharedProfileStore:
+    """
+    Second-level profile cache in a WAL-mode SQLite file.
+
+    Lets every worker process behind one launcher see profiles fetched by the
+    others. Entries carry a wall-clock expiry; expired rows are skipped on
+    read and pruned every prune_every writes.
+    """
+
+    def __init__(self, path: str, prune_every: int = 1000):
+        self.path = path
+        self.prune_every = prune_every
+        self._writes = 0
+        self._db = SQLiteConnections(
+            path, "CREATE TABLE IF NOT EXISTS profiles (key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT)")
+
+    def get(self, key: str) -> Tuple[bool, Optional[Dict[str, Any]], float]:
+        """
+        Returns:
+            (found, value, ttl_left): value is None for a cached "not found"
+        """
+        row = self._db.connection().execute("SELECT expires_at, value FROM profiles WHERE key = ?", (key,)).fetchone()
+        ttl_left = row[0] - time.time() if row else 0.0
+        if ttl_left <= 0:
+            return False, None, 0.0
+        return True, None if row[1] is None else json.loads(row[1]), ttl_left
+
+    def set(self, key: str, value: Optional[Dict[str, Any]], ttl: float) -> None:
+        self._db.connection().execute(
+            "INSERT OR REPLACE INTO profiles (key, expires_at, value) VALUES (?, ?, ?)",
+            (key, time.time() + ttl, None if value is None else json.dumps(value)))
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def delete(self, key: str) -> None:
+        self._db.connection().execute("DELETE FROM profiles WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._db.connection().execute("DELETE FROM profiles")
+
+    def prune(self) -> int:
+        """Drop expired entries. Returns rows removed."""
+        return self._db.connection().execute("DELETE FROM profiles WHERE expires_at <= ?", (time.time(),)).rowcount
@@ -3,9 +3,22 @@ CRS (Credit Reporting Service) Integration Module
 Handles user lookup and credit profile retrieval
 """
 
+import asyncio
 import os
 import logging
-from typing import Optional, Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Optional, Dict, Any, List, Tuple
+from urllib.parse import quote
+
+from admission import Overloaded, admitted, admitted_async
+from crs_cache import ProfileCache
+from crs_transport import (AsyncCRSTransport, AsyncSingleFlight, CircuitBreaker, CRSError,
+                           CRSTransport, RetryPolicy, SingleFlight)
+from metrics import CRS_FALLBACKS
+from ranking import TIER_PRICE_RANGES
 
 logger = logging.getLogger(__name__)
 
@@ -14,19 +27,418 @@ class CRSClient:
     """
     Generic CRS (Credit Reporting Service) client
     Supports integration with various credit bureaus (Equifax, Experian, TransUnion, etc.)
+
+    Cached lookups go through a circuit breaker: while the bureau is failing
+    or slow, misses are answered at once from stale cache entries or with a
+    generic degraded profile (data_source "degraded") instead of waiting on
+    the timeout.
+
+    Lookups given a route are admission controlled (see admission.py), but
+    only for the bureau fetch: cache hits and circuit fallbacks are answered
+    without taking a token or a concurrency slot.
     """
 
-    def __init__(self, api_key: Optional[str] = None, api_base: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, api_base: Optional[str] = None,
+                 cache: Optional[ProfileCache] = None):
         """
         Initialize CRS client with API credentials.
         
         Args:
             api_key: API key for CRS service (from environment or config)
             api_base: Base URL for CRS API (from environment or config)
+            cache: Cache for sanitized profiles (configured from CRS_CACHE_* env if omitted)
         """
         self.api_key = api_key or os.getenv("CRS_API_KEY")
         self.api_base = api_base or os.getenv("CRS_API_BASE", "https://crs-api.example.com")
-        self.timeout = 10  # seconds
+        self.timeout = float(os.getenv("CRS_TIMEOUT", "10"))  # seconds
+        self.max_concurrency = int(os.getenv("CRS_MAX_CONCURRENCY", "16"))
+        self.retry = RetryPolicy(max_attempts=int(os.getenv("CRS_MAX_ATTEMPTS", "3")))
+        # Identities per bureau batch call in lookup_many (0 = bureau has no batch endpoint)
+        self.batch_size = int(os.getenv("CRS_BATCH_SIZE", "0"))
+        self.cache = cache or ProfileCache.from_env()
+        slow_call = float(os.getenv("CRS_BREAKER_SLOW_SECONDS", "5"))
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("CRS_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv("CRS_BREAKER_RESET_SECONDS", "30")),
+            slow_call_seconds=slow_call if slow_call > 0 else None,
+        )
+        # Concurrent lookups for the same identity share one upstream call
+        self._inflight = SingleFlight()
+        self._inflight_async = AsyncSingleFlight()
+        self._transport: Optional[CRSTransport] = None
+        self._async_transport: Optional[AsyncCRSTransport] = None
+        self._transport_lock = threading.Lock()
+
+    @property
+    def transport(self) -> CRSTransport:
+        """Pooled keep-alive transport, created on first production call."""
+        if self._transport is None:
+            with self._transport_lock:
+                if self._transport is None:
+                    self._transport = CRSTransport(self.api_base, self.api_key, timeout=self.timeout,
+                                                   max_concurrency=self.max_concurrency, retry=self.retry)
+        return self._transport
+
+    @property
+    def async_transport(self) -> AsyncCRSTransport:
+        """asyncio transport (requires httpx), created on first async production call."""
+        if self._async_transport is None:
+            self._async_transport = AsyncCRSTransport(self.api_base, self.api_key, timeout=self.timeout,
+                                                      max_concurrency=self.max_concurrency, retry=self.retry)
+        return self._async_transport
+
+    def reset_connections(self) -> None:
+        """
+        Drop pooled connections without closing them, e.g. in a freshly forked
+        worker: sockets inherited from the parent must not be shared, and
+        new transports are created on next use.
+        """
+        self._transport = None
+        self._async_transport = None
+        self._transport_lock = threading.Lock()
+        self._inflight = SingleFlight()
+        self._inflight_async = AsyncSingleFlight()
+
+    def lookup_profile(self, name: str, dob: str, route: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Cached name + DOB lookup returning only sanitized data.
+        
+        Args:
+            name: Full name of user
+            dob: Date of birth in format MM/DD/YYYY
+            route: Admission-control route for a bureau fetch (None to skip)
+            
+        Returns:
+            {"user_profile": sanitized profile, "data_source": ...} or None if not found
+            
+        Raises:
+            Overloaded: A bureau fetch was shed by admission control
+        """
+        try:
+            return self._get_profile("name_dob", self._fetch_user, name, dob, route=route)
+        except CRSError as e:
+            logger.error(f"CRS API error: {e}")
+            return None
+
+    def lookup_profile_by_email(self, email: str, route: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Cached email lookup returning only sanitized data.
+        
+        Returns:
+            {"user_profile": sanitized profile, "data_source": ...} or None if not found
+            
+        Raises:
+            Overloaded: A bureau fetch was shed by admission control (see lookup_profile)
+        """
+        try:
+            return self._get_profile("email", self._fetch_user_by_email, email, route=route)
+        except CRSError as e:
+            logger.error(f"CRS API error: {e}")
+            return None
+
+    async def lookup_profile_async(self, name: str, dob: str,
+                                   route: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """asyncio variant of lookup_profile."""
+        try:
+            return await self._get_profile_async("name_dob", self._fetch_user_async, name, dob, route=route)
+        except CRSError as e:
+            logger.error(f"CRS API error: {e}")
+            return None
+
+    async def lookup_profile_by_email_async(self, email: str,
+                                            route: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """asyncio variant of lookup_profile_by_email."""
+        try:
+            return await self._get_profile_async("email", self._fetch_user_by_email_async, email, route=route)
+        except CRSError as e:
+            logger.error(f"CRS API error: {e}")
+            return None
+
+    def lookup_many(self, identities: List[Dict[str, Any]], max_workers: Optional[int] = None,
+                    route: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Resolve many identities at once (e.g. to pre-warm a user cohort).
+        
+        Cached identities are answered immediately and duplicates are resolved
+        once. The rest go to the bureau's batch endpoint when CRS_BATCH_SIZE is
+        set, otherwise they are fanned out over a bounded thread pool.
+        
+        Args:
+            identities: Items of {"name": ..., "dob": ...} or {"email": ...}
+            max_workers: Parallel lookups (defaults to the transport concurrency)
+            route: Admission-control route; the misses of one call are admitted
+                together, so a shed call still answers its cache hits
+            
+        Returns:
+            One entry per identity, in order, with "status" of found,
+            not_found, error or invalid. Found entries carry user_profile and
+            data_source; a failure never discards the other results, and
+            misses shed by admission control are errors with a retry_after.
+        """
+        results, pending = self._plan_many(identities)
+        if pending:
+            try:
+                with self._admission(route):
+                    if self.api_key and self.batch_size > 0:
+                        resolved = self._resolve_batched(pending)
+                    else:
+                        resolved = self._resolve_parallel(pending, max_workers or self.max_concurrency)
+            except Overloaded as e:
+                resolved = self._shed_many(pending, e)
+            self._fill_many(results, pending, resolved)
+        return results
+
+    async def lookup_many_async(self, identities: List[Dict[str, Any]],
+                                route: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        asyncio variant of lookup_many.
+
+        Misses are resolved concurrently on the event loop (bounded by the
+        async transport's concurrency), or through the batch endpoint when
+        CRS_BATCH_SIZE is set.
+        """
+        results, pending = self._plan_many(identities)
+        if pending:
+            try:
+                async with self._admission_async(route):
+                    if self.api_key and self.batch_size > 0:
+                        resolved = await self._resolve_batched_async(pending)
+                    else:
+                        keys = list(pending)
+                        entries = await asyncio.gather(*(self._resolve_one_async(*pending[key][:2])
+                                                         for key in keys))
+                        resolved = dict(zip(keys, entries))
+            except Overloaded as e:
+                resolved = self._shed_many(pending, e)
+            self._fill_many(results, pending, resolved)
+        return results
+
+    def _plan_many(self, identities: List[Dict[str, Any]]):
+        """Answer invalid and cached identities; group the rest by cache key."""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(identities)
+        pending: Dict[str, Tuple[str, Tuple[str, ...], List[int]]] = {}
+
+        for index, identity in enumerate(identities):
+            kind, parts = self._identity_parts(identity)
+            if kind is None:
+                results[index] = {"status": "invalid", "error": "name and dob, or email, required"}
+                continue
+            key = self.cache.key(kind, *parts)
+            if key in pending:
+                pending[key][2].append(index)
+                continue
+            found, cached = self.cache.get(key)
+            if found:
+                results[index] = self._bulk_entry(cached)
+            else:
+                pending[key] = (kind, parts, [index])
+        return results, pending
+
+    @staticmethod
+    def _shed_many(pending, error: Overloaded) -> Dict[str, Dict[str, Any]]:
+        return {key: {"status": "error", "error": str(error), "retry_after": error.retry_after}
+                for key in pending}
+
+    @staticmethod
+    def _fill_many(results, pending, resolved) -> None:
+        for key, (_, _, indexes) in pending.items():
+            for index in indexes:
+                results[index] = resolved[key]
+
+    @staticmethod
+    def _identity_parts(identity: Any) -> Tuple[Optional[str], Tuple[str, ...]]:
+        if not isinstance(identity, dict):
+            return None, ()
+        email = str(identity.get("email") or "").strip()
+        if email:
+            return "email", (email,)
+        name = str(identity.get("name") or "").strip()
+        dob = str(identity.get("dob") or "").strip()
+        if name and dob:
+            return "name_dob", (name, dob)
+        return None, ()
+
+    @staticmethod
+    def _bulk_entry(result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if result is None:
+            return {"status": "not_found"}
+        return {"status": "found", **result}
+
+    def _resolve_parallel(self, pending, max_workers: int) -> Dict[str, Dict[str, Any]]:
+        def resolve(kind, parts):
+            fetch = self._fetch_user_by_email if kind == "email" else self._fetch_user
+            try:
+                return self._bulk_entry(self._get_profile(kind, fetch, *parts))
+            except CRSError as e:
+                logger.error(f"CRS API error: {e}")
+                return {"status": "error", "error": "CRS lookup failed"}
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as pool:
+            futures = {key: pool.submit(resolve, kind, parts) for key, (kind, parts, _) in pending.items()}
+            return {key: future.result() for key, future in futures.items()}
+
+    def _resolve_batched(self, pending) -> Dict[str, Dict[str, Any]]:
+        """Resolve misses through POST /lookup/batch, batch_size identities per call."""
+        resolved = {}
+        for chunk, payload in self._batch_chunks(pending):
+            if not self.breaker.allow():
+                self._fallback_batch(chunk, resolved)
+                continue
+            try:
+                response = self._guarded(self.transport.request, "POST", "/lookup/batch",
+                                         json={"identities": payload})
+                self._store_batch(chunk, response, resolved)
+            except CRSError as e:
+                self._fail_batch(chunk, e, resolved)
+        return resolved
+
+    async def _resolve_batched_async(self, pending) -> Dict[str, Dict[str, Any]]:
+        resolved = {}
+        for chunk, payload in self._batch_chunks(pending):
+            if not self.breaker.allow():
+                self._fallback_batch(chunk, resolved)
+                continue
+            try:
+                response = await self._guarded_async(self.async_transport.request, "POST", "/lookup/batch",
+                                                     json={"identities": payload})
+                self._store_batch(chunk, response, resolved)
+            except CRSError as e:
+                self._fail_batch(chunk, e, resolved)
+        return resolved
+
+    async def _resolve_one_async(self, kind: str, parts: Tuple[str, ...]) -> Dict[str, Any]:
+        fetch = self._fetch_user_by_email_async if kind == "email" else self._fetch_user_async
+        try:
+            return self._bulk_entry(await self._get_profile_async(kind, fetch, *parts))
+        except CRSError as e:
+            logger.error(f"CRS API error: {e}")
+            return {"status": "error", "error": "CRS lookup failed"}
+
+    def _batch_chunks(self, pending):
+        keys = list(pending)
+        for start in range(0, len(keys), self.batch_size):
+            chunk = keys[start:start + self.batch_size]
+            yield chunk, [
+                {"email": pending[key][1][0]} if pending[key][0] == "email"
+                else {"name": pending[key][1][0], "dob": pending[key][1][1]}
+                for key in chunk
+            ]
+
+    def _store_batch(self, chunk, response, resolved) -> None:
+        records = (response or {}).get("results") or []
+        if len(records) != len(chunk):
+            raise CRSError(f"batch returned {len(records)} results for {len(chunk)} identities")
+        for key, record in zip(chunk, records):
+            result = self._sanitized_result(record)
+            self.cache.set(key, result)
+            resolved[key] = self._bulk_entry(result)
+
+    @staticmethod
+    def _fail_batch(chunk, error: CRSError, resolved) -> None:
+        logger.error(f"CRS API error: {error}")
+        for key in chunk:
+            resolved[key] = {"status": "error", "error": "CRS lookup failed"}
+
+    def _get_profile(self, kind: str, fetch, *parts: str, route: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Cache, then single-flight fetch, admitted for route when given.
+
+        Raises:
+            CRSError: Transport failure
+            Overloaded: The fetch was shed by admission control
+        """
+        key = self.cache.key(kind, *parts)
+        found, cached = self.cache.get(key)
+        if found:
+            return cached
+        if not self.breaker.allow():
+            return self._fallback(key)
+        return self._inflight.do(key, lambda: self._load_profile(key, fetch, *parts, route=route))
+
+    async def _get_profile_async(self, kind: str, fetch, *parts: str,
+                                 route: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        key = self.cache.key(kind, *parts)
+        found, cached = self.cache.get(key)
+        if found:
+            return cached
+        if not self.breaker.allow():
+            return self._fallback(key)
+        return await self._inflight_async.do(key, lambda: self._load_profile_async(key, fetch, *parts, route=route))
+
+    def _load_profile(self, key: str, fetch, *args, route: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        # Only the single-flight leader takes a slot; followers wait on its result
+        with self._admission(route):
+            # Transient failures raise before anything is cached as "not found"
+            result = self._sanitized_result(self._guarded(fetch, *args))
+        self.cache.set(key, result)
+        return result
+
+    async def _load_profile_async(self, key: str, fetch, *args,
+                                  route: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        async with self._admission_async(route):
+            result = self._sanitized_result(await self._guarded_async(fetch, *args))
+        self.cache.set(key, result)
+        return result
+
+    @staticmethod
+    def _admission(route: Optional[str]):
+        return admitted(route) if route is not None else nullcontext()
+
+    @staticmethod
+    def _admission_async(route: Optional[str]):
+        return admitted_async(route) if route is not None else nullcontext()
+
+    def _guarded(self, call, *args, **kwargs):
+        """Make a bureau call, reporting its outcome and duration to the circuit breaker."""
+        start = time.perf_counter()
+        try:
+            result = call(*args, **kwargs)
+        except CRSError:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success(time.perf_counter() - start)
+        return result
+
+    async def _guarded_async(self, call, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = await call(*args, **kwargs)
+        except CRSError:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success(time.perf_counter() - start)
+        return result
+
+    def _fallback(self, key: str) -> Optional[Dict[str, Any]]:
+        """Answer for a cache miss while the circuit is open: a stale entry, else a degraded profile."""
+        found, cached = self.cache.get(key, allow_stale=True)
+        if found:
+            CRS_FALLBACKS.inc("stale")
+            return cached
+        CRS_FALLBACKS.inc("degraded")
+        return {"user_profile": self._degraded_profile(), "data_source": "degraded"}
+
+    def _fallback_batch(self, chunk, resolved) -> None:
+        for key in chunk:
+            resolved[key] = self._bulk_entry(self._fallback(key))
+
+    @staticmethod
+    def _degraded_profile() -> Dict[str, Any]:
+        """Sanitized-profile shape with the default tier, used when the bureau can't be asked."""
+        return {
+            "score_tier": "good",
+            "location": None,
+            "price_range": dict(TIER_PRICE_RANGES["good"]),
+            "availability": None,
+        }
+
+    def _sanitized_result(self, user_data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if not user_data:
+            return None
+        return {
+            "user_profile": self.sanitize_data(user_data),
+            "data_source": user_data.get("data_source")
+        }
 
     def lookup_user(self, name: str, dob: str) -> Optional[Dict[str, Any]]:
         """
@@ -39,26 +451,33 @@ class CRSClient:
         Returns:
             User credit profile or None if not found
         """
-        if not self.api_key:
-            logger.warning("CRS_API_KEY not set, using mock data")
-            return self._get_mock_user_data(name, dob)
-        
-        # In production, make actual API call to CRS
-        # This is a placeholder
         try:
-            # import requests
-            # response = requests.post(
-            #     f"{self.api_base}/lookup",
-            #     json={"name": name, "dob": dob},
-            #     headers={"Authorization": f"Bearer {self.api_key}"},
-            #     timeout=self.timeout
-            # )
-            # return response.json() if response.status_code == 200 else None
-            pass
-        except Exception as e:
+            return self._fetch_user(name, dob)
+        except CRSError as e:
+            logger.error(f"CRS API error: {e}")
+            return None
+
+    async def lookup_user_async(self, name: str, dob: str) -> Optional[Dict[str, Any]]:
+        """asyncio variant of lookup_user."""
+        try:
+            return await self._fetch_user_async(name, dob)
+        except CRSError as e:
             logger.error(f"CRS API error: {e}")
             return None
 
+    def _fetch_user(self, name: str, dob: str) -> Optional[Dict[str, Any]]:
+        """Name + DOB lookup that raises CRSError instead of swallowing it."""
+        if not self.api_key:
+            logger.warning("CRS_API_KEY not set, using mock data")
+            return self._get_mock_user_data(name, dob)
+        return self.transport.request("POST", "/lookup", json={"name": name, "dob": dob})
+
+    async def _fetch_user_async(self, name: str, dob: str) -> Optional[Dict[str, Any]]:
+        if not self.api_key:
+            logger.warning("CRS_API_KEY not set, using mock data")
+            return self._get_mock_user_data(name, dob)
+        return await self.async_transport.request("POST", "/lookup", json={"name": name, "dob": dob})
+
     def _get_mock_user_data(self, name: str, dob: str) -> Dict[str, Any]:
         """
         Mock user data for testing (simulates CRS response).
@@ -118,31 +537,40 @@ class CRSClient:
     @staticmethod
     def _get_price_range_for_tier(tier: str) -> Dict[str, float]:
         """Get recommended price range based on credit tier."""
-        ranges = {
-            "excellent": {"min": 100, "max": 5000},
-            "good": {"min": 50, "max": 2000},
-            "fair": {"min": 20, "max": 800},
-            "poor": {"min": 10, "max": 300}
-        }
-        return ranges.get(tier, ranges["good"])
+        # Shared with the ranking engine, which precomputes results per tier range
+        return dict(TIER_PRICE_RANGES.get(tier, TIER_PRICE_RANGES["good"]))
 
     def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """
         Alternative: Look up user by email if they're logged into ecommerce site.
         This would make an API call to get associated credit profile.
         """
+        try:
+            return self._fetch_user_by_email(email)
+        except CRSError as e:
+            logger.error(f"CRS API error: {e}")
+            return None
+
+    async def get_user_by_email_async(self, email: str) -> Optional[Dict[str, Any]]:
+        """asyncio variant of get_user_by_email."""
+        try:
+            return await self._fetch_user_by_email_async(email)
+        except CRSError as e:
+            logger.error(f"CRS API error: {e}")
+            return None
+
+    def _fetch_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """Email lookup that raises CRSError instead of swallowing it."""
         if not self.api_key:
             logger.warning("CRS_API_KEY not set, using mock data")
             return self._get_mock_email_user(email)
-        
-        # In production, make actual API call
-        # response = requests.get(
-        #     f"{self.api_base}/user/{email}",
-        #     headers={"Authorization": f"Bearer {self.api_key}"},
-        #     timeout=self.timeout
-        # )
-        # return response.json() if response.status_code == 200 else None
-        return None
+        return self.transport.request("GET", f"/user/{quote(email, safe='')}")
+
+    async def _fetch_user_by_email_async(self, email: str) -> Optional[Dict[str, Any]]:
+        if not self.api_key:
+            logger.warning("CRS_API_KEY not set, using mock data")
+            return self._get_mock_email_user(email)
+        return await self.async_transport.request("GET", f"/user/{quote(email, safe='')}")
 
     @staticmethod
     def _get_mock_email_user(email: str) -> Dict[str, Any]:
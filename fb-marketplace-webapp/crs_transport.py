@@ -0,0 +1,352 @@
+"""
+CRS HTTP Transport
+Pooled keep-alive transport for the bureau API with retries, bounded
+concurrency, single-flight request coalescing (sync and asyncio variants) and
+a circuit breaker
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Optional, Dict, Any, Callable, Awaitable, Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import CRS_CIRCUIT_TRANSITIONS, CRS_REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying; anything else is returned to the caller as-is
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CRSError(Exception):
+    """Bureau could not be reached or kept failing after retries."""
+
+
+def _endpoint(path: str) -> str:
+    """Metrics label for a bureau path: its first segment (/user/<email> -> /user)."""
+    return "/" + path.lstrip("/").split("/", 1)[0]
+
+
+def _outcome(result: Optional[Dict[str, Any]]) -> str:
+    return "not_found" if result is None else "ok"
+
+
+class RetryPolicy:
+    """Capped exponential backoff with full jitter."""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.2, max_delay: float = 2.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delays(self) -> Iterator[float]:
+        """Sleep durations between attempts (max_attempts - 1 of them)."""
+        for attempt in range(self.max_attempts - 1):
+            yield random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the
+    function, everyone else arriving before it finishes waits for its result.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error: Optional[BaseException] = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, "SingleFlight._Call"] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight (per event loop)."""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so a leader-only failure doesn't warn at GC
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+
+class CircuitBreaker:
+    """
+    Stops calling the bureau while it is failing or too slow.
+
+    closed: calls go through; failure_threshold consecutive failures (calls
+    raising CRSError or taking longer than slow_call_seconds) open it.
+    open: allow() refuses calls for reset_timeout seconds.
+    half_open: one probe call is let through; success closes the circuit,
+    failure opens it again. A probe that never reports back is replaced
+    after another reset_timeout.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30,
+                 slow_call_seconds: Optional[float] = None):
+        """
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds open before a probe call is allowed
+            slow_call_seconds: Successful calls slower than this count as failures
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.slow_call_seconds = slow_call_seconds
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def _transition(self, state: str) -> None:
+        # Caller holds self._lock
+        if state != self._state:
+            logger.warning(f"CRS circuit {self._state} -> {state}")
+            CRS_CIRCUIT_TRANSITIONS.inc(state)
+        self._state = state
+
+    def allow(self) -> bool:
+        """Whether a call may go to the bureau now."""
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+                self._transition(self.HALF_OPEN)
+            if self._state == self.HALF_OPEN and (
+                    self._probe_started is None or now - self._probe_started >= self.reset_timeout):
+                self._probe_started = now
+                return True
+            self.rejected += 1
+            return False
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit will let a call through again (0 if it does now)."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def record_success(self, duration: float = 0.0) -> None:
+        if self.slow_call_seconds is not None and duration > self.slow_call_seconds:
+            self.record_failure()
+            return
+        with self._lock:
+            self._failures = 0
+            self._probe_started = None
+            self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_started = None
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            return {"state": state, "consecutive_failures": self._failures, "rejected": self.rejected}
+
+
+class CRSTransport:
+    """
+    Thread-safe transport over one pooled requests.Session.
+
+    Connections are kept alive and reused across requests; a semaphore caps
+    how many calls are in flight to the bureau at once.
+    """
+
+    def __init__(self, api_base: str, api_key: str, timeout: float = 10,
+                 max_concurrency: int = 16, retry: Optional[RetryPolicy] = None):
+        """
+        Args:
+            api_base: Base URL for CRS API
+            api_key: Bearer token for CRS API
+            timeout: Per-attempt timeout in seconds
+            max_concurrency: Maximum simultaneous upstream calls (also the pool size)
+            retry: Retry policy for connection errors and retryable statuses
+        """
+        self.api_base = api_base.rstrip("/")
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {api_key}"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method: str, path: str, **kwargs) -> Optional[Dict[str, Any]]:
+        """
+        Call the bureau and decode the JSON body.
+
+        Returns:
+            Parsed JSON on 200, None on 404
+
+        Raises:
+            CRSError: if the bureau is unreachable or keeps failing
+        """
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = self._send(method, path, **kwargs)
+            outcome = _outcome(result)
+            return result
+        finally:
+            CRS_REQUEST_SECONDS.observe(time.perf_counter() - start, _endpoint(path), outcome)
+
+    def _send(self, method: str, path: str, **kwargs) -> Optional[Dict[str, Any]]:
+        delays = self.retry.delays()
+        while True:
+            try:
+                with self._slots:
+                    response = self.session.request(method, f"{self.api_base}{path}",
+                                                    timeout=self.timeout, **kwargs)
+                if response.status_code == 200:
+                    return _json_body(response, method, path)
+                if response.status_code == 404:
+                    return None
+                if response.status_code not in RETRY_STATUSES:
+                    raise CRSError(f"CRS {method} {path} returned {response.status_code}")
+                failure = f"status {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                failure = str(e)
+
+            delay = next(delays, None)
+            if delay is None:
+                raise CRSError(f"CRS {method} {path} failed after {self.retry.max_attempts} attempts: {failure}")
+            logger.warning(f"CRS {method} {path} failed ({failure}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def _json_body(response, method: str, path: str) -> Any:
+    """Decoded 200 body; a malformed one is a CRS failure like any other."""
+    try:
+        return response.json()
+    except ValueError as e:
+        raise CRSError(f"CRS {method} {path} returned a malformed body: {e}") from None
+
+
+class AsyncCRSTransport:
+    """
+    asyncio transport over a pooled httpx.AsyncClient.
+
+    Requires the optional httpx package. Create and use it from a single
+    event loop (e.g. the ASGI server's).
+    """
+
+    def __init__(self, api_base: str, api_key: str, timeout: float = 10,
+                 max_concurrency: int = 16, retry: Optional[RetryPolicy] = None):
+        import httpx
+
+        self._httpx = httpx
+        self.retry = retry or RetryPolicy()
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.client = httpx.AsyncClient(
+            base_url=api_base.rstrip("/"),
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_concurrency,
+                                max_keepalive_connections=max_concurrency),
+        )
+
+    async def request(self, method: str, path: str, **kwargs) -> Optional[Dict[str, Any]]:
+        """Async counterpart of CRSTransport.request (same return/raise contract)."""
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await self._send(method, path, **kwargs)
+            outcome = _outcome(result)
+            return result
+        finally:
+            CRS_REQUEST_SECONDS.observe(time.perf_counter() - start, _endpoint(path), outcome)
+
+    async def _send(self, method: str, path: str, **kwargs) -> Optional[Dict[str, Any]]:
+        delays = self.retry.delays()
+        while True:
+            try:
+                async with self._slots:
+                    response = await self.client.request(method, path, **kwargs)
+                if response.status_code == 200:
+                    return _json_body(response, method, path)
+                if response.status_code == 404:
+                    return None
+                if response.status_code not in RETRY_STATUSES:
+                    raise CRSError(f"CRS {method} {path} returned {response.status_code}")
+                failure = f"status {response.status_code}"
+            except self._httpx.TransportError as e:
+                failure = str(e) or type(e).__name__
+
+            delay = next(delays, None)
+            if delay is None:
+                raise CRSError(f"CRS {method} {path} failed after {self.retry.max_attempts} attempts: {failure}")
+            logger.warning(f"CRS {method} {path} failed ({failure}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
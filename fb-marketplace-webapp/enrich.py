@@ -0,0 +1,243 @@
+"""
+Offline Enrichment Pipeline
+Adds sustainable alternatives to bulk dumps of scraped listings, spread over
+a process pool
+
+Usage:
+    python enrich.py listings.jsonl enriched.jsonl
+    python enrich.py listings.csv enriched.jsonl --tier fair --workers 8
+    cat listings.jsonl | python enrich.py - - --catalog catalog.fbcat > enriched.jsonl
+
+Input is JSONL (one listing object per line) or CSV with a header row, as
+exported from what content.js / facebookScraper.js collect. The title is read
+from productName, title or name, plus optional description and category.
+Each output line is the input listing with "alternatives" added (or "error"
+when it has no title or an unusable userProfile), in input order.
+
+Listings are read lazily and handled in chunks; at most two chunks per
+worker are in flight, so memory stays bounded however large the dump is.
+JSONL lines are decoded in the workers, leaving the parent process little
+more than file I/O. Matching and ranking are the webapp's own (the catalog
+comes from --catalog or CATALOG_PATH, as for the server); repeated listings
+in a chunk are matched once and each chunk's fuzzy matching runs as one
+vectorized search.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, Any, IO, Iterable, Iterator, List, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+TITLE_FIELDS = ("productName", "title", "name")
+
+# A JSONL line (decoded by the worker) or a parsed CSV row
+Listing = Union[str, Dict[str, Any]]
+
+# Set in each worker by _init_worker
+_catalog = None
+_filter_by_user_profile = None
+_user_profile: Optional[Dict[str, Any]] = None
+
+
+def read_listings(stream: IO[str], fmt: str) -> Iterator[Listing]:
+    """Yield non-blank JSONL lines as-is, or CSV rows as dicts."""
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield line
+
+
+def chunked(records: Iterable[Listing], size: int) -> Iterator[List[Listing]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _text(record: Dict[str, Any], *keys: str) -> str:
+    for key in keys:
+        value = record.get(key)
+        if isinstance(value, str) and value.strip():
+            return value
+    return ""
+
+
+def _init_worker(user_profile: Optional[Dict[str, Any]]) -> None:
+    global _catalog, _filter_by_user_profile, _user_profile
+    # Forked workers inherit the parent's catalog and imports; spawned ones load them here
+    from app import _filter_by_user_profile as filter_by_user_profile
+    from catalog import get_catalog
+    _catalog = get_catalog()
+    _filter_by_user_profile = filter_by_user_profile
+    _user_profile = user_profile
+
+
+def _decode(listing: Listing) -> Optional[Dict[str, Any]]:
+    if not isinstance(listing, str):
+        return listing
+    try:
+        record = json.loads(listing)
+    except ValueError as e:
+        logger.warning(f"Skipping invalid JSON line: {e}")
+        return None
+    if not isinstance(record, dict):
+        logger.warning("Skipping JSON line that is not an object")
+        return None
+    return record
+
+
+def enrich_chunk(listings: List[Listing]) -> Tuple[bytes, int]:
+    """
+    Enrich one chunk of listings.
+
+    Returns:
+        (the chunk's output as JSONL bytes, number of listings written)
+    """
+    from app import _profile_error
+    from response_encoding import dumps
+
+    records = [record for record in map(_decode, listings) if record is not None]
+    # Same matching as _get_sustainable_alternatives; like the batch endpoint,
+    # identical listings are matched once
+    keys: List[Optional[Tuple[str, str, str]]] = []
+    unique: Dict[Tuple[str, str, str], int] = {}
+    for record in records:
+        name = _text(record, *TITLE_FIELDS)
+        key = (name, _text(record, "description"), _text(record, "category")) if name else None
+        if key is not None:
+            unique.setdefault(key, len(unique))
+        keys.append(key)
+    views = _catalog.lookup_many(list(unique))
+
+    lines = []
+    for record, key in zip(records, keys):
+        if key is None:
+            lines.append(dumps({**record, "error": "productName required"}))
+            continue
+        profile = record.get("userProfile") if isinstance(record.get("userProfile"), dict) else _user_profile
+        error = _profile_error(profile)
+        if error:
+            lines.append(dumps({**record, "error": error}))
+            continue
+        alternatives = views[unique[key]]
+        if profile:
+            alternatives = _filter_by_user_profile(alternatives, profile)
+        lines.append(dumps({**record, "alternatives": list(alternatives), "personalized": bool(profile)}))
+    return b"".join(line + b"\n" for line in lines), len(lines)
+
+
+def run(chunks: Iterable[List[Listing]], output: IO[bytes], workers: int,
+        user_profile: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Enrich chunks in order and write them to output.
+
+    Args:
+        chunks: Lists of listings from read_listings (read lazily)
+        output: Binary stream for the JSONL result
+        workers: Worker processes; 0 runs everything in this process
+        user_profile: Profile applied to listings without their own userProfile
+
+    Returns:
+        Number of listings written
+    """
+    written = 0
+    _init_worker(user_profile)
+    if workers <= 0:
+        for chunk in chunks:
+            data, count = enrich_chunk(chunk)
+            output.write(data)
+            written += count
+        return written
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(user_profile,)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(enrich_chunk, chunk))
+            # Bound the chunks in flight; results are written in input order
+            while len(pending) >= 2 * workers or (pending and pending[0].done()):
+                data, count = pending.popleft().result()
+                output.write(data)
+                written += count
+        while pending:
+            data, count = pending.popleft().result()
+            output.write(data)
+            written += count
+    return written
+
+
+def _user_profile_arg(args) -> Optional[Dict[str, Any]]:
+    if args.profile:
+        profile = json.loads(args.profile)
+        if not isinstance(profile, dict):
+            raise ValueError("--profile must be a JSON object")
+        return profile
+    if args.tier:
+        from ranking import TIER_PRICE_RANGES
+        return {"score_tier": args.tier, "price_range": dict(TIER_PRICE_RANGES[args.tier])}
+    return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Add sustainable alternatives to a dump of scraped listings")
+    parser.add_argument("input", help="JSONL or CSV listings file, or - for stdin")
+    parser.add_argument("output", help="Output JSONL path, or - for stdout")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="input format (default: by file extension)")
+    parser.add_argument("--catalog", help="catalog file or JSON/CSV source (default: CATALOG_PATH or built-in)")
+    parser.add_argument("--index", help="fuzzy index built with matcher.py (default: MATCHER_INDEX_PATH)")
+    parser.add_argument("--tier", choices=("excellent", "good", "fair", "poor"),
+                        help="personalize for this credit tier and its price range")
+    parser.add_argument("--profile", help='userProfile JSON, e.g. \'{"score_tier": "fair", "price_range": {...}}\'')
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes (0 = in-process)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="listings per task")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    try:
+        user_profile = _user_profile_arg(args)
+    except ValueError as e:
+        parser.error(str(e))
+    fmt = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+
+    # The job enriches against one catalog version; workers load it like the server does
+    if args.catalog:
+        os.environ["CATALOG_PATH"] = args.catalog
+    if args.index:
+        os.environ["MATCHER_INDEX_PATH"] = args.index
+    os.environ["CATALOG_WATCH_INTERVAL"] = "0"
+
+    source = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8")
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    started = time.perf_counter()
+    try:
+        count = run(chunked(read_listings(source, fmt), max(1, args.chunk_size)), output,
+                    args.workers, user_profile)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout.buffer:
+            output.close()
+        else:
+            output.flush()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Enriched {count} listings in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f}/s) "
+                f"against a catalog of {len(_catalog)} items")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Fake CRS Server
+Local stand-in for the bureau API, for exercising the real HTTP transport
+
+Serves the same endpoints CRSClient calls in production:
+    POST /lookup            {"name": ..., "dob": ...}
+    POST /lookup/batch      {"identities": [{"name": ..., "dob": ...} | {"email": ...}]}
+    GET  /user/<email>
+
+Usage:
+    python fake_crs_server.py --port 5002 --latency 0.2 --failure-rate 0.1
+    CRS_API_KEY=test CRS_API_BASE=http://127.0.0.1:5002 python app.py
+
+Or from Python:
+    with FakeCRSServer(latency=0.05) as server:
+        client = CRSClient(api_key="test", api_base=server.url)
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Iterable
+from urllib.parse import unquote
+
+from crs_service import CRSClient
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+
+    def do_POST(self):
+        if self.path not in ("/lookup", "/lookup/batch"):
+            return self._send(404, {"error": "Not found"})
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path == "/lookup/batch":
+            return self._respond("batch", "", lambda: {"results": [
+                self._record(identity) for identity in body.get("identities", [])
+            ]})
+        self._respond("lookup", body.get("name", ""),
+                      lambda: self.server.fake.mock._get_mock_user_data(body.get("name", ""), body.get("dob", "")))
+
+    def do_GET(self):
+        if not self.path.startswith("/user/"):
+            return self._send(404, {"error": "Not found"})
+        email = unquote(self.path[len("/user/"):])
+        self._respond("user", email, lambda: CRSClient._get_mock_email_user(email))
+
+    def _record(self, identity):
+        fake = self.server.fake
+        key = identity.get("email") or identity.get("name", "")
+        if key.lower() in fake.unknown:
+            return None
+        if identity.get("email"):
+            data = CRSClient._get_mock_email_user(identity["email"])
+        else:
+            data = fake.mock._get_mock_user_data(identity.get("name", ""), identity.get("dob", ""))
+        data["data_source"] = "fake_crs"
+        return data
+
+    def _respond(self, endpoint: str, identity: str, build):
+        fake = self.server.fake
+        fake.record(endpoint)
+        if self.headers.get("Authorization") != f"Bearer {fake.api_key}":
+            return self._send(401, {"error": "Unauthorized"})
+        if fake.latency:
+            time.sleep(fake.latency)
+        if fake.failure_rate and random.random() < fake.failure_rate:
+            return self._send(503, {"error": "Service unavailable"})
+        if identity.lower() in fake.unknown:
+            return self._send(404, {"error": "User not found"})
+        data = build()
+        if endpoint != "batch":
+            data["data_source"] = "fake_crs"
+        self._send(200, data)
+
+    def _send(self, status: int, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    fake: "FakeCRSServer"
+
+
+class FakeCRSServer:
+    """
+    Threaded fake bureau with configurable latency and failure injection.
+    Counts calls per endpoint so tests can assert on coalescing and caching.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, api_key: str = "test",
+                 latency: float = 0.0, failure_rate: float = 0.0,
+                 unknown: Optional[Iterable[str]] = None):
+        """
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free one)
+            api_key: Bearer token the server accepts
+            latency: Seconds to sleep before answering each call
+            failure_rate: Fraction of calls answered with 503
+            unknown: Names/emails answered with 404
+        """
+        self.api_key = api_key
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.unknown = {u.lower() for u in (unknown or ())}
+        self.mock = CRSClient()
+        self.calls = Counter()
+        self._calls_lock = threading.Lock()
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, endpoint: str) -> None:
+        with self._calls_lock:
+            self.calls[endpoint] += 1
+
+    def start(self) -> "FakeCRSServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeCRSServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake CRS bureau API locally")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5002)
+    parser.add_argument("--api-key", default="test")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per call")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of 503s")
+    args = parser.parse_args()
+
+    server = FakeCRSServer(args.host, args.port, args.api_key, args.latency, args.failure_rate)
+    print(f"Fake CRS listening on {server.url} (api key: {args.api_key})")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
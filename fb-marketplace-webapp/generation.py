@@ -0,0 +1,469 @@
+"""
+Message Generation Proxy
+Server-side front for the text generation API the extension uses to draft
+messages: caches completions, coalesces identical prompts, micro-batches
+concurrent ones and caps calls in flight to the backend
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Optional, Dict, Any, Callable, List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from crs_cache import SharedProfileStore
+from crs_transport import RETRY_STATUSES, RetryPolicy, SingleFlight
+from metrics import GENERATION_BATCH_SIZE, GENERATION_SECONDS
+
+logger = logging.getLogger(__name__)
+
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta/models"
+
+
+class GenerationError(Exception):
+    """Backend could not produce a completion (unreachable, refused, or timed out)."""
+
+
+class GenerationBackend(ABC):
+    """
+    A text generation model behind the proxy.
+
+    generate_batch receives up to max_batch_size prompts and returns one
+    completion per prompt, in order. Backends implement _generate for a
+    single prompt; those whose API takes several prompts per call also
+    override generate_batch and raise max_batch_size.
+    """
+
+    name = "base"
+    model = ""
+    max_batch_size = 1
+
+    @abstractmethod
+    def _generate(self, prompt: str) -> str:
+        """Completion for one prompt. Raises GenerationError on failure."""
+
+    def generate_batch(self, prompts: List[str]) -> List[str]:
+        return [self._generate(prompt) for prompt in prompts]
+
+    def close(self) -> None:
+        pass
+
+
+class GeminiBackend(GenerationBackend):
+    """Gemini generateContent over a pooled keep-alive session (one prompt per call)."""
+
+    name = "gemini"
+
+    def __init__(self, api_key: str, model: str = "gemini-pro", timeout: float = 30,
+                 pool_size: int = 8, retry: Optional[RetryPolicy] = None):
+        """
+        Args:
+            api_key: Gemini API key (sent as a header, never in the URL)
+            model: Model name in the generateContent path
+            timeout: Per-attempt timeout in seconds
+            pool_size: Keep-alive connections kept (match the proxy's concurrency)
+            retry: Retry policy for connection errors and retryable statuses
+        """
+        self.model = model
+        self.url = f"{GEMINI_API_BASE}/{model}:generateContent"
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self.session = requests.Session()
+        self.session.headers.update({"x-goog-api-key": api_key})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+
+    def _generate(self, prompt: str) -> str:
+        delays = self.retry.delays()
+        body = {"contents": [{"parts": [{"text": prompt}]}]}
+        while True:
+            try:
+                response = self.session.post(self.url, json=body, timeout=self.timeout)
+                if response.status_code == 200:
+                    return self._text(response)
+                if response.status_code not in RETRY_STATUSES:
+                    raise GenerationError(f"Gemini returned {response.status_code}")
+                failure = f"status {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                failure = str(e)
+
+            delay = next(delays, None)
+            if delay is None:
+                raise GenerationError(f"Gemini failed after {self.retry.max_attempts} attempts: {failure}")
+            logger.warning(f"Gemini call failed ({failure}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+    @staticmethod
+    def _text(response: requests.Response) -> str:
+        try:
+            return response.json()["candidates"][0]["content"]["parts"][0]["text"].strip()
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+            # ValueError: the body was not JSON at all (e.g. an HTML error page)
+            raise GenerationError("Unexpected response format from Gemini") from None
+
+    def close(self) -> None:
+        self.session.close()
+
+    @classmethod
+    def from_env(cls) -> "GeminiBackend":
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY is required for the gemini generation backend")
+        return cls(api_key, model=os.getenv("GEMINI_MODEL", "gemini-pro"),
+                   pool_size=int(os.getenv("GENERATION_MAX_CONCURRENCY", "8")))
+
+
+class StubBackend(GenerationBackend):
+    """
+    Deterministic local model for tests and offline development.
+
+    Answers from templates filled with the listing title or seller message
+    found in the extension's prompts, after an optional simulated latency
+    per batch. Every batch it served is kept in batches.
+    """
+
+    name = "stub"
+
+    _TITLE = re.compile(r"Title:\s*(.+)")
+    _SELLER = re.compile(r'Seller:\s*"(.*?)"', re.DOTALL)
+
+    def __init__(self, latency: float = 0.0, max_batch_size: int = 16):
+        self.latency = latency
+        self.max_batch_size = max_batch_size
+        self.batches: List[List[str]] = []
+
+    def generate_batch(self, prompts: List[str]) -> List[str]:
+        self.batches.append(list(prompts))
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._generate(prompt) for prompt in prompts]
+
+    def _generate(self, prompt: str) -> str:
+        seller = self._SELLER.search(prompt)
+        if seller:
+            return "Thanks for getting back to me! That works for me - when would be a good time to pick it up?"
+        title = self._TITLE.search(prompt)
+        item = title.group(1).strip() if title else "this item"
+        return f"Hi! Is the {item} still available? I'm very interested."
+
+    @classmethod
+    def from_env(cls) -> "StubBackend":
+        return cls(latency=float(os.getenv("GENERATION_STUB_LATENCY", "0")))
+
+
+# GENERATION_BACKEND name -> factory; register others here to plug in a model
+BACKENDS: Dict[str, Callable[[], GenerationBackend]] = {
+    "gemini": GeminiBackend.from_env,
+    "stub": StubBackend.from_env,
+}
+
+
+# Serializes starting a MicroBatcher's threads in a process
+_start_lock = threading.Lock()
+
+
+class MicroBatcher:
+    """
+    Groups prompts submitted around the same time into backend batches.
+
+    A dispatcher thread collects pending prompts for up to max_wait seconds
+    (or until a batch is full) and hands the batch to a worker thread.
+    At most max_concurrency batches run at once; while all slots are busy,
+    new prompts keep accumulating, so batches grow under load instead of
+    queueing as single calls. With max_batch_size 1 nothing waits and the
+    cap simply bounds calls in flight.
+    """
+
+    def __init__(self, fn: Callable[[List[str]], List[str]], max_batch_size: int = 16,
+                 max_wait: float = 0.01, max_concurrency: int = 8):
+        """
+        Args:
+            fn: Runs one batch, returning one result per prompt
+            max_batch_size: Most prompts per batch
+            max_wait: Seconds the first prompt of a batch waits for company
+            max_concurrency: Most batches running at once
+        """
+        self._fn = fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait if self.max_batch_size > 1 else 0.0
+        self.max_concurrency = max_concurrency
+        self._pid = None
+        self.batches = 0
+        self.prompts = 0
+
+    def _start(self) -> None:
+        # Caller holds _start_lock; threads don't survive fork, so each process starts its own
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[str, Future]] = []
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._pool = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="generation")
+        self._pid = os.getpid()
+        threading.Thread(target=self._dispatch, name="generation-batcher", daemon=True).start()
+
+    def submit(self, prompt: str) -> Future:
+        """Queue a prompt; the future resolves to its completion."""
+        if self._pid != os.getpid():
+            with _start_lock:
+                if self._pid != os.getpid():
+                    self._start()
+        future = Future()
+        with self._cond:
+            self._pending.append((prompt, future))
+            self._cond.notify()
+        return future
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.max_wait
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            # Wait for a free slot outside the lock so prompts keep arriving meanwhile
+            self._slots.acquire()
+            with self._cond:
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+            self._pool.submit(self._run, batch)
+
+    def _run(self, batch: List[Tuple[str, Future]]) -> None:
+        try:
+            GENERATION_BATCH_SIZE.observe(len(batch))
+            self.batches += 1
+            self.prompts += len(batch)
+            results = self._fn([prompt for prompt, _ in batch])
+            if len(results) != len(batch):
+                raise GenerationError(f"Backend returned {len(results)} completions for {len(batch)} prompts")
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        pending = len(self._pending) if self._pid == os.getpid() else 0
+        return {
+            "batches": self.batches,
+            "prompts": self.prompts,
+            "pending": pending,
+            "max_batch_size": self.max_batch_size,
+            "max_concurrency": self.max_concurrency,
+        }
+
+
+class CompletionCache:
+    """
+    Thread-safe LRU cache of completions with a fixed expiry.
+
+    Keys are digests of the backend, model and exact prompt: prompts that
+    differ only in case or whitespace may get different answers, so they are
+    cached separately. Only completions are stored; failures never are.
+
+    With a SharedProfileStore (used here as a plain key/value file), misses
+    fall through to it and every write goes to both, so worker processes
+    share completions.
+    """
+
+    def __init__(self, max_size: int = 1000, ttl: float = 86400,
+                 shared: Optional[SharedProfileStore] = None):
+        """
+        Args:
+            max_size: Maximum number of entries before least-recently-used eviction
+            ttl: Seconds a completion stays cached
+            shared: Optional cross-process second level
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = shared
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.shared_hits = 0
+
+    @staticmethod
+    def key(backend: str, model: str, prompt: str) -> str:
+        return hashlib.sha256(f"{backend}\x1f{model}\x1f{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached completion for key, or None on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if self.shared is None:
+                self.misses += 1
+                return None
+
+        found, value, ttl_left = self.shared.get(key)
+        with self._lock:
+            if not found or not value:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+            self._store(key, value["text"], ttl_left)
+        return value["text"]
+
+    def set(self, key: str, text: str) -> None:
+        if self.ttl <= 0:
+            return
+        if self.shared is not None:
+            self.shared.set(key, {"text": text}, self.ttl)
+        with self._lock:
+            self._store(key, text, self.ttl)
+
+    def _store(self, key: str, text: str, ttl: float) -> None:
+        # Caller holds self._lock
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "shared": self.shared is not None,
+                "shared_hits": self.shared_hits,
+            }
+
+
+class GenerationProxy:
+    """
+    Cached, coalesced, batched access to one generation backend.
+
+    Completions are cached on the exact prompt with the backend and model in
+    the key. A prompt already on its way to the backend is not sent again:
+    later callers wait for the first one's completion. Misses go through a
+    MicroBatcher, which also enforces the concurrency cap.
+    """
+
+    def __init__(self, backend: GenerationBackend, cache: Optional[CompletionCache] = None,
+                 max_concurrency: int = 8, max_wait: float = 0.01, timeout: float = 60):
+        """
+        Args:
+            backend: Model to call on cache misses
+            cache: Completion cache
+            max_concurrency: Most backend batches in flight
+            max_wait: Seconds a prompt waits for others to share its batch
+            timeout: Seconds a caller waits for its completion
+        """
+        self.backend = backend
+        self.cache = cache or CompletionCache()
+        self.timeout = timeout
+        self._inflight = SingleFlight()
+        self.batcher = MicroBatcher(backend.generate_batch, backend.max_batch_size, max_wait, max_concurrency)
+
+    def generate(self, prompt: str) -> Tuple[str, bool]:
+        """
+        Complete a prompt.
+
+        Returns:
+            (text, cached): cached is True if no backend call was made for it
+
+        Raises:
+            GenerationError: if the backend fails or takes longer than timeout
+        """
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            key = self.cache.key(self.backend.name, self.backend.model, prompt)
+            text = self.cache.get(key)
+            if text is not None:
+                outcome = "hit"
+                return text, True
+            text = self._inflight.do(key, lambda: self._complete(key, prompt))
+            outcome = "miss"
+            return text, False
+        finally:
+            GENERATION_SECONDS.observe(time.perf_counter() - start, outcome)
+
+    def _complete(self, key: str, prompt: str) -> str:
+        try:
+            text = self.batcher.submit(prompt).result(timeout=self.timeout)
+        except FutureTimeout:
+            raise GenerationError(f"No completion within {self.timeout:g}s") from None
+        self.cache.set(key, text)
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend.name, "cache": self.cache.stats(), "batching": self.batcher.stats()}
+
+
+# Global generation proxy instance
+_generation_proxy = None
+_proxy_lock = threading.Lock()
+# Set once the configuration has been found unusable, so it is reported only once
+_config_error: Optional[str] = None
+
+
+def get_generation_proxy() -> Optional[GenerationProxy]:
+    """
+    Get or create the generation proxy, or None if none is available.
+
+    GENERATION_BACKEND picks the backend from BACKENDS; it defaults to gemini
+    when GEMINI_API_KEY is set. The stub is never chosen implicitly, so real
+    sellers can't be sent canned text by accident. An unusable configuration
+    (unknown backend, missing API key, malformed number) is logged the first
+    time and then treated as no backend.
+    """
+    global _generation_proxy, _config_error
+    if _generation_proxy is None and _config_error is None:
+        name = os.getenv("GENERATION_BACKEND") or ("gemini" if os.getenv("GEMINI_API_KEY") else "")
+        if not name:
+            return None
+        with _proxy_lock:
+            if _generation_proxy is None and _config_error is None:
+                try:
+                    _generation_proxy = _build_proxy(name)
+                    logger.info(f"Generation proxy using the {name} backend")
+                except ValueError as e:
+                    _config_error = str(e)
+                    logger.error(f"Generation proxy disabled: {e}")
+    return _generation_proxy
+
+
+def _build_proxy(name: str) -> GenerationProxy:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown GENERATION_BACKEND {name!r} (known: {', '.join(BACKENDS)})")
+    shared_path = os.getenv("GENERATION_SHARED_CACHE_PATH")
+    cache = CompletionCache(
+        max_size=int(os.getenv("GENERATION_CACHE_SIZE", "1000")),
+        ttl=float(os.getenv("GENERATION_CACHE_TTL", "86400")),
+        shared=SharedProfileStore(shared_path) if shared_path else None,
+    )
+    return GenerationProxy(
+        BACKENDS[name](),
+        cache=cache,
+        max_concurrency=int(os.getenv("GENERATION_MAX_CONCURRENCY", "8")),
+        max_wait=float(os.getenv("GENERATION_BATCH_WAIT_MS", "10")) / 1000,
+        timeout=float(os.getenv("GENERATION_TIMEOUT", "60")),
+    )
@@ -0,0 +1,365 @@
+"""
+Geographic Index
+ZIP-code centroids and a KD-tree over catalog item locations, for ranking
+alternatives by distance from the user
+
+Usage:
+    python geo.py 2023_Gaz_zcta_national.txt data/zip_centroids.csv
+
+The ZIP table is built offline from the Census Gazetteer ZCTA file (or any
+CSV/TSV with zip, latitude and longitude columns) and loaded from
+ZIP_CENTROIDS_PATH, or WEBAPP_DATA_DIR/zip_centroids.csv when present. Without
+it, only locations given as coordinates can be placed.
+"""
+
+import argparse
+import csv
+import heapq
+import logging
+import math
+import os
+import sys
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+from storage import data_path
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+_ZIP_FIELDS = ("zip", "zipcode", "zip_code", "zcta", "zcta5", "geoid", "postal_code")
+_LAT_FIELDS = ("lat", "latitude", "intptlat")
+_LON_FIELDS = ("lon", "lng", "long", "longitude", "intptlong")
+
+LatLon = Tuple[float, float]
+
+
+def _zip5(value: Any) -> Optional[int]:
+    """First five digits of a ZIP (or ZIP+4) as an int."""
+    digits = "".join(ch for ch in str(value or "")[:10] if ch.isdigit())[:5]
+    return int(digits) if len(digits) == 5 else None
+
+
+def _column(header: List[str], names: Tuple[str, ...]) -> Optional[int]:
+    normalized = [name.strip().lower() for name in header]
+    for name in names:
+        if name in normalized:
+            return normalized.index(name)
+    return None
+
+
+class ZipCentroids:
+    """Sorted ZIP -> (lat, lon) table; lookups are a binary search."""
+
+    def __init__(self, zips: np.ndarray, lat: np.ndarray, lon: np.ndarray):
+        order = np.argsort(zips, kind="stable")
+        self.zips = np.ascontiguousarray(zips[order], dtype=np.int32)
+        self.lat = np.ascontiguousarray(lat[order], dtype=np.float64)
+        self.lon = np.ascontiguousarray(lon[order], dtype=np.float64)
+
+    @classmethod
+    def load(cls, path: str) -> "ZipCentroids":
+        """
+        Read a CSV or tab-separated table with a header row.
+
+        Column names are matched case-insensitively (zip/zcta/geoid,
+        lat/latitude/intptlat, lon/lng/longitude/intptlong), so the Census
+        Gazetteer file can be used as-is.
+        """
+        with open(path, newline="", encoding="utf-8-sig") as fh:
+            sample = fh.readline()
+            fh.seek(0)
+            reader = csv.reader(fh, delimiter="\t" if "\t" in sample else ",")
+            header = next(reader, [])
+            columns = [_column(header, names) for names in (_ZIP_FIELDS, _LAT_FIELDS, _LON_FIELDS)]
+            if None in columns:
+                raise ValueError(f"{path} needs zip, latitude and longitude columns")
+            zip_col, lat_col, lon_col = columns
+            zips, lats, lons = [], [], []
+            for row in reader:
+                try:
+                    code = _zip5(row[zip_col])
+                    lat, lon = float(row[lat_col]), float(row[lon_col])
+                except (IndexError, ValueError):
+                    continue
+                if code is not None and math.isfinite(lat) and math.isfinite(lon):
+                    zips.append(code)
+                    lats.append(lat)
+                    lons.append(lon)
+        return cls(np.array(zips, dtype=np.int32), np.array(lats), np.array(lons))
+
+    def __len__(self) -> int:
+        return self.zips.size
+
+    def lookup(self, zip_code: Any) -> Optional[LatLon]:
+        code = _zip5(zip_code)
+        if code is None or not self.zips.size:
+            return None
+        i = int(np.searchsorted(self.zips, code))
+        if i < self.zips.size and self.zips[i] == code:
+            return float(self.lat[i]), float(self.lon[i])
+        return None
+
+    def write(self, path: str) -> None:
+        """Write as a zip,lat,lon CSV, atomically."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(("zip", "lat", "lon"))
+            for code, lat, lon in zip(self.zips.tolist(), self.lat.tolist(), self.lon.tolist()):
+                writer.writerow((f"{code:05d}", f"{lat:.6f}", f"{lon:.6f}"))
+        os.replace(tmp_path, path)
+
+
+# Global ZIP centroid table (empty when no table is configured)
+_zip_centroids = None
+
+
+def get_zip_centroids() -> ZipCentroids:
+    """Get or load the ZIP centroid table (ZIP_CENTROIDS_PATH or WEBAPP_DATA_DIR/zip_centroids.csv)."""
+    global _zip_centroids
+    if _zip_centroids is None:
+        path = data_path("ZIP_CENTROIDS_PATH", "zip_centroids.csv")
+        table = None
+        if os.path.exists(path):
+            try:
+                table = ZipCentroids.load(path)
+                logger.info(f"Loaded {len(table)} ZIP centroids from {path}")
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to load ZIP centroids from {path}: {e}")
+        _zip_centroids = table or ZipCentroids(np.empty(0, np.int32), np.empty(0), np.empty(0))
+    return _zip_centroids
+
+
+def locate(value: Any) -> Optional[LatLon]:
+    """
+    Coordinates of a location, item or profile, if they can be determined.
+
+    Accepts lat/lon (or latitude/longitude, lng) fields, a zip field resolved
+    through the ZIP centroid table, or either inside a nested "location" or
+    "address" object, as in CRS profiles ({"city", "state", "zip"}).
+    """
+    if not isinstance(value, dict):
+        return None
+    lat = next((value[k] for k in ("lat", "latitude") if value.get(k) is not None), None)
+    lon = next((value[k] for k in ("lon", "lng", "longitude") if value.get(k) is not None), None)
+    if lat is not None and lon is not None:
+        try:
+            lat, lon = float(lat), float(lon)
+        except (TypeError, ValueError):
+            pass
+        else:
+            if -90 <= lat <= 90 and -180 <= lon <= 180:
+                return lat, lon
+    for key in ("zip", "zipcode", "zip_code", "postal_code"):
+        if value.get(key):
+            found = get_zip_centroids().lookup(value[key])
+            if found is not None:
+                return found
+    for key in ("location", "address"):
+        if isinstance(value.get(key), dict):
+            found = locate(value[key])
+            if found is not None:
+                return found
+    return None
+
+
+def to_xyz(lat, lon) -> np.ndarray:
+    """Points on a sphere of EARTH_RADIUS_KM, so straight-line (chord) distance orders like great-circle distance."""
+    lat, lon = np.radians(np.asarray(lat, dtype=np.float64)), np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return EARTH_RADIUS_KM * np.stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)), axis=-1)
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.asarray(chord) / (2 * EARTH_RADIUS_KM), 1.0))
+
+
+def km_to_chord(km: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.sin(min(km / (2 * EARTH_RADIUS_KM), math.pi / 2))
+
+
+class KDTree:
+    """
+    Static KD-tree over 3-D points.
+
+    Nodes are stored in flat lists with their bounding boxes; leaves hold up
+    to leaf_size points, scanned with one vectorized distance computation.
+    Queries visit nodes nearest-box-first and stop once no box can beat the
+    k-th best distance, so a k-nearest query touches a handful of leaves.
+    """
+
+    def __init__(self, points: np.ndarray, ids: np.ndarray, leaf_size: int = 16):
+        """
+        Args:
+            points: (n, 3) coordinates
+            ids: Identifier returned for each point
+            leaf_size: Maximum points per leaf
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        order = np.arange(len(points))
+        self._left: List[int] = []
+        self._right: List[int] = []
+        self._bounds: List[Tuple[int, int]] = []
+        self._lo: List[Tuple[float, float, float]] = []
+        self._hi: List[Tuple[float, float, float]] = []
+
+        if len(points):
+            stack = [(self._new_node(points, order, 0, len(points)), 0, len(points))]
+            while stack:
+                node, start, end = stack.pop()
+                if end - start <= leaf_size:
+                    continue
+                spread = np.subtract(self._hi[node], self._lo[node])
+                dim = int(np.argmax(spread))
+                mid = (start + end) // 2
+                part = order[start:end]
+                order[start:end] = part[np.argpartition(points[part, dim], mid - start)]
+                left = self._new_node(points, order, start, mid)
+                right = self._new_node(points, order, mid, end)
+                self._left[node], self._right[node] = left, right
+                stack.append((left, start, mid))
+                stack.append((right, mid, end))
+
+        self._points = points[order]
+        self._ids = np.asarray(ids)[order]
+
+    def _new_node(self, points: np.ndarray, order: np.ndarray, start: int, end: int) -> int:
+        block = points[order[start:end]]
+        self._left.append(-1)
+        self._right.append(-1)
+        self._bounds.append((start, end))
+        self._lo.append(tuple(block.min(axis=0).tolist()))
+        self._hi.append(tuple(block.max(axis=0).tolist()))
+        return len(self._left) - 1
+
+    def __len__(self) -> int:
+        return self._ids.size
+
+    def _box_distance(self, node: int, point: Tuple[float, float, float]) -> float:
+        total = 0.0
+        for p, lo, hi in zip(point, self._lo[node], self._hi[node]):
+            d = lo - p if p < lo else (p - hi if p > hi else 0.0)
+            total += d * d
+        return total
+
+    def query(self, point, k: int, max_distance: float = math.inf) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The k nearest points within max_distance.
+
+        Returns:
+            (ids, distances), nearest first
+        """
+        if not self._left or k <= 0:
+            return self._ids[:0], np.empty(0)
+        point = tuple(float(c) for c in point)
+        target = np.array(point)
+        bound = max_distance * max_distance
+        best_d2, best_at = np.empty(0), np.empty(0, dtype=np.intp)
+
+        heap = [(self._box_distance(0, point), 0)]
+        while heap:
+            box_d2, node = heapq.heappop(heap)
+            if box_d2 > bound:
+                break
+            left = self._left[node]
+            if left >= 0:
+                right = self._right[node]
+                for child in (left, right):
+                    child_d2 = self._box_distance(child, point)
+                    if child_d2 <= bound:
+                        heapq.heappush(heap, (child_d2, child))
+                continue
+
+            start, end = self._bounds[node]
+            d2 = ((self._points[start:end] - target) ** 2).sum(axis=1)
+            within = np.flatnonzero(d2 <= bound)
+            if not within.size:
+                continue
+            best_d2 = np.concatenate((best_d2, d2[within]))
+            best_at = np.concatenate((best_at, within + start))
+            if best_d2.size >= k:
+                if best_d2.size > k:
+                    keep = np.argpartition(best_d2, k - 1)[:k]
+                    best_d2, best_at = best_d2[keep], best_at[keep]
+                bound = float(best_d2.max())
+
+        order = np.argsort(best_d2, kind="stable")
+        return self._ids[best_at[order]], np.sqrt(best_d2[order])
+
+
+class GeoIndex:
+    """
+    Item locations of a catalog store, with one KD-tree per category.
+
+    Built once at load time from the store's lat/lon columns (NaN where an
+    item has no location); categories without located items get no tree.
+    """
+
+    def __init__(self, store):
+        """
+        Args:
+            store: InMemoryStore or CatalogFile exposing float64 lat and lon columns
+        """
+        self.lat = np.frombuffer(store.lat, dtype=np.float64)
+        self.lon = np.frombuffer(store.lon, dtype=np.float64)
+        self.located = ~(np.isnan(self.lat) | np.isnan(self.lon))
+        self._trees: Dict[int, KDTree] = {}
+        for cid in range(len(store.categories)):
+            start, end = store.category_range(cid)
+            ids = np.flatnonzero(self.located[start:end]) + start
+            if ids.size:
+                self._trees[cid] = KDTree(to_xyz(self.lat[ids], self.lon[ids]), ids)
+
+    @classmethod
+    def for_store(cls, store) -> Optional["GeoIndex"]:
+        """Index for the store, or None if none of its items has a location."""
+        lat, lon = getattr(store, "lat", None), getattr(store, "lon", None)
+        if lat is None or lon is None or not np.isfinite(np.frombuffer(lat, dtype=np.float64)).any():
+            return None
+        return cls(store)
+
+    def __len__(self) -> int:
+        return int(self.located.sum())
+
+    def distances(self, ids, origin: LatLon) -> np.ndarray:
+        """Great-circle distance in km from origin to each item (NaN where unknown)."""
+        ids = np.asarray(ids, dtype=np.intp)
+        lat1, lon1 = math.radians(origin[0]), math.radians(origin[1])
+        lat2, lon2 = np.radians(self.lat[ids]), np.radians(self.lon[ids])
+        # Haversine
+        a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def nearest(self, cid: int, origin: LatLon, k: int,
+                radius_km: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The k located items of category cid nearest to origin.
+
+        Returns:
+            (item ids, distances in km), nearest first
+        """
+        tree = self._trees.get(cid)
+        if tree is None:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        limit = math.inf if radius_km is None else km_to_chord(radius_km)
+        ids, chords = tree.query(to_xyz(*origin), k, limit)
+        return ids, chord_to_km(chords)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build the ZIP centroid table used for location-aware ranking")
+    parser.add_argument("source", help="Census Gazetteer ZCTA file, or CSV/TSV with zip, lat and lon columns")
+    parser.add_argument("output", help="Output CSV (zip,lat,lon)")
+    args = parser.parse_args(argv)
+
+    table = ZipCentroids.load(args.source)
+    table.write(args.output)
+    print(f"Wrote {len(table)} ZIP centroids to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
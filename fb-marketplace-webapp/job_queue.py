@@ -0,0 +1,194 @@
+"""
+Durable Job Queue
+SQLite (WAL mode) FIFO queue for extension jobs, shared by all worker processes
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Optional, Dict, Any, Callable, NamedTuple
+
+from storage import SQLiteConnections, data_path
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind        TEXT    NOT NULL,
+    payload     TEXT    NOT NULL,
+    created_at  REAL    NOT NULL,
+    visible_at  REAL    NOT NULL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    lease_token TEXT,
+    dead        INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (dead, visible_at, id);
+"""
+
+
+class Job(NamedTuple):
+    id: int
+    kind: str
+    payload: Dict[str, Any]
+    attempts: int
+    lease_token: Optional[str]
+
+
+class JobQueue:
+    """
+    FIFO queue with per-job IDs, leases and acknowledgements.
+
+    lease() hands the oldest visible job to one consumer and hides it for the
+    visibility timeout; ack() deletes it. A job that is never acked becomes
+    visible again and is redelivered, until max_attempts is reached and it is
+    parked as dead. Because state lives in a WAL-mode SQLite file, any number
+    of worker processes can enqueue and drain the same queue.
+    """
+
+    def __init__(self, path: str, visibility_timeout: float = 300, max_attempts: int = 5,
+                 poll_interval: float = 0.5):
+        """
+        Args:
+            path: SQLite database file
+            visibility_timeout: Seconds a leased job stays hidden before redelivery
+            max_attempts: Deliveries before a job is parked as dead
+            poll_interval: How often waiters re-check for jobs enqueued by other processes
+        """
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        # Wakes waiters in this process immediately when a job is enqueued here
+        self._changed = threading.Condition()
+
+        self._db = SQLiteConnections(path, _SCHEMA)
+
+    def enqueue(self, payload: Dict[str, Any], kind: str = "message", delay: float = 0) -> int:
+        """Append a job and return its ID."""
+        now = time.time()
+        cursor = self._db.connection().execute(
+            "INSERT INTO jobs (kind, payload, created_at, visible_at) VALUES (?, ?, ?, ?)",
+            (kind, json.dumps(payload), now, now + delay))
+        with self._changed:
+            self._changed.notify_all()
+        return cursor.lastrowid
+
+    def lease(self, visibility_timeout: Optional[float] = None) -> Optional[Job]:
+        """Take the oldest visible job, hiding it from other consumers."""
+        timeout = self.visibility_timeout if visibility_timeout is None else visibility_timeout
+        conn = self._db.connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Park jobs that keep coming back unacknowledged
+            conn.execute("UPDATE jobs SET dead = 1 WHERE dead = 0 AND visible_at <= ? AND attempts >= ?",
+                         (now, self.max_attempts))
+            row = conn.execute(
+                "SELECT id, kind, payload, attempts FROM jobs "
+                "WHERE dead = 0 AND visible_at <= ? ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            token = uuid.uuid4().hex
+            conn.execute("UPDATE jobs SET visible_at = ?, attempts = attempts + 1, lease_token = ? WHERE id = ?",
+                         (now + timeout, token, row[0]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return Job(row[0], row[1], json.loads(row[2]), row[3] + 1, token)
+
+    def ack(self, job_id: int, lease_token: str) -> bool:
+        """Delete a leased job. False if the lease expired and someone else holds it."""
+        cursor = self._db.connection().execute("DELETE FROM jobs WHERE id = ? AND lease_token = ?",
+                                               (job_id, lease_token))
+        return cursor.rowcount == 1
+
+    def release(self, job_id: int, lease_token: str, delay: float = 0) -> bool:
+        """Give a leased job back (e.g. on failure), visible again after delay."""
+        cursor = self._db.connection().execute(
+            "UPDATE jobs SET visible_at = ?, lease_token = NULL WHERE id = ? AND lease_token = ?",
+            (time.time() + delay, job_id, lease_token))
+        if cursor.rowcount == 1:
+            with self._changed:
+                self._changed.notify_all()
+        return cursor.rowcount == 1
+
+    def consume(self) -> Optional[Job]:
+        """Lease and acknowledge the oldest job in one step (at-most-once delivery)."""
+        job = self.lease()
+        if job is not None:
+            self.ack(job.id, job.lease_token)
+        return job
+
+    def peek(self, after_id: int = 0) -> Optional[Job]:
+        """Oldest visible job with an ID above after_id, without leasing it."""
+        row = self._db.connection().execute(
+            "SELECT id, kind, payload, attempts FROM jobs "
+            "WHERE dead = 0 AND visible_at <= ? AND id > ? ORDER BY id LIMIT 1",
+            (time.time(), after_id)).fetchone()
+        return Job(row[0], row[1], json.loads(row[2]), row[3], None) if row else None
+
+    def discard(self, job_id: int) -> bool:
+        """Drop a job that is not currently leased."""
+        cursor = self._db.connection().execute(
+            "DELETE FROM jobs WHERE id = ? AND (lease_token IS NULL OR visible_at <= ?)",
+            (job_id, time.time()))
+        return cursor.rowcount == 1
+
+    def wait_for(self, fetch: Callable[[], Optional[Job]], timeout: float) -> Optional[Job]:
+        """
+        Call fetch until it returns a job or the timeout expires.
+
+        Waiters wake immediately for jobs enqueued in this process and within
+        poll_interval for jobs enqueued by other workers.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = fetch()
+            remaining = deadline - time.monotonic()
+            if job is not None or remaining <= 0:
+                return job
+            with self._changed:
+                self._changed.wait(min(self.poll_interval, remaining))
+
+    async def wait_for_async(self, fetch: Callable[[], Optional[Job]], timeout: float) -> Optional[Job]:
+        """
+        asyncio variant of wait_for for event-loop servers.
+
+        Waiting costs no thread: fetch runs in a worker thread and the loop
+        re-checks every poll_interval.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await asyncio.to_thread(fetch)
+            remaining = deadline - time.monotonic()
+            if job is not None or remaining <= 0:
+                return job
+            await asyncio.sleep(min(self.poll_interval, remaining))
+
+    def stats(self) -> Dict[str, int]:
+        now = time.time()
+        ready, leased, dead = self._db.connection().execute(
+            "SELECT "
+            "COALESCE(SUM(dead = 0 AND visible_at <= ?), 0), "
+            "COALESCE(SUM(dead = 0 AND visible_at > ? AND lease_token IS NOT NULL), 0), "
+            "COALESCE(SUM(dead = 1), 0) FROM jobs", (now, now)).fetchone()
+        return {"ready": ready, "leased": leased, "dead": dead}
+
+
+# Global queue instance
+_job_queue = None
+
+
+def get_job_queue():
+    """Get or create the job queue singleton (JOB_QUEUE_PATH or WEBAPP_DATA_DIR/jobs.db)."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(
+            data_path("JOB_QUEUE_PATH", "jobs.db"),
+            visibility_timeout=float(os.getenv("JOB_VISIBILITY_TIMEOUT", "300")),
+        )
+    return _job_queue
@@ -0,0 +1,208 @@
+"""
+Fuzzy Product Matcher
+Character n-gram TF-IDF index over catalog categories, with vectorized
+top-k cosine search
+
+Used when no category keyword appears literally in the listing title (e.g.
+"iPhone 13 Pro" vs "phone" in the wrong place, or a title that only names
+the product in its description). The index is built offline and loaded at
+startup:
+
+    python matcher.py catalog_index.npz                 # from the built-in catalog
+    python matcher.py catalog_index.npz --catalog catalog.fbcat
+    MATCHER_INDEX_PATH=catalog_index.npz python app.py
+"""
+
+import argparse
+import logging
+import math
+import re
+import sys
+from collections import Counter
+from typing import Optional, Dict, List, Sequence, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZE = 3
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# A query is a list of (text, weight) fields, e.g. title, category, description
+Query = Sequence[Tuple[str, float]]
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase alphanumeric tokens."""
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def edits1(token: str) -> Set[str]:
+    """Tokens one deletion, insertion, substitution or adjacent swap away ("chiar" -> "chair")."""
+    letters = "abcdefghijklmnopqrstuvwxyz0123456789"
+    splits = [(token[:i], token[i:]) for i in range(len(token) + 1)]
+    deletes = {a + b[1:] for a, b in splits if b}
+    swaps = {a + b[1] + b[0] + b[2:] for a, b in splits if len(b) > 1}
+    replaces = {a + c + b[1:] for a, b in splits if b for c in letters}
+    inserts = {a + c + b for a, b in splits for c in letters}
+    return deletes | swaps | replaces | inserts
+
+
+def char_ngrams(text: str) -> Counter:
+    """Count padded character n-grams of each token ("sofa" -> " so", "sof", "ofa", "fa ")."""
+    grams = Counter()
+    for token in tokenize(text):
+        padded = f" {token} "
+        for i in range(max(1, len(padded) - NGRAM_SIZE + 1)):
+            grams[padded[i:i + NGRAM_SIZE]] += 1
+    return grams
+
+
+class NgramIndex:
+    """
+    TF-IDF vectors of labelled documents, stored column-wise (per n-gram).
+
+    Document vectors are L2-normalized, so the dot product with a normalized
+    query is the cosine similarity. Scoring a batch gathers the posting lists
+    of every query n-gram in one go and accumulates them with np.add.at,
+    so the cost scales with the postings touched, not with the catalog size.
+    """
+
+    def __init__(self, labels: List[str], vocab: List[str], idf: np.ndarray,
+                 indptr: np.ndarray, doc_ids: np.ndarray, weights: np.ndarray):
+        self.labels = labels
+        self.vocab = {gram: i for i, gram in enumerate(vocab)}
+        self._vocab_list = vocab
+        self.idf = idf
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        # Weight given to n-grams the index has never seen (rarest possible)
+        self._unseen_idf = math.log(1 + len(labels)) + 1
+
+    @classmethod
+    def build(cls, labels: List[str], documents: List[str]) -> "NgramIndex":
+        """
+        Args:
+            labels: One label per document (e.g. category keyword)
+            documents: Text describing each label
+        """
+        doc_grams = [char_ngrams(doc) for doc in documents]
+        df = Counter()
+        for grams in doc_grams:
+            df.update(grams.keys())
+        vocab = sorted(df)
+        gram_ids = {gram: i for i, gram in enumerate(vocab)}
+        n_docs = len(documents)
+        idf = np.array([math.log((1 + n_docs) / (1 + df[g])) + 1 for g in vocab], dtype=np.float64)
+
+        postings: List[List[Tuple[int, float]]] = [[] for _ in vocab]
+        for doc_id, grams in enumerate(doc_grams):
+            row = {gram_ids[g]: (1 + math.log(tf)) * idf[gram_ids[g]] for g, tf in grams.items()}
+            norm = math.sqrt(sum(w * w for w in row.values())) or 1.0
+            for gid, w in row.items():
+                postings[gid].append((doc_id, w / norm))
+
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(p) for p in postings])
+        doc_ids = np.fromiter((d for p in postings for d, _ in p), dtype=np.int32, count=int(indptr[-1]))
+        weights = np.fromiter((w for p in postings for _, w in p), dtype=np.float32, count=int(indptr[-1]))
+        return cls(list(labels), vocab, idf, indptr, doc_ids, weights)
+
+    @classmethod
+    def for_catalog(cls, catalog) -> "NgramIndex":
+        """One document per category: the keyword (weighted up), its aliases and its item names."""
+        labels, documents = [], []
+        for cid, category in enumerate(catalog.categories):
+            start, end = catalog.store.category_range(cid)
+            names = [catalog.store.name(i) for i in range(start, end)]
+            labels.append(category)
+            documents.append(" ".join([category] * 3 + catalog.aliases.get(category, []) + names))
+        return cls.build(labels, documents)
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as fh:
+            np.savez_compressed(fh, labels=np.array(self.labels), vocab=np.array(self._vocab_list),
+                                idf=self.idf, indptr=self.indptr, doc_ids=self.doc_ids, weights=self.weights)
+
+    @classmethod
+    def load(cls, path: str) -> "NgramIndex":
+        data = np.load(path, allow_pickle=False)
+        return cls([str(s) for s in data["labels"]], [str(s) for s in data["vocab"]], data["idf"],
+                   data["indptr"], data["doc_ids"], data["weights"])
+
+    def _vectorize(self, query: Query) -> Tuple[np.ndarray, np.ndarray]:
+        """Known n-gram ids and their normalized TF-IDF weights for one query."""
+        weights: Dict[str, float] = {}
+        for text, field_weight in query:
+            for gram, tf in char_ngrams(text).items():
+                gid = self.vocab.get(gram)
+                idf = self.idf[gid] if gid is not None else self._unseen_idf
+                weights[gram] = weights.get(gram, 0.0) + field_weight * (1 + math.log(tf)) * idf
+        # Unseen n-grams count toward the norm, so off-topic text lowers the score
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        known = [(self.vocab[g], w / norm) for g, w in weights.items() if g in self.vocab]
+        if not known:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        ids, ws = zip(*known)
+        return np.array(ids, dtype=np.int64), np.array(ws, dtype=np.float64)
+
+    def search_batch(self, queries: Sequence[Query], k: int = 5) -> List[List[Tuple[str, float]]]:
+        """
+        Top-k labels by cosine similarity for every query at once.
+
+        Returns:
+            One list of (label, score) per query, best first
+        """
+        n_docs = len(self.labels)
+        if not queries or not n_docs:
+            return [[] for _ in queries]
+
+        vectors = [self._vectorize(q) for q in queries]
+        gram_ids = np.concatenate([v[0] for v in vectors])
+        gram_weights = np.concatenate([v[1] for v in vectors])
+        query_ids = np.repeat(np.arange(len(queries)), [len(v[0]) for v in vectors])
+
+        starts = self.indptr[gram_ids]
+        lengths = self.indptr[gram_ids + 1] - starts
+        total = int(lengths.sum())
+        scores = np.zeros((len(queries), n_docs), dtype=np.float64)
+        if total:
+            # Flatten every touched posting list into one gather
+            offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+            rows = np.repeat(query_ids, lengths)
+            np.add.at(scores, (rows, self.doc_ids[offsets]),
+                      np.repeat(gram_weights, lengths) * self.weights[offsets])
+
+        k = min(k, n_docs)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in enumerate(top):
+            ordered = candidates[np.argsort(-scores[row, candidates], kind="stable")]
+            results.append([(self.labels[d], float(scores[row, d])) for d in ordered if scores[row, d] > 0])
+        return results
+
+    def search(self, query: Query, k: int = 5) -> List[Tuple[str, float]]:
+        return self.search_batch([query], k)[0]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build the fuzzy matching index for a catalog")
+    parser.add_argument("output", help="Output .npz path")
+    parser.add_argument("--catalog", help="Catalog file built with catalog_store.py (default: built-in data)")
+    args = parser.parse_args(argv)
+
+    from catalog import DEFAULT_CATALOG, SustainableCatalog
+    if args.catalog:
+        catalog = SustainableCatalog.from_file(args.catalog, fuzzy=False)
+    else:
+        catalog = SustainableCatalog.from_data(DEFAULT_CATALOG, fuzzy=False)
+    index = NgramIndex.for_catalog(catalog)
+    index.save(args.output)
+    print(f"Indexed {len(index.labels)} categories ({len(index.vocab)} n-grams) to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+"""
+Request Metrics
+Counters, gauges and histograms for routes, admission control, CRS calls,
+catalog matching, ranking and message generation, rendered in the Prometheus text format at /metrics
+"""
+
+import bisect
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+
+# Upper bounds (seconds) for latency histograms
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Upper bounds (bytes) for payload size histograms
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Shards of finished threads are folded together once this many are registered
+_MAX_SHARDS = 256
+
+
+class _Shard:
+    """One thread's samples: {(metric index, label values): number or [bucket counts..., sum]}."""
+
+    __slots__ = ("values", "_thread")
+
+    def __init__(self, thread: Optional[threading.Thread] = None):
+        self.values: Dict[Tuple[int, tuple], Any] = {}
+        self._thread = weakref.ref(thread) if thread is not None else None
+
+    def alive(self) -> bool:
+        thread = self._thread() if self._thread is not None else None
+        return thread is not None and thread.is_alive()
+
+
+class MetricsRegistry:
+    """
+    Metric definitions plus per-thread sample shards.
+
+    Recording only touches the calling thread's shard, so the request path
+    takes no lock; a scrape sums the shards under the registry lock. Shards
+    of finished threads are merged into one retired shard, so servers that
+    start a thread per request don't grow the list without bound.
+
+    Values are per process: under serve.py each worker reports its own
+    requests, and the scraper (or a sum() in the query) combines them.
+    """
+
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+        self._shards: List[_Shard] = []
+        self._retired = _Shard()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric") -> int:
+        with self._lock:
+            self._metrics.append(metric)
+            return len(self._metrics) - 1
+
+    def shard(self) -> Dict[Tuple[int, tuple], Any]:
+        """The calling thread's sample dict."""
+        try:
+            return self._local.values
+        except AttributeError:
+            shard = _Shard(threading.current_thread())
+            with self._lock:
+                if len(self._shards) >= _MAX_SHARDS:
+                    self._fold_finished()
+                self._shards.append(shard)
+            self._local.values = shard.values
+            return shard.values
+
+    def _fold_finished(self) -> None:
+        # Caller holds self._lock; a finished thread never writes its shard again
+        live = []
+        for shard in self._shards:
+            if shard.alive():
+                live.append(shard)
+            else:
+                self._merge(self._retired.values, shard.values)
+        self._shards = live
+
+    @staticmethod
+    def _merge(into: Dict[Tuple[int, tuple], Any], values: Dict[Tuple[int, tuple], Any]) -> None:
+        # list() copies atomically, so owner threads may keep recording
+        for key, value in list(values.items()):
+            if isinstance(value, list):
+                total = into.get(key)
+                if total is None:
+                    into[key] = list(value)
+                else:
+                    for i, v in enumerate(value):
+                        total[i] += v
+            else:
+                into[key] = into.get(key, 0) + value
+
+    def collect(self) -> Dict[Tuple[int, tuple], Any]:
+        """Samples summed over every thread."""
+        totals: Dict[Tuple[int, tuple], Any] = {}
+        with self._lock:
+            self._fold_finished()
+            self._merge(totals, self._retired.values)
+            for shard in self._shards:
+                self._merge(totals, shard.values)
+        return totals
+
+    def render(self) -> str:
+        """Prometheus text exposition (format 0.0.4) of every metric."""
+        samples: Dict[int, List[Tuple[tuple, Any]]] = {}
+        for (index, labels), value in self.collect().items():
+            samples.setdefault(index, []).append((labels, value))
+
+        lines = []
+        for index, metric in enumerate(self._metrics):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, value in sorted(samples.get(index, ()), key=lambda s: tuple(map(str, s[0]))):
+                lines.extend(metric.samples(labels, value))
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 registry: Optional[MetricsRegistry] = None):
+        """
+        Args:
+            name: Metric name
+            help: One-line description for the HELP comment
+            labels: Label names; values are passed positionally when recording
+            registry: Registry to record into (defaults to REGISTRY)
+        """
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._registry = registry or REGISTRY
+        self._index = self._registry.register(self)
+
+    def _label_text(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self, labels: tuple, value: Any) -> List[str]:
+        return [f"{self.name}{self._label_text(labels)} {_number(value)}"]
+
+
+class Counter(_Metric):
+    """Monotonic count; by convention the name ends in _total."""
+
+    kind = "counter"
+
+    def inc(self, *labels: Any, amount: float = 1) -> None:
+        values = self._registry.shard()
+        key = (self._index, labels)
+        values[key] = values.get(key, 0) + amount
+
+
+class Gauge(Counter):
+    """Value that goes up and down; inc and dec may happen on different threads."""
+
+    kind = "gauge"
+
+    def dec(self, *labels: Any, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    """Bucketed observations with a running sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, registry: Optional[MetricsRegistry] = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels, registry)
+
+    def observe(self, value: float, *labels: Any) -> None:
+        values = self._registry.shard()
+        key = (self._index, labels)
+        counts = values.get(key)
+        if counts is None:
+            # One slot per bucket, one for +Inf, then the sum
+            counts = values[key] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    @contextmanager
+    def time(self, *labels: Any):
+        """Observe the wall time of the with block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self, labels: tuple, counts: List[float]) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = 'le="' + _number(bound) + '"'
+            lines.append(f"{self.name}_bucket{self._label_text(labels, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_text(labels)} {_number(counts[-1])}")
+        lines.append(f"{self.name}_count{self._label_text(labels)} {cumulative}")
+        return lines
+
+
+# Global registry every metric below records into
+REGISTRY = MetricsRegistry()
+
+REQUEST_SECONDS = Histogram("webapp_request_duration_seconds", "Request latency by route, method and status",
+                            ("route", "method", "status"))
+REQUESTS_IN_FLIGHT = Gauge("webapp_requests_in_flight", "Requests currently being handled", ("route",))
+REQUEST_BYTES = Histogram("webapp_request_size_bytes", "Request body size", ("route",), SIZE_BUCKETS)
+RESPONSE_BYTES = Histogram("webapp_response_size_bytes", "Response body size (streamed responses excluded)",
+                           ("route",), SIZE_BUCKETS)
+CRS_REQUEST_SECONDS = Histogram("webapp_crs_request_duration_seconds",
+                                "Credit bureau calls including retries, by endpoint and outcome",
+                                ("endpoint", "outcome"))
+CRS_CIRCUIT_TRANSITIONS = Counter("webapp_crs_circuit_transitions_total",
+                                  "CRS circuit breaker state changes, by new state", ("state",))
+CRS_FALLBACKS = Counter("webapp_crs_fallbacks_total",
+                        "Profiles served without the bureau while the circuit is open, by source (stale, degraded)",
+                        ("source",))
+ADMISSION_REJECTIONS = Counter("webapp_admission_rejections_total",
+                               "Requests shed by admission control, by route and reason", ("route", "reason"))
+CATALOG_MATCH_SECONDS = Histogram("webapp_catalog_match_duration_seconds",
+                                  "Catalog matching per lookup batch, by stage (keyword, fuzzy, order)", ("stage",))
+RANKING_SECONDS = Histogram("webapp_ranking_duration_seconds", "Price/CO2 ranking of one candidate set")
+GENERATION_SECONDS = Histogram("webapp_generation_duration_seconds",
+                               "Message generation proxy calls, by outcome (hit, miss, error)", ("outcome",))
+GENERATION_BATCH_SIZE = Histogram("webapp_generation_batch_size", "Prompts per generation backend call",
+                                  buckets=(1, 2, 4, 8, 16, 32, 64))
+
+
+def request_started(route: str) -> float:
+    """Count a request as in flight; returns the start time for request_finished."""
+    REQUESTS_IN_FLIGHT.inc(route)
+    return time.perf_counter()
+
+
+def request_finished(route: str, method: str, status: int, started: float,
+                     request_bytes: Optional[int] = None, response_bytes: Optional[int] = None) -> None:
+    """Record a completed request started with request_started."""
+    REQUEST_SECONDS.observe(time.perf_counter() - started, route, method, status)
+    REQUESTS_IN_FLIGHT.dec(route)
+    if request_bytes is not None:
+        REQUEST_BYTES.observe(request_bytes, route)
+    if response_bytes is not None:
+        RESPONSE_BYTES.observe(response_bytes, route)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,150 @@
+"""
+Request Profiler
+Opt-in cProfile capture of individual requests, kept in a bounded SQLite ring
+buffer for download through the admin API
+"""
+
+import cProfile
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+from typing import Optional, Dict, Any, List
+
+from storage import SQLiteConnections, data_path
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL    NOT NULL,
+    info       TEXT    NOT NULL,
+    stats      BLOB    NOT NULL
+);
+"""
+
+# Sort orders accepted by render_text
+SORT_KEYS = ("cumulative", "tottime", "ncalls")
+
+
+class _LoadedStats:
+    """Stats dict in the shape pstats.Stats accepts in place of a Profile."""
+
+    def __init__(self, stats: Dict):
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
+
+
+class RequestProfiler:
+    """
+    Profiles one request at a time on the thread serving it.
+
+    Requests are profiled when asked for explicitly (the X-Profile header,
+    see app.py) or at random with probability sample_rate. Only one profile
+    runs at a time per process; a request that would overlap another runs
+    unprofiled, which also bounds the overhead of a high sample rate.
+
+    Profiles are stored in the marshalled form pstats reads (the same bytes
+    as Profile.dump_stats) in a SQLite table shared by every worker process,
+    keeping only the newest capacity entries.
+    """
+
+    def __init__(self, path: str, capacity: int = 20, sample_rate: float = 0.0):
+        """
+        Args:
+            path: SQLite database file
+            capacity: Number of profiles kept before the oldest is dropped
+            sample_rate: Fraction of requests profiled without being asked (0 disables)
+        """
+        self.path = path
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self._running = threading.Lock()
+
+        self._db = SQLiteConnections(path, _SCHEMA)
+
+    def should_sample(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """Begin profiling the calling thread; None if another profile is running."""
+        if not self._running.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Another profiler (e.g. a debugger) already owns the hook
+            self._running.release()
+            logger.warning(f"Request profiling unavailable: {e}")
+            return None
+        return profile
+
+    def finish(self, profile: cProfile.Profile, **info: Any) -> int:
+        """
+        Stop a profile from start() and store it.
+
+        Args:
+            profile: Profile returned by start() on this thread
+            **info: Request details kept alongside the stats (route, status, ...)
+
+        Returns:
+            Id to fetch the profile with
+        """
+        profile.disable()
+        self._running.release()
+        profile.create_stats()
+        conn = self._db.connection()
+        profile_id = conn.execute(
+            "INSERT INTO profiles (created_at, info, stats) VALUES (?, ?, ?)",
+            (time.time(), json.dumps({"pid": os.getpid(), **info}), marshal.dumps(profile.stats))).lastrowid
+        conn.execute("DELETE FROM profiles WHERE id <= ?", (profile_id - self.capacity,))
+        return profile_id
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Stored profiles without their stats, newest first."""
+        rows = self._db.connection().execute("SELECT id, created_at, info FROM profiles ORDER BY id DESC").fetchall()
+        return [{"id": row_id, "created_at": created_at, **json.loads(info)} for row_id, created_at, info in rows]
+
+    def get(self, profile_id: int) -> Optional[Dict[str, Any]]:
+        """A stored profile with its marshalled stats, or None if it has been dropped."""
+        row = self._db.connection().execute(
+            "SELECT id, created_at, info, stats FROM profiles WHERE id = ?", (profile_id,)).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "created_at": row[1], **json.loads(row[2]), "stats": row[3]}
+
+    def clear(self) -> None:
+        self._db.connection().execute("DELETE FROM profiles")
+
+    @staticmethod
+    def render_text(stats: bytes, sort: str = "cumulative", limit: int = 50) -> str:
+        """Human-readable pstats table of a stored profile's top functions."""
+        out = io.StringIO()
+        loaded = pstats.Stats(_LoadedStats(marshal.loads(stats)), stream=out)
+        loaded.strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+# Global profiler instance
+_profiler = None
+
+
+def get_profiler():
+    """Get or create the profiler (PROFILE_PATH or WEBAPP_DATA_DIR/profiles.db)."""
+    global _profiler
+    if _profiler is None:
+        _profiler = RequestProfiler(
+            data_path("PROFILE_PATH", "profiles.db"),
+            capacity=int(os.getenv("PROFILE_BUFFER_SIZE", "20")),
+            sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+        )
+    return _profiler
@@ -0,0 +1,292 @@
+"""
+Vectorized Ranking Engine
+Filters and orders catalog items by user price range and CO₂ savings
+"""
+
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from geo import GeoIndex, LatLon
+from metrics import RANKING_SECONDS
+
+# Priority levels by credit tier (higher = more premium options shown first)
+TIER_PRIORITY = {
+    "excellent": 4,
+    "good": 3,
+    "fair": 2,
+    "poor": 1
+}
+
+# Recommended price range per credit tier (CRSClient hands these out in profiles)
+TIER_PRICE_RANGES = {
+    "excellent": {"min": 100, "max": 5000},
+    "good": {"min": 50, "max": 2000},
+    "fair": {"min": 20, "max": 800},
+    "poor": {"min": 10, "max": 300}
+}
+
+# Candidate sets larger than this are pre-trimmed with argpartition before sorting
+_PARTITION_THRESHOLD = 64
+# Precomputed-tier candidate sets up to this size are ranked in plain Python,
+# which beats NumPy's per-call overhead for a handful of ids
+_SMALL_CANDIDATES = 64
+# Distance that costs an item one place in the CO₂/price order in rank_near
+DISTANCE_KM_PER_RANK = 50.0
+
+
+class RankingEngine:
+    """
+    Ranks items of a catalog store using NumPy arrays built once at load time.
+
+    Price and CO₂ columns are wrapped without copying (np.frombuffer over the
+    store's array or mmap column) and the derived sort keys are computed once,
+    so each request is a handful of masked array operations and one lexsort.
+
+    Profiles from CRSClient only ever carry one of four tier price ranges, so
+    the filter mask for each tier (with or without its range), a dense rank
+    of the sort keys and every category's in-range items in ranked order are
+    also built at load. Ranking a category for a tier's own range is then a
+    slice of its ranked list (re-sorting only the items tied at the cut so
+    name matches come first); other candidate sets with a tier range are a
+    mask lookup and a sort of a few small integers, and custom ranges use the
+    dynamic path. All give identical results.
+
+    When items carry locations, rank_near is an optional stage after rank
+    that weighs in distance from the user, backed by a per-category KD-tree.
+    """
+
+    def __init__(self, store):
+        """
+        Build sort keys for every item in the store.
+
+        Args:
+            store: InMemoryStore or CatalogFile exposing float64 prices and co2 columns
+        """
+        self.prices = np.frombuffer(store.prices, dtype=np.float64)
+        self.has_price = ~np.isnan(self.prices)
+        # Sort keys: highest CO₂ savings first, then lowest price (unpriced last)
+        self._co2_key = -np.nan_to_num(np.frombuffer(store.co2, dtype=np.float64), nan=0.0)
+        self._price_key = np.where(self.has_price, self.prices, np.inf)
+        self._build_tier_views(store)
+        # None when no item has a location
+        self.geo = GeoIndex.for_store(store)
+
+    def _build_tier_views(self, store) -> None:
+        n_items = self.prices.size
+        # Dense rank of (CO₂ key, price key): equal keys share a rank, so a
+        # stable sort on it keeps ties in candidate order like the lexsort does
+        order = np.lexsort((self._price_key, self._co2_key))
+        co2_sorted, price_sorted = self._co2_key[order], self._price_key[order]
+        new_key = np.ones(n_items, dtype=bool)
+        new_key[1:] = (co2_sorted[1:] != co2_sorted[:-1]) | (price_sorted[1:] != price_sorted[:-1])
+        self._rank_key = np.empty(n_items, dtype=np.int64)
+        self._rank_key[order] = np.cumsum(new_key)
+        self._rank_by_id = memoryview(self._rank_key)
+
+        # Category of each item (categories are contiguous id ranges)
+        self._bounds = [store.category_range(cid) for cid in range(len(store.categories))]
+        self._category = np.zeros(n_items, dtype=np.int64)
+        for cid, (start, end) in enumerate(self._bounds):
+            self._category[start:end] = cid
+
+        # Item ids grouped by category, ranked within each, ties in catalog order
+        by_category = np.lexsort((self._rank_key, self._category))
+
+        # (priority, min, max) -> (keep mask, same as bytes, kept ids of by_category,
+        # their rank keys, per-category offsets into them)
+        self._tier_views: Dict[Tuple[int, Optional[float], Optional[float]], Tuple] = {}
+        for tier, price_range in TIER_PRICE_RANGES.items():
+            priority = TIER_PRIORITY[tier]
+            for key in ((priority, price_range["min"], price_range["max"]), (priority, None, None)):
+                if key in self._tier_views:
+                    continue
+                keep = self._keep_mask(self.prices, self.has_price, key[1], key[2], priority)
+                ranked = by_category[keep[by_category]]
+                offsets = np.searchsorted(self._category[ranked], np.arange(len(self._bounds) + 1))
+                self._tier_views[key] = (keep, keep.tobytes(), ranked, self._rank_key[ranked], offsets)
+
+    @staticmethod
+    def _keep_mask(prices: np.ndarray, has_price: np.ndarray, low, high, priority: int) -> np.ndarray:
+        if low and high:
+            # NaN compares False, so unpriced items never land in range
+            keep = (prices >= low) & (prices <= high)
+        else:
+            keep = has_price.copy()
+        if priority <= 2:
+            keep |= ~has_price
+        return keep
+
+    def _tier_view(self, price_range: Dict[str, Any], score_tier: str):
+        """Precomputed view matching this request, or None for a custom price range."""
+        low, high = (price_range or {}).get("min"), (price_range or {}).get("max")
+        priority = TIER_PRIORITY.get(score_tier, 3)
+        key = (priority, low, high) if low and high else (priority, None, None)
+        try:
+            return self._tier_views.get(key)
+        except TypeError:
+            # Unhashable range values; the dynamic path reports them as before
+            return None
+
+    def rank(self, ids: Sequence[int], price_range: Dict[str, Any],
+             score_tier: str, limit: int = 5) -> Tuple[np.ndarray, bool]:
+        """
+        Filter candidates to the user's price range and order them.
+
+        Args:
+            ids: Candidate item ids, in catalog relevance order
+            price_range: {"min": X, "max": Y}; ignored unless both are set
+            score_tier: Credit tier; fair/poor tiers keep unpriced options
+            limit: Number of ids to return
+
+        Returns:
+            (ranked item ids, True if nothing matched and the ids fall
+            outside the user's range)
+        """
+        with RANKING_SECONDS.time():
+            view = self._tier_view(price_range, score_tier)
+            if view is not None:
+                return self._rank_precomputed(ids, view, limit)
+            return self._rank(ids, price_range, score_tier, limit)
+
+    def rank_category(self, cid: int, preferred: Sequence[int], price_range: Dict[str, Any],
+                      score_tier: str, limit: int = 5) -> Tuple[np.ndarray, bool]:
+        """
+        rank() over every item of category cid.
+
+        Candidates are in relevance order: preferred first, then the rest of
+        the category in catalog order, so items in the user's price range are
+        found however far down the category they are. For a tier's own price
+        range this is a slice of the category's precomputed ranked list.
+
+        Args:
+            cid: Category id
+            preferred: Items of the category matching the listing, best first
+            price_range, score_tier, limit: As for rank
+        """
+        with RANKING_SECONDS.time():
+            view = self._tier_view(price_range, score_tier)
+            if view is not None and view[4][cid + 1] > view[4][cid]:
+                return self._slice_category(cid, preferred, view, limit), False
+
+            start, end = self._bounds[cid]
+            ids = np.arange(start, end, dtype=np.intp)
+            if len(preferred):
+                preferred = np.asarray(preferred, dtype=np.intp)
+                rest = np.ones(end - start, dtype=bool)
+                rest[preferred - start] = False
+                ids = np.concatenate((preferred, ids[rest]))
+            if view is not None:
+                return self._rank_precomputed(ids, view, limit)
+            return self._rank(ids, price_range, score_tier, limit)
+
+    @staticmethod
+    def _slice_category(cid: int, preferred: Sequence[int], view: Tuple, limit: int) -> np.ndarray:
+        _, _, ranked, ranked_keys, offsets = view
+        start, end = int(offsets[cid]), int(offsets[cid + 1])
+        if not len(preferred):
+            # Without name matches the candidate order is catalog order, as in the ranked list
+            return ranked[start:min(end, start + limit)]
+
+        # Items tied with the last one to make the cut may be reordered by
+        # name match, so take them all and sort by (rank, match position, id)
+        cut = min(end, start + limit) - 1
+        cut = start + int(np.searchsorted(ranked_keys[start:end], ranked_keys[cut], side="right"))
+        head, head_keys = ranked[start:cut], ranked_keys[start:cut]
+        position = dict(zip(preferred, range(len(preferred))))
+        matched = np.fromiter((position.get(item_id, len(position)) for item_id in head.tolist()),
+                              dtype=np.intp, count=head.size)
+        return head[np.lexsort((head, matched, head_keys))[:limit]]
+
+    def _rank_precomputed(self, ids: Sequence[int], view: Tuple, limit: int) -> Tuple[np.ndarray, bool]:
+        keep, keep_bytes = view[:2]
+        if len(ids) <= _SMALL_CANDIDATES:
+            selected = [item_id for item_id in ids if keep_bytes[item_id]]
+            outside_range = not selected and len(ids) > 0
+            if outside_range:
+                selected = list(ids[:3])
+            # list.sort is stable, so ties keep candidate order
+            selected.sort(key=self._rank_by_id.__getitem__)
+            return np.array(selected[:limit], dtype=np.intp), outside_range
+
+        ids = np.asarray(ids, dtype=np.intp)
+        selected = ids[keep[ids]]
+        outside_range = selected.size == 0 and ids.size > 0
+        if outside_range:
+            selected = ids[:3]
+        order = np.argsort(self._rank_key[selected], kind="stable")
+        return selected[order[:limit]], outside_range
+
+    def _rank(self, ids: Sequence[int], price_range: Dict[str, Any],
+              score_tier: str, limit: int) -> Tuple[np.ndarray, bool]:
+        ids = np.asarray(ids, dtype=np.intp)
+        priority = TIER_PRIORITY.get(score_tier, 3)
+        low, high = (price_range or {}).get("min"), (price_range or {}).get("max")
+        keep = self._keep_mask(self.prices[ids], self.has_price[ids], low, high, priority)
+
+        selected = ids[keep]
+        outside_range = selected.size == 0 and ids.size > 0
+        if outside_range:
+            selected = ids[:3]
+
+        if selected.size > _PARTITION_THRESHOLD and selected.size > limit:
+            # Only items tied with or better than the limit-th CO₂ key can make the cut
+            co2 = self._co2_key[selected]
+            kth = np.partition(co2, limit - 1)[limit - 1]
+            selected = selected[co2 <= kth]
+
+        # lexsort is stable and sorts by the last key first
+        order = np.lexsort((self._price_key[selected], self._co2_key[selected]))
+        return selected[order[:limit]], outside_range
+
+    def rank_near(self, ranked: np.ndarray, origin: LatLon, radius_km: Optional[float] = None,
+                  price_range: Optional[Dict[str, Any]] = None, score_tier: str = "good",
+                  limit: int = 5, km_per_rank: float = DISTANCE_KM_PER_RANK) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Reorder ranked items by distance from origin.
+
+        Each item moves back one place in the CO₂/price order per km_per_rank
+        km, so a slightly less green option nearby can overtake one across the
+        country. With radius_km, located items farther away are dropped and
+        the nearest items of the same category within the radius (filtered by
+        price_range and score_tier as in rank) fill the remaining places.
+        Items without a location are kept and treated as being as far as the
+        farthest located candidate.
+
+        Args:
+            ranked: Item ids from rank (pass a larger limit there to give
+                distance more candidates to choose from)
+            origin: (lat, lon) of the user
+            radius_km: Optional maximum distance
+            price_range: Price range given to rank, for radius backfill
+            score_tier: Credit tier given to rank, for radius backfill
+            limit: Number of ids to return
+            km_per_rank: Distance worth one place in the order
+
+        Returns:
+            (item ids, distance in km of each, NaN where unknown)
+        """
+        ranked = np.asarray(ranked, dtype=np.intp)
+        if self.geo is None:
+            return ranked[:limit], np.full(min(ranked.size, limit), np.nan)
+
+        distances = self.geo.distances(ranked, origin)
+        if radius_km is not None:
+            within = np.isnan(distances) | (distances <= radius_km)
+            if ranked.size and np.count_nonzero(within) < limit:
+                cid = int(self._category[ranked[0]])
+                nearby, _ = self.geo.nearest(cid, origin, 4 * limit, radius_km)
+                nearby = nearby[~np.isin(nearby, ranked)]
+                extra, outside_range = self.rank(nearby, price_range or {}, score_tier, limit)
+                if not outside_range and extra.size:
+                    ranked = np.concatenate((ranked[within], extra))
+                    distances = self.geo.distances(ranked, origin)
+                    within = np.ones(ranked.size, dtype=bool)
+            ranked, distances = ranked[within], distances[within]
+
+        known = ~np.isnan(distances)
+        if known.any():
+            penalty = np.where(known, distances, distances[known].max()) / km_per_rank
+            order = np.argsort(np.arange(ranked.size) + penalty, kind="stable")
+            ranked, distances = ranked[order], distances[order]
+        return ranked[:limit], distances[:limit]
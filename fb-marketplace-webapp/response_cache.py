@@ -0,0 +1,107 @@
+"""
+Response Cache
+Pre-serialized JSON responses for repeated product lookups, with ETags
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Hashable, Tuple
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache of encoded response bodies.
+
+    Entries are tagged with the catalog version they were computed from; the
+    first lookup under a new version drops everything, so a catalog reload
+    never serves stale alternatives. ETags are content hashes, so every
+    worker process hands out the same ETag for the same body.
+    """
+
+    def __init__(self, max_size: int = 2048):
+        """
+        Args:
+            max_size: Maximum number of bodies before least-recently-used eviction
+        """
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[str, bytes]]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def etag_for(body: bytes) -> str:
+        return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+    def _check_version(self, version: int) -> bool:
+        """Move to a newer catalog version; False for requests still on an older one."""
+        # Caller holds self._lock
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+        return True
+
+    def get(self, version: int, key: Hashable) -> Optional[Tuple[str, bytes]]:
+        """
+        Returns:
+            (etag, body) or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key) if self._check_version(version) else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, version: int, key: Hashable, body: bytes) -> str:
+        """Store an encoded body and return its ETag."""
+        etag = self.etag_for(body)
+        if self.max_size <= 0:
+            return etag
+        with self._lock:
+            if not self._check_version(version):
+                return etag
+            self._entries[key] = (etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return etag
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# Global response cache instance
+_response_cache = None
+
+
+def get_response_cache():
+    """Get or create the response cache singleton (sized by RESPONSE_CACHE_SIZE)."""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache(int(os.getenv("RESPONSE_CACHE_SIZE", "2048")))
+    return _response_cache
@@ -0,0 +1,195 @@
+"""
+Response Encoding
+Fast JSON encoding (orjson when installed), the compact columnar format,
+gzip/brotli compression and chunked JSON streaming for bulk responses
+"""
+
+import gzip
+import json
+import os
+import zlib
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Tuple
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# JSON_ENCODER=stdlib forces the standard library encoder even if orjson is installed
+if os.getenv("JSON_ENCODER", "").lower() == "stdlib":
+    orjson = None
+
+# Content type the extension sends in Accept to get columnar alternatives
+COLUMNAR_MIMETYPE = "application/vnd.fbmarketplace.columnar+json"
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# Cheap settings: these are small dynamic responses, not static assets
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+_COMPRESSIBLE_TYPES = ("application/json", COLUMNAR_MIMETYPE, "text/plain", "text/html")
+
+# Bulk streams are flushed in chunks of about this many bytes
+_STREAM_CHUNK_BYTES = 16 * 1024
+
+if orjson is not None:
+    # Datetimes go through Flask's default (HTTP dates) so output matches jsonify
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode obj as compact JSON bytes with the fastest available encoder."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=DefaultJSONProvider.default, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, default=DefaultJSONProvider.default, separators=(",", ":")).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that encodes with orjson when it is installed.
+
+    Installed as app.json, so jsonify and every route use it unchanged.
+    Without orjson (or with JSON_ENCODER=stdlib) it behaves exactly like
+    Flask's default provider. Keys are not sorted on the orjson path.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode()
+
+    def response(self, *args: Any, **kwargs: Any):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
+
+
+def to_columnar(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Compact form of a list of alternatives: each key is sent once.
+
+    Returns:
+        {"columns": [key, ...], "rows": [[value, ...], ...]}; columns are in
+        first-seen order and keys an item lacks are null in its row
+    """
+    columns: Dict[str, None] = {}
+    for item in items:
+        for key in item:
+            columns.setdefault(key, None)
+    return {"columns": list(columns), "rows": [[item.get(key) for key in columns] for item in items]}
+
+
+def _chunked(parts: Iterable[bytes], opening: bytes, closing: bytes) -> Iterator[bytes]:
+    """Join encoded JSON parts with commas between opening and closing, in ~16KB chunks."""
+    buffer = [opening]
+    size = len(opening)
+    first = True
+    for part in parts:
+        if not first:
+            buffer.append(b",")
+        buffer.append(part)
+        size += len(part) + 1
+        first = False
+        if size >= _STREAM_CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    buffer.append(closing)
+    yield b"".join(buffer)
+
+
+def stream_array(values: Iterable[bytes]) -> Iterator[bytes]:
+    """A JSON array of already encoded values, in chunks."""
+    return _chunked(values, b"[", b"]")
+
+
+def stream_object(fields: Dict[str, Any], streamed_field: str,
+                  members: Iterable[Tuple[str, bytes]]) -> Iterator[bytes]:
+    """
+    A JSON object of fields plus one field streamed as a nested object.
+
+    Args:
+        fields: Small members encoded up front
+        streamed_field: Name of the member written last, from members
+        members: (key, encoded value) pairs of the streamed member
+    """
+    head = dumps(fields)
+    opening = head[:-1] + (b"," if len(head) > 2 else b"") + dumps(streamed_field) + b":{"
+    return _chunked((dumps(key) + b":" + value for key, value in members), opening, b"}}")
+
+
+def stream_list_field(fields: Dict[str, Any], streamed_field: str, values: Iterable[bytes]) -> Iterator[bytes]:
+    """Like stream_object, with the streamed member a JSON array of encoded values."""
+    head = dumps(fields)
+    opening = head[:-1] + (b"," if len(head) > 2 else b"") + dumps(streamed_field) + b":["
+    return _chunked(values, opening, b"]}")
+
+
+def choose_encoding(accept_encodings) -> Optional[str]:
+    """Best of br/gzip the client accepts (werkzeug Accept-Encoding), or None."""
+    options = [("br", accept_encodings["br"])] if brotli is not None else []
+    options.append(("gzip", accept_encodings["gzip"]))
+    encoding, quality = max(options, key=lambda option: option[1])
+    return encoding if quality > 0 else None
+
+
+def _compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        compress, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        out = compress(chunk)
+        if out:
+            yield out
+    yield finish()
+
+
+def compress_response(resp, accept_encodings):
+    """
+    Compress a JSON/text response for a client that accepts it.
+
+    Buffered bodies are compressed when at least COMPRESS_MIN_BYTES;
+    streamed bodies are always compressed, chunk by chunk. Event streams,
+    304s and already encoded responses are left alone. A strong ETag is
+    weakened, as the compressed bytes differ from the identity encoding
+    (If-None-Match must then be compared with contains_weak).
+
+    Returns:
+        The same response, modified in place
+    """
+    if (resp.status_code < 200 or resp.status_code in (204, 304) or "Content-Encoding" in resp.headers
+            or resp.mimetype not in _COMPRESSIBLE_TYPES):
+        return resp
+    resp.vary.add("Accept-Encoding")
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return resp
+
+    if resp.is_streamed:
+        resp.response = _compress_stream(resp.response, encoding)
+        resp.headers.pop("Content-Length", None)
+    else:
+        body = resp.get_data()
+        if len(body) < COMPRESS_MIN_BYTES:
+            return resp
+        if encoding == "br":
+            resp.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+        else:
+            resp.set_data(gzip.compress(body, GZIP_LEVEL, mtime=0))
+    resp.headers["Content-Encoding"] = encoding
+
+    etag, weak = resp.get_etag()
+    if etag and not weak:
+        resp.set_etag(etag, weak=True)
+    return resp
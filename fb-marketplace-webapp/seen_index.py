@@ -0,0 +1,267 @@
+"""
+Seen Listing Index
+Remembers listings the extension has already messaged, keyed by a content hash
+of title, price and seller, so search cycles can skip them before opening them
+"""
+
+import hashlib
+import logging
+import math
+import os
+import re
+import threading
+import time
+from typing import Optional, Dict, Any, Iterable, List
+
+from storage import SQLiteConnections, data_path
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    key             BLOB    NOT NULL UNIQUE,
+    ts              INTEGER NOT NULL,
+    conversation_id TEXT
+);
+"""
+
+_SPACE = re.compile(r"\s+")
+_PRICE = re.compile(r"[\d,]*\.?\d+")
+# Older SQLite builds cap bound parameters per statement at 999
+_MAX_PARAMS = 900
+
+
+def _price_text(price: Any) -> str:
+    """Price normalized to cents ("" when unknown), so 120, "120.0" and "$120" agree."""
+    if isinstance(price, str):
+        match = _PRICE.search(price)
+        price = match.group().replace(",", "") if match else None
+    try:
+        value = float(price)
+    except (TypeError, ValueError):
+        return ""
+    if not math.isfinite(value) or value <= 0:
+        return ""
+    return f"{value:.2f}"
+
+
+def listing_key(listing: Dict[str, Any]) -> Optional[bytes]:
+    """
+    Content hash identifying a listing across search cycles.
+
+    Title and seller are case- and whitespace-insensitive; price is compared
+    in cents. Missing fields hash as empty, so callers that never see the
+    seller (the search results page) still agree with each other.
+
+    Returns:
+        16-byte digest, or None if the listing has no title
+    """
+    title = listing.get("title") or listing.get("productName")
+    if not isinstance(title, str) or not title.strip():
+        return None
+    seller = listing.get("seller") or listing.get("sellerName") or listing.get("sellerId") or ""
+    parts = (
+        _SPACE.sub(" ", title).strip().casefold(),
+        _price_text(listing.get("price")),
+        _SPACE.sub(" ", str(seller)).strip().casefold(),
+    )
+    return hashlib.blake2b("\x1f".join(parts).encode(), digest_size=16).digest()
+
+
+class BloomFilter:
+    """Bit array with k probes per key; keys are already uniform hashes."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        """
+        Args:
+            capacity: Keys the filter is sized for
+            error_rate: False positive rate at capacity
+        """
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        bits = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.size = max(bits, 64)
+        self.probes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: bytes) -> Iterable[int]:
+        # Double hashing from the two halves of the digest
+        h1 = int.from_bytes(key[:8], "little")
+        h2 = int.from_bytes(key[8:16], "little") | 1
+        size = self.size
+        return ((h1 + i * h2) % size for i in range(self.probes))
+
+    def add(self, key: bytes) -> None:
+        bits = self.bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: bytes) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class SeenIndex:
+    """
+    Set of contacted listings: a Bloom filter in front of a SQLite table.
+
+    Most listings on a results page have never been messaged, and the Bloom
+    filter answers those from memory; only its hits (real ones plus about
+    error_rate of the rest) are confirmed against the table. The filter is
+    loaded from the table at startup and doubled in size whenever it passes
+    capacity.
+
+    The table is shared by every worker process. Each process tracks the
+    highest row it has loaded and, when PRAGMA data_version shows another
+    connection has written, loads the newer rows before answering, so a
+    listing logged by one worker is never missed by another.
+    """
+
+    def __init__(self, path: str, capacity: int = 100000, error_rate: float = 0.01):
+        """
+        Args:
+            path: SQLite database file
+            capacity: Listings the Bloom filter is sized for initially
+            error_rate: Bloom filter false positive rate at capacity
+        """
+        self.path = path
+        self.error_rate = error_rate
+        # Per-thread PRAGMA data_version last seen, with the connection it came from
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._loaded_id = 0
+        self.lookups = 0
+        self.filtered = 0
+        self.false_positives = 0
+
+        self._db = SQLiteConnections(path, _SCHEMA)
+
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._sync(force=True)
+        logger.info(f"Seen listing index loaded with {self._bloom.count} listings")
+
+    def _sync(self, force: bool = False) -> None:
+        """Load rows written by other connections into the Bloom filter."""
+        conn = self._db.connection()
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        # data_version is only comparable on the same connection (reopened after fork)
+        if not force and getattr(self._local, "seen", None) == (conn, version):
+            return
+        self._local.seen = (conn, version)
+        with self._lock:
+            rows = conn.execute("SELECT id, key FROM seen WHERE id > ? ORDER BY id", (self._loaded_id,)).fetchall()
+            for row_id, key in rows:
+                self._bloom_add(key)
+                self._loaded_id = row_id
+
+    def _bloom_add(self, key: bytes) -> None:
+        # Caller holds self._lock
+        if self._bloom.count >= self._bloom.capacity:
+            self._grow()
+        self._bloom.add(key)
+
+    def _grow(self) -> None:
+        # Caller holds self._lock; rebuild from the table at twice the capacity
+        bloom = BloomFilter(self._bloom.capacity * 2, self.error_rate)
+        for (key,) in self._db.connection().execute("SELECT key FROM seen WHERE id <= ?", (self._loaded_id,)):
+            bloom.add(key)
+        self._bloom = bloom
+        logger.info(f"Seen listing index grown to {bloom.capacity} listings")
+
+    def add(self, listing: Dict[str, Any], conversation_id: Optional[str] = None) -> bool:
+        """
+        Record a contacted listing.
+
+        Returns:
+            True if it was new, False if already recorded or it has no title
+        """
+        key = listing_key(listing)
+        if key is None:
+            return False
+        cursor = self._db.connection().execute(
+            "INSERT OR IGNORE INTO seen (key, ts, conversation_id) VALUES (?, ?, ?)",
+            (key, int(time.time()), None if conversation_id is None else str(conversation_id)))
+        if cursor.rowcount:
+            # Load it now: this connection's own writes don't change its data_version
+            self._sync(force=True)
+        return bool(cursor.rowcount)
+
+    def contains_many(self, listings: List[Dict[str, Any]]) -> List[bool]:
+        """Whether each listing has been contacted; listings without a title are not."""
+        keys = [listing_key(listing) if isinstance(listing, dict) else None for listing in listings]
+        self._sync()
+        bloom = self._bloom
+        candidates = list({key for key in keys if key is not None and key in bloom})
+
+        found = set()
+        conn = self._db.connection()
+        # One query per chunk of Bloom hits, under SQLite's 999 bound-parameter limit
+        for start in range(0, len(candidates), _MAX_PARAMS):
+            chunk = candidates[start:start + _MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            found.update(key for (key,) in conn.execute(
+                f"SELECT key FROM seen WHERE key IN ({placeholders})", chunk))
+
+        self.lookups += len(keys)
+        self.filtered += sum(1 for key in keys if key is not None) - len(candidates)
+        self.false_positives += len(candidates) - len(found)
+        return [key in found for key in keys]
+
+    def __contains__(self, listing: Dict[str, Any]) -> bool:
+        return self.contains_many([listing])[0]
+
+    def __len__(self) -> int:
+        return self._db.connection().execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def backfill(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """Add the listings of send log entries. Returns how many were new."""
+        added = 0
+        for entry in entries:
+            if isinstance(entry.get("listing"), dict):
+                added += self.add(entry["listing"], entry.get("conversationId"))
+        return added
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self),
+            "bloom_capacity": self._bloom.capacity,
+            "bloom_bytes": len(self._bloom.bits),
+            "bloom_probes": self._bloom.probes,
+            "lookups": self.lookups,
+            "answered_by_bloom": self.filtered,
+            "false_positives": self.false_positives,
+        }
+
+
+def _send_log_entries(send_log) -> Iterable[Dict[str, Any]]:
+    cursor = None
+    while True:
+        entries, cursor = send_log.query(limit=1000, cursor=cursor, newest_first=False)
+        yield from entries
+        if cursor is None:
+            return
+
+
+# Global seen listing index instance
+_seen_index = None
+
+
+def get_seen_index():
+    """Get or create the seen listing index (SEEN_INDEX_PATH or WEBAPP_DATA_DIR/seen.db)."""
+    global _seen_index
+    if _seen_index is None:
+        index = SeenIndex(
+            data_path("SEEN_INDEX_PATH", "seen.db"),
+            capacity=int(os.getenv("SEEN_INDEX_CAPACITY", "100000")),
+        )
+        if not len(index):
+            # First start: pick up listings logged before the index existed
+            from send_log import get_send_log
+            added = index.backfill(_send_log_entries(get_send_log()))
+            if added:
+                logger.info(f"Seen listing index backfilled {added} listings from the send log")
+        _seen_index = index
+    return _seen_index
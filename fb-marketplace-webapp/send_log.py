@@ -0,0 +1,153 @@
+"""
+Send Log Storage
+Append-only, size-bounded SQLite log of messages sent by the extension
+"""
+
+import json
+import os
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+from storage import SQLiteConnections, data_path
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sends (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts              INTEGER NOT NULL,
+    conversation_id TEXT,
+    entry           TEXT    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sends_conversation ON sends (conversation_id, id);
+CREATE INDEX IF NOT EXISTS sends_ts ON sends (ts, id);
+"""
+
+
+class SendLog:
+    """
+    Append-only log of sent messages with size-based rotation.
+
+    Entries are only ever inserted; once the database grows past max_bytes the
+    oldest prune_fraction of entries is dropped and the freed pages returned
+    to the OS. Queries page by entry ID (the cursor) and use the
+    (conversation_id, id) and (ts, id) indexes, so fetching a page costs
+    O(page) regardless of how much history is kept.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024,
+                 prune_fraction: float = 0.25, check_every: int = 500):
+        """
+        Args:
+            path: SQLite database file
+            max_bytes: Size above which the oldest entries are rotated out
+            prune_fraction: Share of entries dropped per rotation
+            check_every: Appends between size checks
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.prune_fraction = prune_fraction
+        self.check_every = check_every
+        self._appends = 0
+
+        # auto_vacuum only takes effect if set before WAL mode and the first table
+        self._db = SQLiteConnections(path, _SCHEMA, pragmas=("PRAGMA auto_vacuum=INCREMENTAL",))
+
+    def append(self, entry: Dict[str, Any]) -> int:
+        """Record a sent message; entry["timestamp"] defaults to now."""
+        ts = int(entry.get("timestamp") or time.time())
+        conversation_id = entry.get("conversationId")
+        cursor = self._db.connection().execute(
+            "INSERT INTO sends (ts, conversation_id, entry) VALUES (?, ?, ?)",
+            (ts, None if conversation_id is None else str(conversation_id), json.dumps(entry)))
+        self._appends += 1
+        if self._appends % self.check_every == 0:
+            self.rotate()
+        return cursor.lastrowid
+
+    def size_bytes(self) -> int:
+        conn = self._db.connection()
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return (page_count - freelist) * page_size
+
+    def rotate(self, force: bool = False) -> int:
+        """Drop the oldest entries if the log is over max_bytes. Returns rows removed."""
+        if not force and self.size_bytes() <= self.max_bytes:
+            return 0
+        conn = self._db.connection()
+        total = conn.execute("SELECT COUNT(*) FROM sends").fetchone()[0]
+        drop = max(1, int(total * self.prune_fraction)) if total else 0
+        if not drop:
+            return 0
+        cursor = conn.execute(
+            "DELETE FROM sends WHERE id <= (SELECT id FROM sends ORDER BY id LIMIT 1 OFFSET ?)",
+            (drop - 1,))
+        conn.execute("PRAGMA incremental_vacuum")
+        return cursor.rowcount
+
+    def query(self, limit: int = 100, cursor: Optional[int] = None,
+              conversation_id: Optional[str] = None, since: Optional[int] = None,
+              until: Optional[int] = None, newest_first: bool = True) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Fetch one page of entries.
+
+        Args:
+            limit: Page size
+            cursor: next_cursor from the previous page
+            conversation_id: Only entries for this conversation
+            since: Only entries with timestamp >= since (epoch seconds)
+            until: Only entries with timestamp < until (epoch seconds)
+            newest_first: Page backwards from the latest entry (default) or forwards
+
+        Returns:
+            (entries, next_cursor); each entry is the appended dict plus its
+            "id" (the value cursors refer to); next_cursor is None on the last page
+        """
+        rows, next_cursor = self._page(limit, cursor, conversation_id, since, until, newest_first)
+        entries = []
+        for row_id, raw in rows:
+            entry = json.loads(raw)
+            entry["id"] = row_id
+            entries.append(entry)
+        return entries, next_cursor
+
+    def _page(self, limit: int, cursor: Optional[int], conversation_id: Optional[str], since: Optional[int],
+              until: Optional[int], newest_first: bool) -> Tuple[List[Tuple[int, str]], Optional[int]]:
+        """One page of raw (id, entry text) rows, plus the next cursor."""
+        clauses, params = [], []
+        if cursor is not None:
+            clauses.append("id < ?" if newest_first else "id > ?")
+            params.append(cursor)
+        if conversation_id is not None:
+            clauses.append("conversation_id = ?")
+            params.append(str(conversation_id))
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+
+        sql = "SELECT id, entry FROM sends"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY id {'DESC' if newest_first else 'ASC'} LIMIT ?"
+        rows = self._db.connection().execute(sql, (*params, limit + 1)).fetchall()
+
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+
+# Global send log instance
+_send_log = None
+
+
+def get_send_log():
+    """Get or create the send log singleton (SEND_LOG_PATH or WEBAPP_DATA_DIR/sends.db)."""
+    global _send_log
+    if _send_log is None:
+        _send_log = SendLog(
+            data_path("SEND_LOG_PATH", "sends.db"),
+            max_bytes=int(os.getenv("SEND_LOG_MAX_BYTES", str(64 * 1024 * 1024))),
+        )
+    return _send_log
@@ -0,0 +1,122 @@
+"""
+Production Launcher
+Pre-forking gunicorn server with the catalog and CRS client warmed up before fork
+
+Usage:
+    python serve.py                          # WSGI (app:app), threaded workers
+    python serve.py --asgi --workers 4       # ASGI (asgi:app), uvicorn workers
+    kill -HUP <master pid>                   # graceful reload
+
+The catalog indexes and the CRS client are built once in the master and
+shared copy-on-write with every worker. Workers swap in catalog changes on
+their own (see catalog.CatalogManager); SIGHUP additionally rebuilds the
+catalog in the master, starts fresh workers from it and lets the old ones
+finish their in-flight requests (up to GRACEFUL_TIMEOUT) before exiting.
+State that workers must agree on lives in WEBAPP_DATA_DIR: the job queue, the
+send log, the seen listing index and the shared CRS profile and generation
+caches (CRS_SHARED_CACHE_PATH, GENERATION_SHARED_CACHE_PATH).
+"""
+
+import argparse
+import gc
+import logging
+import multiprocessing
+import os
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+from storage import data_dir
+
+logger = logging.getLogger(__name__)
+
+# Long-polls and SSE streams hold a request for up to app.MAX_WAIT_SECONDS;
+# give old workers that long (plus slack) to drain on reload or shutdown
+GRACEFUL_TIMEOUT = 40
+
+
+def _asgi_worker_class() -> str:
+    try:
+        import uvicorn_worker  # noqa: F401
+        return "uvicorn_worker.UvicornWorker"
+    except ImportError:
+        return "uvicorn.workers.UvicornWorker"
+
+
+def _post_fork(server, worker):
+    # Pooled sockets must not be shared with the master or sibling workers
+    from catalog import get_catalog_manager
+    from crs_service import get_crs_client
+    get_crs_client().reset_connections()
+    # The master never starts the watcher thread; each worker watches CATALOG_PATH itself
+    get_catalog_manager().start_watching()
+
+
+class WebappServer(BaseApplication):
+    """gunicorn application that preloads the webapp in the master process."""
+
+    def __init__(self, options, asgi: bool = False):
+        self.options = options
+        self.asgi = asgi
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # Importing app builds the catalog indexes; the CRS client (and the
+        # salt its cache keys use) must exist before fork so workers agree
+        from app import app
+        from crs_service import get_crs_client
+        get_crs_client()
+        if self.asgi:
+            from asgi import app
+        # Keep the warm heap out of the collector so it stays shared after fork
+        gc.freeze()
+        return app
+
+    def reload(self):
+        super().reload()
+        from catalog import reload_catalog
+        try:
+            catalog = reload_catalog()
+            logger.info(f"Catalog reloaded: {len(catalog)} items")
+        except Exception as e:
+            logger.error(f"Catalog reload failed, keeping the current one: {e}")
+        gc.freeze()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run the webapp with pre-forked workers")
+    parser.add_argument("--bind", default=os.getenv("WEBAPP_BIND", "0.0.0.0:5001"))
+    parser.add_argument("--workers", type=int,
+                        default=int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count()))))
+    parser.add_argument("--threads", type=int, default=int(os.getenv("WEBAPP_THREADS", "8")),
+                        help="threads per WSGI worker")
+    parser.add_argument("--asgi", action="store_true", help="serve asgi:app with uvicorn workers")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    # Profiles fetched by one worker are reused by the others
+    os.environ.setdefault("CRS_SHARED_CACHE_PATH", os.path.join(data_dir(), "crs_cache.db"))
+
+    options = {
+        "bind": args.bind,
+        "workers": args.workers,
+        "preload_app": True,
+        "graceful_timeout": GRACEFUL_TIMEOUT,
+        "timeout": GRACEFUL_TIMEOUT + 20,
+        "post_fork": _post_fork,
+    }
+    if args.asgi:
+        options["worker_class"] = _asgi_worker_class()
+    else:
+        options["worker_class"] = "gthread"
+        options["threads"] = args.threads
+    WebappServer(options, asgi=args.asgi).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+Local Storage Helpers
+Data directory defaults and per-thread WAL-mode SQLite connections for the
+stores that worker processes share
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Optional, Sequence
+
+
+def data_dir() -> str:
+    """WEBAPP_DATA_DIR, or the data directory next to the webapp modules."""
+    return os.getenv("WEBAPP_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+
+
+def data_path(env_var: str, filename: str) -> str:
+    """Path from env_var if set, else filename inside data_dir()."""
+    return os.getenv(env_var) or os.path.join(data_dir(), filename)
+
+
+class SQLiteConnections:
+    """
+    One connection per thread to a SQLite file, reopened after fork.
+
+    Connections use WAL mode with synchronous=NORMAL, so readers in any
+    process never block the writer, and autocommit (isolation_level=None):
+    callers that need a transaction issue BEGIN themselves.
+    """
+
+    def __init__(self, path: str, schema: Optional[str] = None, pragmas: Sequence[str] = ()):
+        """
+        Args:
+            path: Database file; its directory is created if missing
+            schema: SQL script run once at startup (CREATE ... IF NOT EXISTS)
+            pragmas: Statements run before the schema, on a connection not yet
+                in WAL mode (e.g. auto_vacuum, which must precede both)
+        """
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if schema or pragmas:
+            bootstrap = sqlite3.connect(path, timeout=10)
+            try:
+                for pragma in pragmas:
+                    bootstrap.execute(pragma)
+                if schema:
+                    bootstrap.executescript(schema)
+            finally:
+                bootstrap.close()
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use in each process."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
@@ -0,0 +1,26 @@
+"""
+Test fixtures shared by the webapp test modules.
+
+Every test session gets its own WEBAPP_DATA_DIR, so the SQLite-backed
+singletons never touch the real data directory.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The webapp modules are flat files one directory up
+WEBAPP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if WEBAPP_DIR not in sys.path:
+    sys.path.insert(0, WEBAPP_DIR)
+
+os.environ["WEBAPP_DATA_DIR"] = tempfile.mkdtemp(prefix="webapp-tests-")
+os.environ.setdefault("CATALOG_WATCH_INTERVAL", "0")
+
+
+@pytest.fixture(scope="session")
+def default_catalog():
+    from catalog import DEFAULT_CATALOG, SustainableCatalog
+    return SustainableCatalog.from_data(DEFAULT_CATALOG)
@@ -0,0 +1,86 @@
+"""Admission control: rate limits, concurrency shedding and cache hits."""
+
+import threading
+
+import pytest
+
+import admission
+from admission import ConcurrencyLimiter, Overloaded, TokenBucket, admitted
+from crs_cache import ProfileCache
+from crs_service import CRSClient
+
+
+def test_token_bucket_burst_then_wait():
+    bucket = TokenBucket(rate=1, burst=2)
+    assert bucket.take() == 0
+    assert bucket.take() == 0
+    assert 0 < bucket.take() <= 1
+    assert TokenBucket(rate=0, burst=0).take() == 0
+
+
+def test_limiter_sheds_after_queue_timeout():
+    limiter = ConcurrencyLimiter(limit=1, queue_timeout=0.05)
+    entered, release = threading.Event(), threading.Event()
+
+    def hold():
+        with limiter.slot("/test"):
+            entered.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    entered.wait(5)
+    try:
+        with pytest.raises(Overloaded) as excinfo:
+            with limiter.slot("/test"):
+                pass
+        assert excinfo.value.status == 503
+        assert excinfo.value.retry_after == 1
+        assert limiter.stats()["shed"] == 1
+    finally:
+        release.set()
+        holder.join()
+
+    with limiter.slot("/test"):
+        assert limiter.active == 1
+    assert limiter.active == 0
+
+
+@pytest.fixture
+def strict_admission(monkeypatch):
+    # One request per route, then 429s; a fresh limiter for this test
+    monkeypatch.setenv("CRS_RATE_LIMIT", "0.001")
+    monkeypatch.setenv("CRS_RATE_BURST", "1")
+    monkeypatch.setattr(admission, "_buckets", {})
+    monkeypatch.setattr(admission, "_crs_limiter", ConcurrencyLimiter(4, 0.5))
+
+
+def test_rate_limit_raises_429(strict_admission):
+    with admitted("/limited"):
+        pass
+    with pytest.raises(Overloaded) as excinfo:
+        with admitted("/limited"):
+            pass
+    assert excinfo.value.status == 429
+    # Each route has its own bucket
+    with admitted("/other"):
+        pass
+
+
+def test_cache_hits_are_never_shed(strict_admission):
+    crs = CRSClient(api_key="", cache=ProfileCache())
+    first = crs.lookup_profile("Jane Doe", "01/02/1990", route="/lookup")
+    assert crs.lookup_profile("Jane Doe", "01/02/1990", route="/lookup") == first
+
+    with pytest.raises(Overloaded):
+        crs.lookup_profile("John Roe", "03/04/1985", route="/lookup")
+
+
+def test_bulk_lookup_sheds_only_misses(strict_admission):
+    crs = CRSClient(api_key="", cache=ProfileCache())
+    crs.lookup_many([{"email": "a@example.com"}], route="/bulk")
+
+    results = crs.lookup_many([{"email": "a@example.com"}, {"email": "b@example.com"}], route="/bulk")
+    assert results[0]["status"] == "found"
+    assert results[1]["status"] == "error"
+    assert results[1]["retry_after"] >= 1
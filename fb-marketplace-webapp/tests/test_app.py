@@ -0,0 +1,43 @@
+"""Conditional requests for alternatives."""
+
+import pytest
+
+from app import COLUMNAR_MIMETYPE, app
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def _lookup(client, headers=None, **body):
+    return client.post("/api/find-sustainable-products", json={"productName": "office chair", **body},
+                       headers=headers or {})
+
+
+def test_etag_revalidation(client):
+    first = _lookup(client)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    again = _lookup(client, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.headers["ETag"] == etag
+    # Weak validators from compressed responses match too
+    assert _lookup(client, headers={"If-None-Match": "W/" + etag}).status_code == 304
+
+
+def test_etag_tracks_the_response(client):
+    etag = _lookup(client).headers["ETag"]
+    assert _lookup(client, headers={"If-None-Match": '"stale"'}).status_code == 200
+
+    other = _lookup(client, headers={"If-None-Match": etag}, currentPrice=50,
+                    userProfile={"price_range": {"min": 0, "max": 10}})
+    assert other.status_code == 200
+    assert other.headers["ETag"] != etag
+
+    columnar = _lookup(client, headers={"If-None-Match": etag, "Accept": COLUMNAR_MIMETYPE})
+    assert columnar.status_code == 200
+    assert columnar.mimetype == COLUMNAR_MIMETYPE
+    assert "Accept" in columnar.headers["Vary"]
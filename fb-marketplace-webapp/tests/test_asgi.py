@@ -0,0 +1,70 @@
+"""Async serving mode (asgi.py): event-loop routes and the mounted Flask app."""
+
+import pytest
+from starlette.testclient import TestClient
+
+from app import app as flask_app
+from asgi import app
+
+JANE = {"name": "Jane Doe", "dob": "01/02/1990"}
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def flask_client():
+    return flask_app.test_client()
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/api/lookup-user", JANE),
+    ("/api/lookup-user-by-email", {"email": "a@example.com"}),
+    ("/api/lookup-users", {"identities": [JANE, {"email": "a@example.com"}, {"name": "No DOB"}]}),
+])
+def test_async_routes_match_flask(client, flask_client, path, body):
+    response = client.post(path, json=body)
+    assert response.status_code == 200
+    assert response.headers["access-control-allow-origin"] == "*"
+    assert response.json() == flask_client.post(path, json=body).get_json()
+
+
+@pytest.mark.parametrize("path", ["/api/lookup-user", "/api/lookup-user-by-email", "/api/lookup-users"])
+def test_async_routes_reject_missing_fields(client, path):
+    for body in ({}, {"name": "Jane Doe"}, {"identities": []}):
+        response = client.post(path, json=body)
+        assert response.status_code == 400
+        assert response.json()["success"] is False
+    assert client.post(path, content=b"not json").status_code == 400
+
+
+def test_long_poll_on_the_event_loop(client):
+    while client.post("/api/consume-message?wait=0").status_code == 200:
+        pass
+    assert client.post("/api/consume-message?wait=0.1").status_code == 204
+
+    # Stored through the mounted Flask app, taken by the async route
+    job = {"message": "Still available?", "searchKeyword": "bike"}
+    stored = client.post("/api/store-message", json=job).json()
+    response = client.post("/api/consume-message?wait=1")
+    assert response.status_code == 200
+    assert response.json()["id"] == stored["id"]
+    assert response.json()["payload"]["searchKeyword"] == "bike"
+
+
+def test_flask_routes_are_mounted(client):
+    response = client.get("/api/queue-stats")
+    assert response.status_code == 200
+    assert set(response.json()) == {"ready", "leased", "dead"}
+    # add_cors already set it; the middleware doesn't add a second one
+    assert response.headers.get_list("access-control-allow-origin") == ["*"]
+    assert client.get("/no/such/route").status_code == 404
+
+
+def test_async_routes_are_in_metrics(client):
+    client.post("/api/lookup-user", json=JANE)
+    metrics = client.get("/metrics").text
+    assert 'webapp_request_duration_seconds_count{route="/api/lookup-user",method="POST",status="200"}' in metrics
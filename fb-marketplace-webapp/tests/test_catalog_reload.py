@@ -0,0 +1,164 @@
+"""Hot catalog reloads and admin item changes (CatalogManager)."""
+
+import json
+import threading
+import time
+
+import pytest
+
+import catalog
+from app import app
+from catalog import CatalogManager
+from catalog_store import write_catalog
+
+DATA = {
+    "lamp": [
+        {"name": "Vintage Lamp", "price": 40, "co2_savings": 12, "reason": "Secondhand"},
+        {"name": "LED Desk Lamp", "price": 25, "co2_savings": 8, "reason": "Efficient"},
+    ],
+    "rug": [{"name": "Wool Rug", "price": 120, "co2_savings": 30, "reason": "Natural fibre"}],
+}
+
+
+def _names(manager, title):
+    return [item["name"] for item in manager.current.lookup(title)]
+
+
+@pytest.fixture(params=["catalog.json", "catalog.fbcat"])
+def path(request, tmp_path):
+    path = str(tmp_path / request.param)
+    if path.endswith(".json"):
+        with open(path, "w") as fh:
+            json.dump(DATA, fh)
+    else:
+        write_catalog(DATA, path)
+    return path
+
+
+def test_apply_changes_swaps_and_writes_back(path):
+    manager = CatalogManager(path, watch_interval=0)
+    before = manager.current
+    counts = manager.apply_changes(
+        upserts=[{"category": "lamp", "item": {"name": "Vintage Lamp", "price": 35, "co2_savings": 12,
+                                                "reason": "Secondhand"}},
+                 {"category": "Chair", "item": {"name": "Oak Chair", "price": 60, "co2_savings": 20,
+                                                 "reason": "Reclaimed wood"}}],
+        deletes=[{"category": "rug", "name": "Wool Rug"}])
+    assert counts == {"added": 1, "updated": 1, "deleted": 1}
+
+    assert manager.current is not before and manager.current.version > before.version
+    assert manager.current.categories == ["lamp", "chair"]
+    assert _names(manager, "oak chair") == ["Oak Chair"]
+    assert next(iter(manager.current.lookup("vintage lamp")))["price"] == 35
+    # The old catalog is untouched for requests still using it
+    assert "rug" in before.categories and len(before) == 3
+
+    # Another worker reading the same file sees the change
+    assert CatalogManager(path, watch_interval=0).current.to_data() == manager.current.to_data()
+
+
+def test_malformed_changes_apply_nothing(path):
+    manager = CatalogManager(path, watch_interval=0)
+    before = manager.current
+    with pytest.raises(ValueError):
+        manager.apply_changes(upserts=[{"category": "lamp", "item": {"name": "New Lamp"}},
+                                       {"category": "", "item": {"name": "Nameless"}}])
+    assert manager.current is before
+    assert CatalogManager(path, watch_interval=0).current.to_data() == before.to_data()
+
+
+def test_reload_only_when_changed_and_keeps_a_broken_file_out(tmp_path):
+    path = str(tmp_path / "catalog.json")
+    with open(path, "w") as fh:
+        json.dump(DATA, fh)
+    manager = CatalogManager(path, watch_interval=0)
+    loaded = manager.current
+    assert manager.reload(if_changed=True) is loaded
+
+    with open(path, "w") as fh:
+        fh.write("{not json")
+    with pytest.raises(ValueError):
+        manager.reload(if_changed=True)
+    assert manager.current is loaded
+    # Not retried until the file changes again
+    assert manager.reload(if_changed=True) is loaded
+
+    with open(path, "w") as fh:
+        json.dump({"rug": DATA["rug"]}, fh)
+    assert manager.reload(if_changed=True).categories == ["rug"]
+
+
+def test_watcher_picks_up_file_changes(tmp_path):
+    path = str(tmp_path / "catalog.json")
+    with open(path, "w") as fh:
+        json.dump(DATA, fh)
+    manager = CatalogManager(path, watch_interval=0.02)
+    manager.start_watching()
+    try:
+        version = manager.current.version
+        time.sleep(0.05)
+        with open(path, "w") as fh:
+            json.dump({"rug": DATA["rug"]}, fh)
+        deadline = time.monotonic() + 5
+        while manager.current.version == version and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert manager.current.categories == ["rug"]
+    finally:
+        manager._watch_pid = None  # stops the watcher loop
+
+
+def test_readers_never_see_a_partial_catalog():
+    manager = CatalogManager(None, watch_interval=0)
+    sizes = {len(manager.current)}
+    item = {"category": "lamp", "item": {"name": "Paper Lamp", "price": 15, "co2_savings": 3, "reason": "Used"}}
+    stop = threading.Event()
+    seen = []
+
+    def read():
+        while not stop.is_set():
+            current = manager.current
+            # One snapshot: its size and its lookups agree
+            seen.append((len(current), len(current.to_data().get("lamp", []))))
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        for _ in range(10):
+            manager.apply_changes(upserts=[item])
+            manager.apply_changes(deletes=[{"category": "lamp", "name": "Paper Lamp"}])
+    finally:
+        stop.set()
+        reader.join()
+    base = sizes.pop()
+    assert {size for size, _ in seen} <= {base, base + 1}
+    assert all((lamps == 1) == (size == base + 1) for size, lamps in seen)
+
+
+def test_admin_routes(monkeypatch, tmp_path):
+    path = str(tmp_path / "catalog.json")
+    with open(path, "w") as fh:
+        json.dump(DATA, fh)
+    monkeypatch.setattr(catalog, "_manager", CatalogManager(path, watch_interval=0))
+    client = app.test_client()
+    change = {"upsert": [{"category": "rug", "item": {"name": "Jute Rug", "price": 80}}]}
+
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert client.post("/api/admin/catalog/items", json=change).status_code == 403
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    assert client.post("/api/admin/catalog/items", json=change,
+                       headers={"X-Admin-Token": "wrong"}).status_code == 401
+
+    headers = {"X-Admin-Token": "secret"}
+    response = client.post("/api/admin/catalog/items", json=change, headers=headers).get_json()
+    assert response["success"] and response["added"] == 1 and response["items"] == 4
+    assert client.post("/api/admin/catalog/items", json={}, headers=headers).status_code == 400
+    assert client.post("/api/admin/catalog/items", json={"upsert": [{"category": "rug"}]},
+                       headers=headers).status_code == 400
+
+    found = client.post("/api/find-sustainable-products", json={"productName": "jute rug"}).get_json()
+    assert "Jute Rug" in [item["name"] for item in found["alternatives"]]
+
+    with open(path, "w") as fh:
+        json.dump(DATA, fh)
+    reloaded = client.post("/api/admin/catalog/reload", headers=headers).get_json()
+    assert reloaded["success"] and reloaded["items"] == 3
@@ -0,0 +1,97 @@
+"""Binary catalog format: round trip, older formats and parity with the in-memory store."""
+
+import math
+
+import pytest
+
+import catalog_store
+from catalog import InMemoryStore, SustainableCatalog
+from catalog_store import CatalogFile, write_catalog
+
+DATA = {
+    "desk": [
+        {"name": "Reclaimed Oak Desk", "price": 180, "co2_savings": "45 kg CO₂", "reason": "Reclaimed wood",
+         "lat": 40.7, "lon": -74.0, "condition": "Good", "images": ["a.jpg", "b.jpg"]},
+        {"name": "Bamboo Desk", "price": "Varies", "co2_savings": 20.0, "reason": "Fast-growing",
+         "url": "https://example.com/desk", "source": ""},
+    ],
+    "lamp": [
+        {"name": "Refurbished Lamp", "price": 25.5, "co2_savings": True, "reason": "Refurbished",
+         "seller": {"id": 7}},
+        {"name": "Desk Lamp", "reason": "Secondhand"},
+    ],
+}
+
+
+def _downgrade(path, version):
+    """Rewrite a current-format file as an older format: a shorter header and no newer sections."""
+    with open(path, "rb") as fh:
+        buf = fh.read()
+    _, _, n_items, n_categories, reserved, *offsets = catalog_store._HEADER.unpack_from(buf, 0)
+    sections = dict(zip(catalog_store.SECTIONS, offsets))
+    kept = catalog_store._VERSION_SECTIONS[version]
+    header = catalog_store._HEADERS[version]
+    shift = catalog_store._HEADER.size - header.size
+    first_dropped = catalog_store.SECTIONS[len(kept)]
+    with open(path, "wb") as fh:
+        fh.write(header.pack(catalog_store.MAGIC, version, n_items, n_categories, reserved,
+                             *(sections[name] - shift for name in kept)))
+        fh.write(buf[catalog_store._HEADER.size:sections[first_dropped]])
+
+
+@pytest.fixture
+def catalog_path(tmp_path):
+    path = str(tmp_path / "catalog.fbcat")
+    assert write_catalog(DATA, path) == 4
+    return path
+
+
+def test_round_trip(catalog_path):
+    store = CatalogFile(catalog_path)
+    assert store.categories == ["desk", "lamp"]
+    assert store.category_range(1) == (2, 4)
+    assert store.record(0) == {"name": "Reclaimed Oak Desk", "price": 180, "co2_savings": "45 kg CO₂",
+                               "reason": "Reclaimed wood", "lat": 40.7, "lon": -74.0, "condition": "Good",
+                               "images": ["a.jpg", "b.jpg"]}
+    assert store.record(1) == {"name": "Bamboo Desk", "price": "Varies", "co2_savings": 20,
+                               "reason": "Fast-growing", "url": "https://example.com/desk"}
+    assert store.record(3) == {"name": "Desk Lamp", "price": None, "co2_savings": None, "reason": "Secondhand"}
+    assert store.prices[2] == 25.5
+    assert math.isnan(store.prices[1])
+
+
+def test_matches_in_memory_store(catalog_path):
+    in_memory, mapped = InMemoryStore(DATA), CatalogFile(catalog_path)
+    assert [in_memory.record(i) for i in range(len(in_memory))] == [mapped.record(i) for i in range(len(mapped))]
+    assert SustainableCatalog.from_data(DATA).to_data() == SustainableCatalog.from_file(catalog_path).to_data()
+
+
+def test_reads_format_2(catalog_path):
+    _downgrade(catalog_path, 2)
+    store = CatalogFile(catalog_path)
+    # Format 2 kept locations but not the other fields
+    assert store.record(0) == {"name": "Reclaimed Oak Desk", "price": 180, "co2_savings": "45 kg CO₂",
+                               "reason": "Reclaimed wood", "lat": 40.7, "lon": -74.0}
+
+
+def test_reads_format_1(catalog_path):
+    _downgrade(catalog_path, 1)
+
+    store = CatalogFile(catalog_path)
+    assert len(store) == 4
+    # Format 1 predates item locations
+    assert all(math.isnan(lat) for lat in store.lat)
+    assert store.record(0) == {"name": "Reclaimed Oak Desk", "price": 180, "co2_savings": "45 kg CO₂",
+                               "reason": "Reclaimed wood"}
+    assert store.record(2)["name"] == "Refurbished Lamp"
+
+    catalog = SustainableCatalog.from_file(catalog_path)
+    assert not catalog.has_locations
+    assert [item["name"] for item in catalog.lookup("lamp")] == ["Refurbished Lamp", "Desk Lamp"]
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "catalog.fbcat"
+    path.write_bytes(b"NOTACAT!" + bytes(200))
+    with pytest.raises(ValueError):
+        CatalogFile(str(path))
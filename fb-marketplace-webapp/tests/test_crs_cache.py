@@ -0,0 +1,62 @@
+"""Profile cache expiry, negative caching and LRU eviction."""
+
+import time
+
+from crs_cache import ProfileCache, SharedProfileStore
+
+
+def test_key_normalizes_identity():
+    cache = ProfileCache()
+    assert cache.key("name_dob", "Jane  Doe", "01/02/1990") == cache.key("name_dob", "jane doe", "01/02/1990")
+    assert cache.key("email", "a@b.c") != cache.key("name_dob", "a@b.c")
+
+
+def test_lru_eviction():
+    cache = ProfileCache(max_size=2)
+    cache.set("a", {"n": 1})
+    cache.set("b", {"n": 2})
+    # Touching "a" makes "b" the least recently used
+    assert cache.get("a") == (True, {"n": 1})
+    cache.set("c", {"n": 3})
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a")[0] and cache.get("c")[0]
+    assert cache.evictions == 1
+
+
+def test_ttl_expiry_and_stale_grace(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = ProfileCache(ttl=10, stale_grace=20)
+    cache.set("a", {"n": 1})
+
+    now[0] += 11
+    assert cache.get("a") == (False, None)
+    assert cache.get("a", allow_stale=True) == (True, {"n": 1})
+
+    now[0] += 20
+    assert cache.get("a", allow_stale=True) == (False, None)
+    assert cache.expirations == 1
+
+
+def test_negative_results_use_negative_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = ProfileCache(ttl=100, negative_ttl=5)
+    cache.set("missing", None)
+    assert cache.get("missing") == (True, None)
+
+    now[0] += 6
+    assert cache.get("missing") == (False, None)
+
+
+def test_shared_store_fills_other_processes(tmp_path):
+    path = str(tmp_path / "profiles.db")
+    salt = b"shared-salt"
+    writer = ProfileCache(salt=salt, shared=SharedProfileStore(path))
+    reader = ProfileCache(salt=salt, shared=SharedProfileStore(path))
+
+    key = writer.key("email", "a@b.c")
+    writer.set(key, {"n": 1})
+    assert reader.get(reader.key("email", "a@b.c")) == (True, {"n": 1})
+    assert reader.shared_hits == 1
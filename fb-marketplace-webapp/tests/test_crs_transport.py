@@ -0,0 +1,133 @@
+"""CRS HTTP transport: retries, status handling and request coalescing."""
+
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+import fake_crs_server
+from crs_cache import ProfileCache
+from crs_service import CRSClient
+from crs_transport import AsyncCRSTransport, AsyncSingleFlight, CRSError, CRSTransport, RetryPolicy, SingleFlight
+from fake_crs_server import FakeCRSServer
+
+IDENTITY = {"name": "Jane Doe", "dob": "01/02/1990"}
+NO_WAIT = RetryPolicy(max_attempts=3, base_delay=0)
+
+
+@pytest.fixture
+def server():
+    with FakeCRSServer() as fake:
+        yield fake
+
+
+def _fail_first(monkeypatch, failures):
+    """Have the fake answer 503 to its first `failures` calls."""
+    draws = iter([0.0] * failures)
+    monkeypatch.setattr(fake_crs_server.random, "random", lambda: next(draws, 1.0))
+
+
+def test_retries_retryable_statuses(server, monkeypatch):
+    server.failure_rate = 0.5
+    _fail_first(monkeypatch, 2)
+    transport = CRSTransport(server.url, "test", retry=NO_WAIT)
+    assert transport.request("POST", "/lookup", json=IDENTITY)["data_source"] == "fake_crs"
+    assert server.calls["lookup"] == 3
+
+
+def test_gives_up_after_max_attempts(server):
+    server.failure_rate = 1.0
+    transport = CRSTransport(server.url, "test", retry=NO_WAIT)
+    with pytest.raises(CRSError, match="after 3 attempts: status 503"):
+        transport.request("POST", "/lookup", json=IDENTITY)
+    assert server.calls["lookup"] == 3
+
+
+def test_not_found_and_client_errors_are_not_retried(server):
+    server.unknown = {"nobody"}
+    assert CRSTransport(server.url, "test", retry=NO_WAIT).request("GET", "/user/nobody") is None
+    with pytest.raises(CRSError, match="returned 401"):
+        CRSTransport(server.url, "wrong key", retry=NO_WAIT).request("POST", "/lookup", json=IDENTITY)
+    assert server.calls == {"user": 1, "lookup": 1}
+
+
+def test_connection_errors_are_retried():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    transport = CRSTransport(f"http://127.0.0.1:{port}", "test", timeout=1, retry=RetryPolicy(2, base_delay=0))
+    with pytest.raises(CRSError, match="after 2 attempts"):
+        transport.request("GET", "/user/a@example.com")
+
+
+def test_concurrent_lookups_share_one_call(server):
+    server.latency = 0.2
+    client = CRSClient(api_key="test", api_base=server.url, cache=ProfileCache())
+    start = threading.Barrier(8)
+    results = []
+
+    def lookup():
+        start.wait()
+        results.append(client.lookup_profile(IDENTITY["name"], IDENTITY["dob"]))
+
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert server.calls["lookup"] == 1
+    assert len(results) == 8 and all(result == results[0] for result in results)
+    assert results[0]["data_source"] == "fake_crs"
+
+
+def test_single_flight_shares_failures():
+    flight = SingleFlight()
+    entered, release = threading.Event(), threading.Event()
+    errors = []
+
+    def leader():
+        entered.set()
+        release.wait(5)
+        raise CRSError("bureau down")
+
+    def call(fn):
+        try:
+            flight.do("key", fn)
+        except CRSError as e:
+            errors.append(e)
+
+    first = threading.Thread(target=call, args=(leader,))
+    first.start()
+    entered.wait(5)
+    follower = threading.Thread(target=call, args=(lambda: pytest.fail("follower ran its own call"),))
+    follower.start()
+    time.sleep(0.1)  # let the follower reach do() while the leader is still running
+    release.set()
+    first.join()
+    follower.join()
+    assert len(errors) == 2 and errors[0] is errors[1]
+    # The key is free again once the call finished
+    assert flight.do("key", lambda: "next") == "next"
+
+
+def test_async_transport_and_single_flight(server, monkeypatch):
+    server.latency = 0.1
+    server.failure_rate = 0.5
+    _fail_first(monkeypatch, 1)
+
+    async def run():
+        transport = AsyncCRSTransport(server.url, "test", retry=NO_WAIT)
+        flight = AsyncSingleFlight()
+        try:
+            return await asyncio.gather(*(
+                flight.do("jane", lambda: transport.request("POST", "/lookup", json=IDENTITY)) for _ in range(5)))
+        finally:
+            await transport.aclose()
+
+    results = asyncio.run(run())
+    assert all(result == results[0] for result in results)
+    assert results[0]["data_source"] == "fake_crs"
+    # One coalesced call, retried once after the 503
+    assert server.calls["lookup"] == 2
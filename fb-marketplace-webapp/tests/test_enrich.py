@@ -0,0 +1,96 @@
+"""Offline enrichment pipeline (enrich.py)."""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+import enrich
+from app import app
+from conftest import WEBAPP_DIR
+from ranking import TIER_PRICE_RANGES
+
+LISTINGS = [
+    {"productName": "Dell laptop", "price": 300},
+    {"title": "Office chiar, barely used"},
+    {"name": "Dell laptop", "price": 250},
+    {"productName": ""},
+    {"productName": "iPhone 11", "userProfile": {"score_tier": "poor", "price_range": {"min": 0, "max": 300}}},
+    {"productName": "Moving sale", "description": "Solid wood dining table"},
+    {"productName": "Phone", "userProfile": {"score_tier": "good", "price_range": "cheap"}},
+]
+
+
+def _jsonl(records):
+    return "".join(json.dumps(record) + "\n" for record in records)
+
+
+def _enrich(tmp_path, content, *args, suffix="jsonl"):
+    source, target = tmp_path / f"in.{suffix}", tmp_path / "out.jsonl"
+    source.write_text(content)
+    assert enrich.main([str(source), str(target), *args]) == 0
+    return [json.loads(line) for line in target.read_text().splitlines()]
+
+
+def _alternatives(body):
+    return app.test_client().post("/api/find-sustainable-products", json=body).get_json()["alternatives"]
+
+
+@pytest.mark.parametrize("workers", ["0", "2"])
+def test_enriches_in_input_order(tmp_path, workers):
+    output = _enrich(tmp_path, _jsonl(LISTINGS) + "\nnot json\n[1, 2]\n", "--workers", workers,
+                     "--chunk-size", "2")
+    # Blank and undecodable lines are skipped
+    assert len(output) == len(LISTINGS)
+    for listing, record in zip(LISTINGS, output):
+        assert {key: record[key] for key in listing} == listing
+
+    assert output[3]["error"] == "productName required"
+    assert "price_range" in output[6]["error"]
+    assert output[0]["alternatives"] == output[2]["alternatives"] == _alternatives({"productName": "Dell laptop"})
+    assert output[1]["alternatives"] == _alternatives({"productName": "Office chiar, barely used"})
+    assert output[4]["personalized"] is True
+    assert output[4]["alternatives"] == _alternatives({"productName": "iPhone 11",
+                                                       "userProfile": LISTINGS[4]["userProfile"]})
+    assert output[5]["alternatives"] == _alternatives({"productName": "Moving sale",
+                                                       "description": "Solid wood dining table"})
+
+
+def test_worker_counts_agree(tmp_path):
+    listings = [{"productName": name} for name in ("laptop", "chair", "jacket", "table", "lamp")] * 20
+    content = _jsonl(listings)
+    assert _enrich(tmp_path, content, "--workers", "3", "--chunk-size", "7") == \
+        _enrich(tmp_path, content, "--workers", "0", "--chunk-size", "1000")
+
+
+def test_tier_profile_and_csv_input(tmp_path):
+    content = "title,description,price\nGaming laptop,,800\nDining tabel,oak,120\n"
+    output = _enrich(tmp_path, content, "--workers", "0", "--tier", "fair", suffix="csv")
+    profile = {"score_tier": "fair", "price_range": dict(TIER_PRICE_RANGES["fair"])}
+    assert [record["title"] for record in output] == ["Gaming laptop", "Dining tabel"]
+    assert all(record["personalized"] for record in output)
+    assert output[0]["alternatives"] == _alternatives({"productName": "Gaming laptop", "userProfile": profile})
+    assert output[1]["alternatives"] == _alternatives({"productName": "Dining tabel", "description": "oak",
+                                                       "userProfile": profile})
+
+
+def test_bad_profile_argument(tmp_path, capsys):
+    (tmp_path / "in.jsonl").write_text("")
+    with pytest.raises(SystemExit):
+        enrich.main([str(tmp_path / "in.jsonl"), "-", "--profile", "[1]"])
+    assert "--profile must be a JSON object" in capsys.readouterr().err
+
+
+def test_workers_load_the_given_catalog(tmp_path):
+    catalog = {"kayak": [{"name": "Used Touring Kayak", "price": 400, "co2_savings": 60, "reason": "Secondhand"}]}
+    (tmp_path / "catalog.json").write_text(json.dumps(catalog))
+    listings = _jsonl([{"productName": "sea kayak"}, {"productName": "laptop"}] * 3)
+    result = subprocess.run(
+        [sys.executable, "enrich.py", "-", "-", "--catalog", str(tmp_path / "catalog.json"),
+         "--workers", "2", "--chunk-size", "1"],
+        input=listings, capture_output=True, text=True, cwd=WEBAPP_DIR, timeout=60, check=True)
+    output = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [[item["name"] for item in record["alternatives"]] for record in output[:2]] == \
+        [["Used Touring Kayak"], ["Refurbished/Pre-owned Option", "Rental Service"]]
+    assert "Enriched 6 listings" in result.stderr
@@ -0,0 +1,175 @@
+"""Message generation proxy."""
+
+import logging
+import threading
+
+import pytest
+import requests
+
+import generation
+from app import app
+from generation import (CompletionCache, GeminiBackend, GenerationBackend, GenerationError, GenerationProxy,
+                        StubBackend, get_generation_proxy)
+
+PROMPT = "Write a short message.\nTitle: Oak Dining Table"
+
+
+class FlakyBackend(GenerationBackend):
+    """Fails the first `failures` calls, then echoes the prompt."""
+
+    name = "flaky"
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    def _generate(self, prompt):
+        self.calls.append(prompt)
+        if len(self.calls) <= self.failures:
+            raise GenerationError("backend down")
+        return prompt.upper()
+
+
+class FakeSession:
+    def __init__(self, status, body):
+        self.status, self.body = status, body
+
+    def post(self, url, json, timeout):
+        response = requests.Response()
+        response.status_code = self.status
+        response._content = self.body
+        return response
+
+
+@pytest.fixture
+def unconfigured(monkeypatch):
+    """Fresh get_generation_proxy state, restored after the test."""
+    monkeypatch.setattr(generation, "_generation_proxy", None)
+    monkeypatch.setattr(generation, "_config_error", None)
+    for name in ("GENERATION_BACKEND", "GEMINI_API_KEY", "GENERATION_SHARED_CACHE_PATH"):
+        monkeypatch.delenv(name, raising=False)
+
+
+def test_backends_implement_generate():
+    with pytest.raises(TypeError):
+        GenerationBackend()
+    # generate_batch defaults to one _generate call per prompt
+    assert FlakyBackend().generate_batch(["a", "b"]) == ["A", "B"]
+
+
+@pytest.mark.parametrize("status, body", [
+    (200, b"<html>Service Unavailable</html>"),
+    (200, b'{"candidates": []}'),
+    (200, b'["not", "an", "object"]'),
+    (400, b'{"error": "bad request"}'),
+])
+def test_gemini_bad_responses_raise_generation_error(status, body):
+    backend = GeminiBackend("key")
+    backend.session = FakeSession(status, body)
+    with pytest.raises(GenerationError):
+        backend.generate_batch([PROMPT])
+
+
+def test_gemini_reads_the_completion():
+    backend = GeminiBackend("key")
+    backend.session = FakeSession(200, b'{"candidates": [{"content": {"parts": [{"text": " Hi there \\n"}]}}]}')
+    assert backend.generate_batch([PROMPT]) == ["Hi there"]
+
+
+def test_cache_is_keyed_on_the_exact_prompt():
+    backend = FlakyBackend()
+    proxy = GenerationProxy(backend, max_wait=0)
+    assert proxy.generate("Hello") == ("HELLO", False)
+    assert proxy.generate("Hello") == ("HELLO", True)
+    # Case and whitespace can change the completion, so they are separate entries
+    assert proxy.generate("hello") == ("HELLO", False)
+    assert proxy.generate("Hello ") == ("HELLO ", False)
+    assert backend.calls == ["Hello", "hello", "Hello "]
+
+
+def test_failures_are_not_cached():
+    backend = FlakyBackend(failures=1)
+    proxy = GenerationProxy(backend, max_wait=0)
+    with pytest.raises(GenerationError):
+        proxy.generate(PROMPT)
+    assert proxy.generate(PROMPT) == (PROMPT.upper(), False)
+
+
+def test_completion_cache_evicts_and_expires(monkeypatch):
+    cache = CompletionCache(max_size=2, ttl=10)
+    for prompt in ("a", "b", "c"):
+        cache.set(cache.key("stub", "", prompt), prompt)
+    assert cache.get(cache.key("stub", "", "a")) is None
+    assert cache.get(cache.key("stub", "", "c")) == "c"
+    assert cache.get(cache.key("other", "", "c")) is None
+
+    now = generation.time.monotonic()
+    monkeypatch.setattr(generation.time, "monotonic", lambda: now + 11)
+    assert cache.get(cache.key("stub", "", "c")) is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_completion_cache_is_shared_between_processes(tmp_path):
+    store = generation.SharedProfileStore(str(tmp_path / "completions.db"))
+    first, second = CompletionCache(shared=store), CompletionCache(shared=store)
+    key = first.key("stub", "", PROMPT)
+    first.set(key, "text")
+    assert second.get(key) == "text"
+    assert second.stats()["shared_hits"] == 1
+
+
+def test_concurrent_prompts_are_coalesced_and_batched():
+    backend = StubBackend(latency=0.05)
+    proxy = GenerationProxy(backend, max_wait=0.02)
+    prompts = [PROMPT] * 4 + [f"Title: Lamp {i}" for i in range(4)]
+    results = [None] * len(prompts)
+    start = threading.Barrier(len(prompts))
+
+    def call(i):
+        start.wait()
+        results[i] = proxy.generate(prompts[i])
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(prompts))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    sent = [prompt for batch in backend.batches for prompt in batch]
+    assert sorted(sent) == sorted(set(prompts))
+    assert len(backend.batches) < len(sent)
+    assert results[0][0] == "Hi! Is the Oak Dining Table still available? I'm very interested."
+    assert len({text for text, _ in results[:4]}) == 1
+
+
+@pytest.mark.parametrize("env", [{"GENERATION_BACKEND": "nonesuch"}, {"GENERATION_BACKEND": "gemini"},
+                                 {"GENERATION_BACKEND": "stub", "GENERATION_CACHE_SIZE": "lots"}])
+def test_bad_configuration_disables_the_proxy(unconfigured, monkeypatch, caplog, env):
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    with caplog.at_level(logging.ERROR, logger="generation"):
+        assert get_generation_proxy() is None
+        assert get_generation_proxy() is None
+    assert len(caplog.records) == 1
+
+    client = app.test_client()
+    assert client.post("/api/generate", json={"prompt": PROMPT}).status_code == 503
+    assert client.get("/api/generation-stats").get_json() == {"configured": False}
+
+
+def test_generate_route(unconfigured, monkeypatch):
+    monkeypatch.setenv("GENERATION_BACKEND", "stub")
+    client = app.test_client()
+    first = client.post("/api/generate", json={"prompt": PROMPT}).get_json()
+    again = client.post("/api/generate", json={"prompt": PROMPT}).get_json()
+    assert first["success"] and not first["cached"]
+    assert again == {**first, "cached": True}
+    assert client.post("/api/generate", json={}).status_code == 400
+    assert client.get("/api/generation-stats").get_json()["cache"]["hits"] == 1
+
+
+def test_backend_failure_is_a_502(unconfigured, monkeypatch):
+    monkeypatch.setattr(generation, "_generation_proxy", GenerationProxy(FlakyBackend(failures=1), max_wait=0))
+    response = app.test_client().post("/api/generate", json={"prompt": PROMPT})
+    assert response.status_code == 502
+    assert response.get_json()["success"] is False
@@ -0,0 +1,174 @@
+"""Location-aware ranking: ZIP centroids, the KD-tree and rank_near."""
+
+import json
+import math
+import random
+
+import numpy as np
+import pytest
+
+import catalog
+import geo
+from app import app
+from catalog import CatalogManager, SustainableCatalog
+from catalog_store import write_catalog
+from geo import KDTree, ZipCentroids, locate, to_xyz
+
+NYC = (40.7128, -74.0060)
+LA = (34.0522, -118.2437)
+GAZETTEER = ("GEOID\tALAND\tAWATER\tINTPTLAT\tINTPTLONG                                                  \n"
+             "02139\t4670000\t300000\t42.364\t-71.104\n"
+             "10001\t1630000\t0\t40.750742\t-73.996530\n"
+             "90012\t8030000\t0\t34.0614\t-118.2385\n"
+             "bad\t0\t0\t0\t0\n")
+
+
+def _haversine(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * geo.EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def _random_points(rng, n):
+    return [(rng.uniform(25, 49), rng.uniform(-124, -67)) for _ in range(n)]
+
+
+@pytest.fixture
+def zip_table(tmp_path, monkeypatch):
+    path = tmp_path / "Gaz_zcta_national.txt"
+    path.write_text(GAZETTEER)
+    table = ZipCentroids.load(str(path))
+    monkeypatch.setattr(geo, "_zip_centroids", table)
+    return table
+
+
+def test_zip_centroids(zip_table, tmp_path):
+    assert len(zip_table) == 3
+    assert zip_table.lookup("02139") == (42.364, -71.104)
+    assert zip_table.lookup("10001-2345") == zip_table.lookup(10001) == (40.750742, -73.99653)
+    assert zip_table.lookup("10002") is None and zip_table.lookup("123") is None
+
+    assert geo.main([str(tmp_path / "Gaz_zcta_national.txt"), str(tmp_path / "zips.csv")]) == 0
+    written = ZipCentroids.load(str(tmp_path / "zips.csv"))
+    assert written.zips.tolist() == zip_table.zips.tolist()
+    assert written.lookup("02139") == (42.364, -71.104)
+
+
+def test_locate(zip_table):
+    assert locate({"lat": "40.5", "lng": -73}) == (40.5, -73.0)
+    assert locate({"location": {"city": "Los Angeles", "state": "CA", "zip": "90012"}}) == (34.0614, -118.2385)
+    # Out-of-range coordinates fall back to the ZIP
+    assert locate({"lat": 400, "lon": 0, "zip": "02139"}) == (42.364, -71.104)
+    assert locate({"address": {"zip": "99999"}}) is None
+    assert locate({"lat": 40}) is None and locate("10001") is None
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_kd_tree_matches_brute_force(seed):
+    rng = random.Random(seed)
+    points = _random_points(rng, rng.randint(1, 500))
+    xyz = to_xyz([lat for lat, _ in points], [lon for _, lon in points])
+    ids = np.arange(len(points)) * 10
+    tree = KDTree(xyz, ids, leaf_size=rng.choice([1, 4, 16]))
+    assert len(tree) == len(points)
+
+    for _ in range(20):
+        origin = _random_points(rng, 1)[0]
+        k = rng.choice([1, 5, 40])
+        radius_km = rng.choice([None, 50, 500])
+        limit = math.inf if radius_km is None else geo.km_to_chord(radius_km)
+        found, chords = tree.query(to_xyz(*origin), k, limit)
+
+        km = sorted((_haversine(origin, point), i * 10) for i, point in enumerate(points))
+        expected = [(d, i) for d, i in km if radius_km is None or d <= radius_km][:k]
+        assert found.tolist() == [i for _, i in expected]
+        assert geo.chord_to_km(chords) == pytest.approx([d for d, _ in expected], abs=1e-6)
+
+    assert tree.query(to_xyz(*NYC), 0)[0].size == 0
+    assert KDTree(np.empty((0, 3)), np.empty(0)).query(to_xyz(*NYC), 3)[0].size == 0
+
+
+def test_distances_are_great_circle():
+    data = {"bike": [{"name": "NYC Bike", "lat": NYC[0], "lon": NYC[1]}, {"name": "Unplaced Bike"},
+                     {"name": "LA Bike", "lat": LA[0], "lon": LA[1]}]}
+    index = SustainableCatalog.from_data(data).ranker.geo
+    assert len(index) == 2
+    near, far, unknown = index.distances([0, 2, 1], NYC)
+    assert near == pytest.approx(0) and math.isnan(unknown)
+    assert far == pytest.approx(3936, abs=5)
+    assert SustainableCatalog.from_data({"bike": [{"name": "Bike"}]}).ranker.geo is None
+
+
+def _bikes(rng, n):
+    return {"bike": [{"name": f"Bike {i}", "price": rng.choice([50, 120, 300]),
+                      "co2_savings": rng.choice([10, 20, 30, 40]), "reason": "Used",
+                      **({} if i % 7 == 0 else dict(zip(("lat", "lon"), _random_points(rng, 1)[0])))}
+                     for i in range(n)]}
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_rank_near_matches_a_reference(seed):
+    rng = random.Random(seed)
+    cat = SustainableCatalog.from_data(_bikes(rng, 200))
+    ranker, store = cat.ranker, cat.store
+    for _ in range(10):
+        origin = _random_points(rng, 1)[0]
+        ranked, _ = cat.lookup("bike").rank({"min": 10, "max": 500}, "good", limit=20)
+        near, distances = ranker.rank_near(ranked, origin, limit=5)
+
+        def km(item_id):
+            record = store.record(item_id)
+            return _haversine(origin, (record["lat"], record["lon"])) if "lat" in record else math.nan
+
+        known = [km(i) for i in ranked if not math.isnan(km(i))]
+        penalty = [(k + (max(known) if math.isnan(km(i)) else km(i)) / 50) for k, i in enumerate(ranked)]
+        expected = [int(ranked[k]) for k in sorted(range(len(ranked)), key=penalty.__getitem__)][:5]
+        assert near.tolist() == expected
+        assert distances.tolist() == pytest.approx([km(i) for i in expected], abs=1e-6, nan_ok=True)
+
+        # Within a radius: only items with no location or at most radius_km away
+        near, distances = ranker.rank_near(ranked, origin, 400, {"min": 10, "max": 500}, "good")
+        assert all(math.isnan(d) or d <= 400 for d in distances)
+        assert len(near) == len(set(near.tolist()))
+
+
+@pytest.fixture(params=["catalog.json", "catalog.fbcat"])
+def located_client(request, tmp_path, monkeypatch, zip_table):
+    # The greenest bikes are across the country; nearby ones save less
+    data = {"bike": [{"name": f"LA Bike {i}", "price": 100, "co2_savings": 50, "reason": "Used",
+                      "lat": LA[0], "lon": LA[1]} for i in range(25)]
+            + [{"name": "Brooklyn Bike", "price": 100, "co2_savings": 20, "reason": "Used", "zip": "10001"},
+               {"name": "Bike Share Pass", "price": 90, "co2_savings": 10, "reason": "Rental"}]}
+    path = str(tmp_path / request.param)
+    if path.endswith(".json"):
+        with open(path, "w") as fh:
+            json.dump(data, fh)
+    else:
+        write_catalog(data, path)
+    monkeypatch.setattr(catalog, "_manager", CatalogManager(path, watch_interval=0))
+    return app.test_client()
+
+
+def _find(client, location, **profile):
+    body = {"productName": "road bike",
+            "userProfile": {"score_tier": "good", "price_range": {"min": 10, "max": 500},
+                            "location": location, **profile}}
+    return client.post("/api/find-sustainable-products", json=body).get_json()["alternatives"]
+
+
+def test_alternatives_by_distance(located_client):
+    found = _find(located_client, {"lat": LA[0], "lon": LA[1]})
+    assert [alt["name"] for alt in found] == [f"LA Bike {i}" for i in range(5)]
+    assert {alt["distance_km"] for alt in found} == {0.0}
+
+    # Without a radius only the CO₂/price cut is reordered, so the greener far bikes stay
+    found = _find(located_client, {"city": "New York", "state": "NY", "zip": "10001"})
+    assert [alt["name"] for alt in found] == [f"LA Bike {i}" for i in range(5)]
+    assert found[0]["distance_km"] == pytest.approx(_haversine(geo.get_zip_centroids().lookup("10001"), LA), abs=0.1)
+
+    # With a radius, far items are dropped and located ones nearby fill in, even past the cut
+    found = _find(located_client, {"zip": "10001"}, radius_km=100)
+    assert [alt["name"] for alt in found] == ["Brooklyn Bike"]
+    assert found[0]["distance_km"] == 0.0
+
+    assert all("distance_km" not in alt for alt in _find(located_client, {"zip": "99999"}))
@@ -0,0 +1,57 @@
+"""Job queue leases, acknowledgements and redelivery."""
+
+import pytest
+
+from job_queue import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.db"), visibility_timeout=60, max_attempts=2)
+
+
+def test_lease_hides_job_until_acked(queue):
+    first = queue.enqueue({"n": 1})
+    second = queue.enqueue({"n": 2})
+
+    job = queue.lease()
+    assert (job.id, job.payload, job.attempts) == (first, {"n": 1}, 1)
+    # The leased job is hidden; the next consumer gets the one behind it
+    assert queue.lease().id == second
+    assert queue.lease() is None
+
+    assert queue.ack(job.id, job.lease_token)
+    assert not queue.ack(job.id, job.lease_token)
+    assert queue.stats() == {"ready": 0, "leased": 1, "dead": 0}
+
+
+def test_release_requeues_job(queue):
+    queue.enqueue({"n": 1})
+    job = queue.lease()
+
+    assert queue.release(job.id, job.lease_token)
+    again = queue.lease()
+    assert again.id == job.id
+    assert again.attempts == 2
+    # The old lease no longer acknowledges the redelivered job
+    assert not queue.ack(job.id, job.lease_token)
+    assert queue.ack(again.id, again.lease_token)
+
+
+def test_expired_lease_is_redelivered_then_parked(queue):
+    queue.enqueue({"n": 1})
+    job = queue.lease(visibility_timeout=0)
+    assert queue.lease(visibility_timeout=0).id == job.id
+
+    # max_attempts deliveries without an ack park the job as dead
+    assert queue.lease() is None
+    assert queue.stats() == {"ready": 0, "leased": 0, "dead": 1}
+
+
+def test_consume_acks_and_delay_hides(queue):
+    queue.enqueue({"n": 1}, delay=60)
+    assert queue.consume() is None
+
+    job_id = queue.enqueue({"n": 2})
+    assert queue.consume().id == job_id
+    assert queue.stats()["ready"] == 0
@@ -0,0 +1,83 @@
+"""Bulk CRS lookups: CRSClient.lookup_many and /api/lookup-users."""
+
+import pytest
+
+from app import app
+from crs_cache import ProfileCache
+from crs_service import CRSClient
+from crs_transport import RetryPolicy
+from fake_crs_server import FakeCRSServer
+
+IDENTITIES = [
+    {"name": "Jane Doe", "dob": "01/02/1990"},
+    {"email": "a@example.com"},
+    {"name": "Nobody", "dob": "05/06/1970"},
+    {"name": "Jane Doe", "dob": "01/02/1990"},
+    {"name": "No DOB"},
+    {"email": "b@example.com"},
+    "not an object",
+]
+STATUSES = ["found", "found", "not_found", "found", "invalid", "found", "invalid"]
+
+
+@pytest.fixture
+def server():
+    with FakeCRSServer(unknown={"nobody"}) as fake:
+        yield fake
+
+
+def _client(server, batch_size=0):
+    client = CRSClient(api_key="test", api_base=server.url, cache=ProfileCache())
+    client.batch_size = batch_size
+    client.retry = RetryPolicy(max_attempts=1)
+    return client
+
+
+def test_parallel_lookups(server):
+    results = _client(server).lookup_many(IDENTITIES)
+    assert [result["status"] for result in results] == STATUSES
+    assert results[0] == results[3]
+    assert results[1]["data_source"] == "fake_crs"
+    # Duplicates and invalid entries cost no bureau call
+    assert server.calls == {"lookup": 2, "user": 2}
+
+
+def test_batched_lookups_match_parallel_ones(server):
+    parallel = _client(server).lookup_many(IDENTITIES)
+    server.calls.clear()
+    batched = _client(server, batch_size=2).lookup_many(IDENTITIES)
+    assert batched == parallel
+    # Four distinct identities, two per call
+    assert server.calls == {"batch": 2}
+
+
+def test_cached_identities_skip_the_bureau(server):
+    client = _client(server)
+    client.lookup_many(IDENTITIES[:2])
+    server.calls.clear()
+    results = client.lookup_many(IDENTITIES[:3])
+    assert [result["status"] for result in results] == STATUSES[:3]
+    assert server.calls == {"lookup": 1}
+
+
+@pytest.mark.parametrize("batch_size", [0, 10])
+def test_failures_keep_the_other_results(server, batch_size):
+    client = _client(server, batch_size)
+    client.lookup_many(IDENTITIES[:1])
+    server.failure_rate = 1.0
+    results = client.lookup_many(IDENTITIES[:3])
+    assert [result["status"] for result in results] == ["found", "error", "error"]
+
+
+def test_lookup_users_route():
+    client = app.test_client()
+    response = client.post("/api/lookup-users", json={"identities": IDENTITIES[:2] + IDENTITIES[4:5]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["success"] is True
+    assert [result["status"] for result in body["results"]] == ["found", "found", "invalid"]
+    assert body["summary"] == {"found": 2, "invalid": 1}
+
+    assert client.post("/api/lookup-users", json={"identities": []}).status_code == 400
+    too_many = [{"email": f"{i}@example.com"} for i in range(501)]
+    assert client.post("/api/lookup-users", json={"identities": too_many}).status_code == 400
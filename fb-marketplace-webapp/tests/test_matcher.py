@@ -0,0 +1,67 @@
+"""Keyword and fuzzy category matching."""
+
+import pytest
+
+from catalog import GENERIC_ALTERNATIVES
+from matcher import NgramIndex, edits1
+
+GENERIC_NAMES = [item["name"] for item in GENERIC_ALTERNATIVES]
+
+
+def _names(view):
+    return [item["name"] for item in view]
+
+
+@pytest.mark.parametrize("title", ["thing", "something", "bathing suit", "bicycle"])
+def test_shared_ngrams_alone_do_not_match(default_catalog, title):
+    # "thing" scores well against "clothing" on n-grams but shares no word with it
+    assert _names(default_catalog.lookup(title)) == GENERIC_NAMES
+
+
+@pytest.mark.parametrize("title, expected", [
+    # Misspellings
+    ("labtop", "Certified Refurbished Laptop"),
+    ("office chiar", "Upcycled Office Chair"),
+    ("iphne 13", "Refurbished iPhone 12"),
+    ("dining tabel", "Bamboo Dining Table"),
+    # Synonyms (CATEGORY_ALIASES)
+    ("macbook air 2019", "Certified Refurbished Laptop"),
+    ("oak nightstand", "Bamboo Dining Table"),
+    ("winter jacket", "Recycled Polyester Jacket"),
+    ("pixel 7", "Refurbished iPhone 12"),
+])
+def test_fuzzy_matches(default_catalog, title, expected):
+    # Only the n-gram index resolves these; the keyword matcher misses them
+    assert default_catalog.match_category(title) is None
+    assert expected in _names(default_catalog.lookup(title))
+
+
+def test_description_and_category_feed_matching(default_catalog):
+    assert _names(default_catalog.lookup("Moving sale")) == GENERIC_NAMES
+    view = default_catalog.lookup("Moving sale", description="Solid wood dining table, seats six")
+    assert "Bamboo Dining Table" in _names(view)
+    view = default_catalog.lookup("Moving sale", category="Dining tables")
+    assert "Bamboo Dining Table" in _names(view)
+
+
+def test_lookup_many_matches_lookup(default_catalog):
+    listings = [("labtop", "", ""), ("thing", "", ""), ("nightstand", "", "")]
+    batched = default_catalog.lookup_many(listings)
+    assert [_names(v) for v in batched] == [_names(default_catalog.lookup(name)) for name, _, _ in listings]
+
+
+def test_edits1_covers_typos():
+    variants = edits1("chiar")
+    assert {"chair", "chia", "chiars", "chiaz"} <= variants
+    assert "chiar" not in edits1("xx")
+
+
+def test_index_round_trip(tmp_path, default_catalog):
+    index = NgramIndex.for_catalog(default_catalog)
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = NgramIndex.load(path)
+    query = [("labtop", 1.0)]
+    (label, score), = loaded.search(query, k=1)
+    assert label == "laptop"
+    assert score == pytest.approx(index.search(query, k=1)[0][1])
@@ -0,0 +1,82 @@
+"""Request metrics and the /metrics endpoint."""
+
+import re
+import threading
+import time
+
+from app import app
+from metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+
+def _sample(text, name, **labels):
+    """Value of one sample line in Prometheus text, or None if absent."""
+    label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    pattern = "^" + re.escape(name + (f"{{{label_text}}}" if labels else "")) + r" (\S+)$"
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_exposition_format():
+    registry = MetricsRegistry()
+    calls = Counter("calls_total", "Calls", ("route",), registry=registry)
+    busy = Gauge("busy", "Busy", registry=registry)
+    latency = Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1), registry=registry)
+    calls.inc("/a")
+    calls.inc("/a", amount=2)
+    calls.inc('/"b"')
+    busy.inc()
+    busy.dec()
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.observe(value, "/a")
+
+    text = registry.render()
+    assert "# TYPE calls_total counter" in text
+    assert "# TYPE latency_seconds histogram" in text
+    assert _sample(text, "calls_total", route="/a") == 3
+    assert _sample(text, "calls_total", route='/\\"b\\"') == 1
+    assert _sample(text, "busy") == 0
+    # Buckets are cumulative and include their upper bound
+    assert _sample(text, "latency_seconds_bucket", route="/a", le="0.1") == 2
+    assert _sample(text, "latency_seconds_bucket", route="/a", le="1") == 3
+    assert _sample(text, "latency_seconds_bucket", route="/a", le="+Inf") == 4
+    assert _sample(text, "latency_seconds_count", route="/a") == 4
+    assert _sample(text, "latency_seconds_sum", route="/a") == 3.65
+
+
+def test_samples_from_finished_threads_are_kept():
+    registry = MetricsRegistry()
+    calls = Counter("calls_total", "Calls", registry=registry)
+    threads = [threading.Thread(target=lambda: [calls.inc() for _ in range(100)]) for _ in range(300)]
+    for thread in threads:
+        thread.start()
+        thread.join()
+    assert _sample(registry.render(), "calls_total") == 30000
+
+
+def test_metrics_endpoint_counts_requests():
+    client = app.test_client()
+    before = client.get("/metrics").get_data(as_text=True)
+    client.get("/api/queue-stats")
+    client.post("/api/lookup-users", json={})
+    after = client.get("/metrics")
+    assert after.content_type.startswith("text/plain; version=0.0.4")
+    text = after.get_data(as_text=True)
+
+    def count(route, method, status, body):
+        labels = {"route": route, "method": method, "status": status}
+        return _sample(body, "webapp_request_duration_seconds_count", **labels) or 0
+
+    assert count("/api/queue-stats", "GET", 200, text) == count("/api/queue-stats", "GET", 200, before) + 1
+    assert count("/api/lookup-users", "POST", 400, text) == count("/api/lookup-users", "POST", 400, before) + 1
+    # Requests finished with their metrics recorded; only the scrape itself is in flight
+    assert _sample(text, "webapp_requests_in_flight", route="/api/queue-stats") == 0
+    assert _sample(text, "webapp_requests_in_flight", route="/metrics") == 1
+
+
+def test_streamed_responses_are_not_buffered():
+    # The first chunk must arrive without waiting for the 30-second stream to end
+    start = time.monotonic()
+    response = app.test_client().get("/api/message-stream", buffered=False)
+    assert next(iter(response.response)).startswith(b"retry:")
+    response.close()
+    assert time.monotonic() - start < 5
@@ -0,0 +1,98 @@
+"""Request profiling and the admin profile API."""
+
+import pstats
+
+import pytest
+
+import profiler
+from app import app
+from profiler import RequestProfiler
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+
+def _work():
+    return sum(i * i for i in range(1000))
+
+
+def _profile(recorder, **info):
+    profile = recorder.start()
+    _work()
+    return recorder.finish(profile, **info)
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    return RequestProfiler(str(tmp_path / "profiles.db"), capacity=3)
+
+
+def test_stores_pstats_readable_profiles(recorder, tmp_path):
+    profile_id = _profile(recorder, route="/test", status=200)
+    entry = recorder.get(profile_id)
+    assert entry["route"] == "/test" and entry["status"] == 200
+
+    path = tmp_path / "profile.prof"
+    path.write_bytes(entry["stats"])
+    functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+    assert "_work" in functions
+    assert "_work" in recorder.render_text(entry["stats"], sort="tottime")
+
+
+def test_keeps_only_the_newest_profiles(recorder):
+    ids = [_profile(recorder, route=f"/{i}") for i in range(5)]
+    assert [entry["id"] for entry in recorder.list()] == ids[:-4:-1]
+    assert recorder.get(ids[0]) is None
+
+
+def test_one_profile_at_a_time(recorder):
+    first = recorder.start()
+    assert recorder.start() is None
+    recorder.finish(first)
+    second = recorder.start()
+    assert second is not None
+    recorder.finish(second)
+
+
+@pytest.fixture
+def client(monkeypatch, recorder):
+    monkeypatch.setattr(profiler, "_profiler", recorder)
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    return app.test_client()
+
+
+def _lookup(client, headers):
+    return client.post("/api/find-sustainable-products", json={"productName": "office chair"}, headers=headers)
+
+
+def test_profiling_on_request(client, recorder):
+    assert "X-Profile-Id" not in _lookup(client, {}).headers
+    # X-Profile is ignored without the admin token
+    assert "X-Profile-Id" not in _lookup(client, {"X-Profile": "1"}).headers
+
+    response = _lookup(client, {"X-Profile": "1", **ADMIN})
+    profile_id = int(response.headers["X-Profile-Id"])
+
+    listed = client.get("/api/admin/profiles", headers=ADMIN).get_json()
+    assert listed["profiles"][0]["id"] == profile_id
+    assert listed["profiles"][0]["route"] == "/api/find-sustainable-products"
+    assert listed["profiles"][0]["reason"] == "requested"
+
+    download = client.get(f"/api/admin/profiles/{profile_id}", headers=ADMIN)
+    assert download.data == recorder.get(profile_id)["stats"]
+    assert download.headers["Content-Disposition"] == f"attachment; filename=profile-{profile_id}.prof"
+    text = client.get(f"/api/admin/profiles/{profile_id}?format=text&sort=tottime", headers=ADMIN)
+    assert "function calls" in text.get_data(as_text=True)
+
+    assert client.get(f"/api/admin/profiles/{profile_id}?sort=name&format=text", headers=ADMIN).status_code == 400
+    assert client.get(f"/api/admin/profiles/{profile_id}?format=svg", headers=ADMIN).status_code == 400
+    assert client.get("/api/admin/profiles/999999", headers=ADMIN).status_code == 404
+    assert client.get("/api/admin/profiles").status_code == 401
+
+
+def test_sampled_profiling(client, recorder):
+    recorder.sample_rate = 1.0
+    response = _lookup(client, {})
+    assert recorder.get(int(response.headers["X-Profile-Id"]))["reason"] == "sampled"
+    # Scrapes and admin calls are never profiled
+    assert "X-Profile-Id" not in client.get("/metrics").headers
+    assert "X-Profile-Id" not in client.get("/api/admin/profiles", headers=ADMIN).headers
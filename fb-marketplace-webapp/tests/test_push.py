@@ -0,0 +1,86 @@
+"""Pushing queued jobs to the sender extension: long-poll and SSE."""
+
+import json
+import threading
+import time
+
+import pytest
+
+import app as webapp
+from app import app
+
+JOB = {"message": "Is this still available?", "searchKeyword": "desk", "maxPrice": 100, "minPrice": None}
+
+
+@pytest.fixture
+def client():
+    client = app.test_client()
+    # Start from an empty queue
+    while client.post("/api/consume-message?wait=0").status_code == 200:
+        pass
+    return client
+
+
+def _store_later(client, payload, delay=0.2):
+    timer = threading.Timer(delay, lambda: client.post("/api/store-message", json=payload))
+    timer.start()
+    return timer
+
+
+def test_long_poll_wakes_for_a_new_job(client):
+    timer = _store_later(client, JOB)
+    start = time.monotonic()
+    response = client.post("/api/consume-message?wait=5")
+    timer.join()
+    assert response.status_code == 200
+    assert response.get_json()["payload"] == JOB
+    assert time.monotonic() - start < 2
+    # Consumed: nobody else gets it
+    assert client.post("/api/consume-message?wait=0").status_code == 204
+
+
+def test_long_poll_times_out_with_204(client):
+    start = time.monotonic()
+    assert client.post("/api/consume-message?wait=0.2").status_code == 204
+    assert 0.2 <= time.monotonic() - start < 2
+
+
+def _events(response, count):
+    """First `count` SSE events of a streamed response, as (id, payload)."""
+    events = []
+    buffer = ""
+    for chunk in response.response:
+        buffer += chunk.decode() if isinstance(chunk, bytes) else chunk
+        while "\n\n" in buffer:
+            block, buffer = buffer.split("\n\n", 1)
+            fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+            if fields.get("event") == "payload":
+                events.append((int(fields["id"]), json.loads(fields["data"])))
+        if len(events) == count:
+            response.close()
+            return events
+    return events
+
+
+def test_stream_pushes_jobs_as_they_are_queued(client, monkeypatch):
+    monkeypatch.setattr(webapp, "SSE_KEEPALIVE_SECONDS", 0.05)
+    first = client.post("/api/store-message", json=JOB).get_json()["id"]
+    second_job = {**JOB, "searchKeyword": "lamp"}
+    timer = _store_later(client, second_job)
+    response = client.get("/api/message-stream", buffered=False)
+    events = _events(response, 2)
+    timer.join()
+    assert [payload for _, payload in events] == [JOB, second_job]
+    assert events[0][0] == first
+
+    # Announced, not taken; a reconnect skips what it has seen
+    response = client.get("/api/message-stream", headers={"Last-Event-ID": str(first)}, buffered=False)
+    assert _events(response, 1) == events[1:]
+
+
+def test_consuming_stream_takes_jobs(client, monkeypatch):
+    monkeypatch.setattr(webapp, "SSE_KEEPALIVE_SECONDS", 0.05)
+    client.post("/api/store-message", json=JOB)
+    response = client.get("/api/message-stream?consume=1", buffered=False)
+    assert [payload for _, payload in _events(response, 1)] == [JOB]
+    assert client.post("/api/consume-message?wait=0").status_code == 204
@@ -0,0 +1,129 @@
+"""Ranking alternatives for a user profile."""
+
+import math
+import random
+
+import pytest
+
+import ranking
+from catalog import SustainableCatalog
+from ranking import TIER_PRIORITY
+
+CHAIRS = {
+    "chair": [{"name": f"Designer Chair {i}", "price": 900 + i, "co2_savings": 50, "reason": "Vintage"}
+              for i in range(6)] + [
+        {"name": "Budget Chair", "price": 40, "co2_savings": 10, "reason": "Secondhand"},
+        {"name": "Thrift Chair", "price": 25, "co2_savings": 30, "reason": "Secondhand"},
+    ],
+}
+
+
+def _names(catalog, ranked):
+    return [catalog.store.name(item_id) for item_id in ranked]
+
+
+@pytest.mark.parametrize("price_range", [{"min": 10, "max": 300}, {"min": 15, "max": 90}])
+def test_whole_category_is_ranked(price_range):
+    # Both in-range chairs sit past the five items a lookup returns
+    catalog = SustainableCatalog.from_data(CHAIRS)
+    view = catalog.lookup("office chair")
+    assert len(view) == 5
+    ranked, outside_range = view.rank(price_range, "poor")
+    assert not outside_range
+    assert _names(catalog, ranked) == ["Thrift Chair", "Budget Chair"]
+
+
+def test_outside_range_falls_back_to_the_first_candidates():
+    catalog = SustainableCatalog.from_data(CHAIRS)
+    ranked, outside_range = catalog.lookup("thrift chair").rank({"min": 1, "max": 5}, "good")
+    assert outside_range
+    assert _names(catalog, ranked)[0] == "Designer Chair 0"
+    assert set(_names(catalog, ranked)) == {"Thrift Chair", "Designer Chair 0", "Designer Chair 1"}
+
+
+def test_name_matches_win_ties():
+    data = {"lamp": [{"name": f"Lamp {c}", "price": 30, "co2_savings": 5, "reason": "Used"} for c in "abcdefg"]}
+    catalog = SustainableCatalog.from_data(data)
+    ranked, _ = catalog.lookup("lamp f").rank({"min": 10, "max": 300}, "good")
+    assert _names(catalog, ranked) == ["Lamp f", "Lamp a", "Lamp b", "Lamp c", "Lamp d"]
+
+
+def _random_catalog(rng, n_items):
+    items = []
+    for i in range(n_items):
+        price = rng.choice([rng.randint(5, 3000), rng.randint(5, 3000), "Contact seller"])
+        items.append({"name": f"Bike {i} {rng.choice(['road', 'mountain', 'city'])}", "price": price,
+                      "co2_savings": rng.choice([rng.randint(0, 20), None]), "reason": "Used"})
+    return SustainableCatalog.from_data({"bike": items})
+
+
+def _reference(catalog, candidates, price_range, score_tier, limit):
+    """Plain-Python ranking: filter, then a stable sort by CO₂ (desc) and price (asc)."""
+    low, high = price_range.get("min"), price_range.get("max")
+    prices, co2 = catalog.store.prices, catalog.store.co2
+    keep = []
+    for item_id in candidates:
+        price = prices[item_id]
+        if low and high:
+            kept = low <= price <= high
+        else:
+            kept = not math.isnan(price)
+        if TIER_PRIORITY.get(score_tier, 3) <= 2 and math.isnan(price):
+            kept = True
+        if kept:
+            keep.append(item_id)
+    outside_range = not keep
+    keep = keep or list(candidates[:3])
+    keep.sort(key=lambda i: (-(0 if math.isnan(co2[i]) else co2[i]), math.inf if math.isnan(prices[i]) else prices[i]))
+    return keep[:limit], outside_range
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_large_categories_match_a_full_sort(seed, monkeypatch):
+    rng = random.Random(seed)
+    catalog = _random_catalog(rng, 400)
+    for _ in range(30):
+        title = f"{rng.choice(['road', 'mountain', 'city', 'kids'])} bike"
+        view = catalog.lookup(title)
+        candidates = list(view.preferred) + [i for i in range(400) if i not in set(view.preferred)]
+        tier = rng.choice(list(TIER_PRIORITY))
+        custom = {"min": rng.randint(5, 500), "max": rng.randint(500, 3000)}
+        price_range = rng.choice([ranking.TIER_PRICE_RANGES[tier], custom, {}])
+        limit = rng.choice([1, 5, 20])
+
+        ranked, outside_range = view.rank(price_range, tier, limit)
+        assert (list(ranked), outside_range) == _reference(catalog, candidates, price_range, tier, limit)
+
+        # Same answer without the argpartition pre-trim
+        monkeypatch.setattr(ranking, "_PARTITION_THRESHOLD", 10 ** 9)
+        untrimmed, _ = view.rank(price_range, tier, limit)
+        monkeypatch.undo()
+        assert list(untrimmed) == list(ranked)
+
+
+def test_category_slices_match_ranking_the_candidates(monkeypatch):
+    # Few distinct CO₂ and price values, so most cuts fall inside a run of ties
+    rng = random.Random(7)
+    data = {category: [{"name": f"{category} {i} {rng.choice(['oak', 'pine', 'steel'])}",
+                        "price": rng.choice([20, 60, 150, 600, "Contact seller"]),
+                        "co2_savings": rng.choice([5, 10, None]), "reason": "Used"}
+                       for i in range(rng.randint(1, 120))]
+            for category in ("table", "desk", "shelf", "dresser")}
+    catalog = SustainableCatalog.from_data(data)
+    ranker = catalog.ranker
+    sliced = []
+    slice_category = ranker._slice_category
+    monkeypatch.setattr(ranker, "_slice_category", lambda *args: sliced.append(args) or slice_category(*args))
+
+    for category in data:
+        for material in ("oak", "pine", "steel", "glass"):
+            view = catalog.lookup(f"{material} {category}")
+            start, end = catalog.store.category_range(view.category)
+            candidates = list(view.preferred) + [i for i in range(start, end) if i not in set(view.preferred)]
+            for tier, price_range in ranking.TIER_PRICE_RANGES.items():
+                for limit in (1, 5, 40):
+                    ranked, outside_range = view.rank(price_range, tier, limit)
+                    expected = ranker.rank(candidates, price_range, tier, limit)
+                    assert (list(ranked), outside_range) == (list(expected[0]), expected[1])
+                    assert (list(ranked), outside_range) == _reference(catalog, candidates, price_range, tier, limit)
+    assert sliced
@@ -0,0 +1,118 @@
+"""Response encoding: fast JSON, columnar alternatives, streaming and compression."""
+
+import gzip
+import json
+
+import numpy as np
+import pytest
+from flask import Response
+from werkzeug.http import parse_accept_header
+
+import response_encoding
+from app import app
+from response_encoding import (COLUMNAR_MIMETYPE, compress_response, dumps, stream_array, stream_list_field,
+                               stream_object, to_columnar)
+
+ITEMS = [
+    {"name": "Refurbished Laptop", "price": 450, "co2_savings": 75},
+    {"name": "Used Laptop", "price": "Contact seller", "reason": "Secondhand", "distance_km": 3.5},
+]
+
+
+def _from_columnar(table):
+    return [{key: value for key, value in zip(table["columns"], row) if value is not None} for row in table["rows"]]
+
+
+def test_columnar_round_trip():
+    table = to_columnar(ITEMS)
+    assert table["columns"] == ["name", "price", "co2_savings", "reason", "distance_km"]
+    assert table["rows"][0] == ["Refurbished Laptop", 450, 75, None, None]
+    assert _from_columnar(table) == ITEMS
+    assert to_columnar([]) == {"columns": [], "rows": []}
+
+
+def test_dumps_matches_the_standard_encoder():
+    value = {"a": [1, 2.5, None, True], "b": {"nested": "é"}, "n": np.int64(3), "f": np.float64(0.5)}
+    assert json.loads(dumps(value)) == {"a": [1, 2.5, None, True], "b": {"nested": "é"}, "n": 3, "f": 0.5}
+    assert b" " not in dumps({"a": [1, 2]})
+
+
+@pytest.mark.parametrize("count", [0, 1, 5000])
+def test_streams_are_valid_json(count):
+    values = [{"i": i, "name": f"item {i}"} for i in range(count)]
+    chunks = list(stream_array(map(dumps, values)))
+    assert json.loads(b"".join(chunks)) == values
+    if count == 5000:
+        assert len(chunks) > 1
+
+    fields = {"success": True}
+    body = b"".join(stream_object(fields, "results", ((str(i), dumps(v)) for i, v in enumerate(values))))
+    assert json.loads(body) == {"success": True, "results": {str(i): v for i, v in enumerate(values)}}
+    body = b"".join(stream_list_field({}, "results", map(dumps, values)))
+    assert json.loads(body) == {"results": values}
+
+
+def _compressed(body, accept="gzip, br", streamed=False, mimetype="application/json"):
+    resp = Response(iter([body[:10], body[10:]]) if streamed else body, mimetype=mimetype)
+    resp.set_etag("abc")
+    return compress_response(resp, parse_accept_header(accept))
+
+
+def _decode(resp):
+    data = b"".join(resp.response) if resp.is_streamed else resp.get_data()
+    if resp.headers.get("Content-Encoding") == "br":
+        return response_encoding.brotli.decompress(data)
+    if resp.headers.get("Content-Encoding") == "gzip":
+        return gzip.decompress(data)
+    return data
+
+
+@pytest.mark.parametrize("streamed", [False, True])
+@pytest.mark.parametrize("accept", ["gzip", "gzip, br"])
+def test_compression(streamed, accept):
+    body = dumps([ITEMS] * 200)
+    resp = _compressed(body, accept, streamed)
+    expected = "br" if "br" in accept and response_encoding.brotli is not None else "gzip"
+    assert resp.headers["Content-Encoding"] == expected
+    assert _decode(resp) == body
+    assert "Accept-Encoding" in resp.vary
+    assert resp.get_etag() == ("abc", True)
+
+
+def test_what_is_not_compressed():
+    small = _compressed(b'{"success":true}')
+    assert "Content-Encoding" not in small.headers and small.get_etag() == ("abc", False)
+    big = dumps([ITEMS] * 200)
+    assert "Content-Encoding" not in _compressed(big, accept="identity").headers
+    assert "Content-Encoding" not in _compressed(big, mimetype="text/event-stream", streamed=True).headers
+    assert "Content-Encoding" not in _compressed(big, mimetype="application/octet-stream").headers
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def test_columnar_alternatives(client):
+    body = {"productName": "laptop"}
+    rows = client.post("/api/find-sustainable-products", json=body).get_json()
+    columnar = client.post("/api/find-sustainable-products", json=body, headers={"Accept": COLUMNAR_MIMETYPE})
+    assert columnar.mimetype == COLUMNAR_MIMETYPE
+    table = json.loads(columnar.data)
+    assert _from_columnar(table["alternatives"]) == rows["alternatives"]
+
+
+def test_batch_is_streamed_and_compressed(client):
+    items = [{"productName": name} for name in ("laptop", "office chair", "iphone", "laptop")] * 40
+    items.append({"productName": ""})
+    result = client.post("/api/find-sustainable-products/batch", json={"items": items}).get_json()
+    assert result["errors"] == {str(len(items) - 1): "productName required"}
+    assert result["results"]["0"] == result["results"]["3"]
+    assert result["results"]["0"] == client.post("/api/find-sustainable-products",
+                                                 json={"productName": "laptop"}).get_json()["alternatives"]
+
+    compressed = client.post("/api/find-sustainable-products/batch", json={"items": items},
+                             headers={"Accept": COLUMNAR_MIMETYPE, "Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    columnar = json.loads(gzip.decompress(compressed.data))
+    assert {key: _from_columnar(table) for key, table in columnar["results"].items()} == result["results"]
@@ -0,0 +1,50 @@
+"""Seen-listing index membership."""
+
+import pytest
+
+import seen_index
+from seen_index import SeenIndex, listing_key
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SeenIndex(str(tmp_path / "seen.db"), capacity=16)
+
+
+def test_key_normalization():
+    key = listing_key({"title": "Oak  Desk", "price": 120})
+    assert key == listing_key({"title": "oak desk", "price": "$120.00"})
+    assert key != listing_key({"title": "oak desk", "price": 121})
+    assert listing_key({"title": "  "}) is None
+
+
+def test_membership(index):
+    assert index.add({"title": "Oak desk", "price": 120}, conversation_id=7)
+    assert not index.add({"title": "oak desk", "price": "120"})
+
+    listings = [{"title": "Oak desk", "price": 120}, {"title": "Oak desk", "price": 90}, {"price": 5}, "bad"]
+    assert index.contains_many(listings) == [True, False, False, False]
+    assert {"title": "OAK DESK", "price": "$120"} in index
+    assert len(index) == 1
+
+
+def test_grows_past_capacity(index):
+    listings = [{"title": f"Item {i}", "price": i + 1} for i in range(40)]
+    for listing in listings:
+        index.add(listing)
+    assert index.stats()["bloom_capacity"] >= 40
+    assert all(index.contains_many(listings))
+
+
+def test_sees_rows_written_by_other_processes(index):
+    other = SeenIndex(index.path, capacity=16)
+    other.add({"title": "Lamp", "price": 15})
+    assert {"title": "Lamp", "price": 15} in index
+
+
+def test_large_pages_are_chunked(index, monkeypatch):
+    monkeypatch.setattr(seen_index, "_MAX_PARAMS", 3)
+    listings = [{"title": f"Chair {i}", "price": 10} for i in range(10)]
+    for listing in listings[::2]:
+        index.add(listing)
+    assert index.contains_many(listings) == [i % 2 == 0 for i in range(10)]
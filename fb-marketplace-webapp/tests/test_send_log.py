@@ -0,0 +1,47 @@
+"""Send log filtering and cursor paging."""
+
+import pytest
+
+from send_log import SendLog
+
+
+@pytest.fixture
+def send_log(tmp_path):
+    log = SendLog(str(tmp_path / "sends.db"))
+    for i in range(6):
+        log.append({"conversationId": "a" if i % 2 else "b", "timestamp": 1000 + i, "message": f"m{i}"})
+    return log
+
+
+def _messages(entries):
+    return [entry["message"] for entry in entries]
+
+
+def test_newest_first_paging(send_log):
+    entries, cursor = send_log.query(limit=4)
+    assert _messages(entries) == ["m5", "m4", "m3", "m2"]
+    entries, cursor = send_log.query(limit=4, cursor=cursor)
+    assert _messages(entries) == ["m1", "m0"]
+    assert cursor is None
+
+
+def test_oldest_first_paging(send_log):
+    entries, cursor = send_log.query(limit=3, newest_first=False)
+    assert _messages(entries) == ["m0", "m1", "m2"]
+    entries, _ = send_log.query(limit=3, cursor=cursor, newest_first=False)
+    assert _messages(entries) == ["m3", "m4", "m5"]
+
+
+def test_filters(send_log):
+    entries, _ = send_log.query(conversation_id="a")
+    assert _messages(entries) == ["m5", "m3", "m1"]
+    entries, _ = send_log.query(since=1002, until=1004)
+    assert _messages(entries) == ["m3", "m2"]
+    entries, _ = send_log.query(conversation_id="b", since=1001, newest_first=False)
+    assert _messages(entries) == ["m2", "m4"]
+
+
+def test_entries_carry_their_id(send_log):
+    entries, _ = send_log.query(limit=1)
+    assert entries[0]["id"] == 6
+    assert entries[0]["timestamp"] == 1005
@@ -0,0 +1,111 @@
+"""Production launcher (serve.py)."""
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+import requests
+
+import serve
+from conftest import WEBAPP_DIR
+from crs_service import get_crs_client
+
+
+@pytest.fixture
+def launched(monkeypatch):
+    """Options main() would start gunicorn with, without starting it."""
+    runs = []
+    monkeypatch.setattr(serve.WebappServer, "run", lambda self: runs.append(self))
+    monkeypatch.delenv("CRS_SHARED_CACHE_PATH", raising=False)
+    return runs
+
+
+def test_wsgi_options(launched):
+    assert serve.main(["--workers", "3", "--threads", "4", "--bind", "127.0.0.1:0"]) == 0
+    server, = launched
+    assert server.cfg.preload_app is True
+    assert server.cfg.workers == 3
+    assert server.cfg.threads == 4
+    assert server.cfg.worker_class_str == "gthread"
+    assert server.cfg.graceful_timeout == serve.GRACEFUL_TIMEOUT
+    assert server.cfg.post_fork is serve._post_fork
+    assert os.environ["CRS_SHARED_CACHE_PATH"] == os.path.join(os.environ["WEBAPP_DATA_DIR"], "crs_cache.db")
+
+
+def test_asgi_options(launched):
+    serve.main(["--asgi", "--workers", "2"])
+    server, = launched
+    assert server.asgi
+    assert server.cfg.worker_class_str.endswith("UvicornWorker")
+
+
+def test_load_returns_the_warm_app(launched, monkeypatch):
+    frozen = []
+    monkeypatch.setattr(serve.gc, "freeze", lambda: frozen.append(True))
+    from app import app
+    from asgi import app as asgi_app
+    assert serve.WebappServer({}).load() is app
+    assert serve.WebappServer({}, asgi=True).load() is asgi_app
+    assert frozen == [True, True]
+
+
+def test_post_fork_drops_inherited_connections():
+    client = get_crs_client()
+    client.transport  # a pooled session, as the master may have opened
+    serve._post_fork(None, None)
+    assert client._transport is None
+
+
+def test_reload_keeps_the_catalog_on_failure(monkeypatch, caplog):
+    import catalog
+
+    def broken():
+        raise ValueError("bad catalog file")
+
+    monkeypatch.setattr(catalog, "reload_catalog", broken)
+    monkeypatch.setattr(serve.gc, "freeze", lambda: None)
+    serve.WebappServer({}).reload()
+    assert "keeping the current one: bad catalog file" in caplog.text
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get(url, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return requests.get(url, timeout=2)
+        except requests.ConnectionError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def test_serves_and_reloads_with_forked_workers(tmp_path):
+    port = _free_port()
+    env = {**os.environ, "WEBAPP_DATA_DIR": str(tmp_path)}
+    master = subprocess.Popen([sys.executable, "serve.py", "--workers", "2", "--bind", f"127.0.0.1:{port}"],
+                              cwd=WEBAPP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        url = f"http://127.0.0.1:{port}/api/queue-stats"
+        assert _get(url, timeout=30).json() == {"ready": 0, "leased": 0, "dead": 0}
+        # Workers share the job queue in WEBAPP_DATA_DIR
+        job = {"message": "Still available?", "searchKeyword": "desk"}
+        requests.post(f"http://127.0.0.1:{port}/api/store-message", json=job, timeout=5)
+        assert all(_get(url, timeout=5).json()["ready"] == 1 for _ in range(6))
+
+        master.send_signal(signal.SIGHUP)
+        time.sleep(1)
+        assert _get(url, timeout=30).json()["ready"] == 1
+        assert master.poll() is None
+    finally:
+        master.terminate()
+        master.wait(timeout=serve.GRACEFUL_TIMEOUT + 10)
@@ -92,11 +92,43 @@ async function requestCrsCreditReport(token, reportData) {
  */
 
 const GEMINI_API_URL = 'https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent';
+// Webapp generation proxy: caches and batches prompts shared across tabs
+const GENERATION_PROXY_URL = 'http://127.0.0.1:5001/api/generate';
+
+/**
+ * Generate a message through the webapp's generation proxy.
+ * Returns null if the webapp is down or has no backend configured.
+ */
+async function generateViaProxy(prompt) {
+  try {
+    const response = await fetch(GENERATION_PROXY_URL, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ prompt })
+    });
+    if (!response.ok) {
+      return null;
+    }
+    const data = await response.json();
+    if (data.success && data.text) {
+      console.log(`✅ Generated message (proxy${data.cached ? ', cached' : ''}):`, data.text);
+      return data.text;
+    }
+    return null;
+  } catch (error) {
+    return null;
+  }
+}
 
 /**
  * Generate a message using Gemini API
  */
 async function generateMessage(prompt, apiKey) {
+  const proxied = await generateViaProxy(prompt);
+  if (proxied) {
+    return proxied;
+  }
+
   if (!apiKey || apiKey.trim() === "") {
     console.error("❌ No Gemini API key provided");
     return null;